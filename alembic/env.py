@@ -1,9 +1,11 @@
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
+from sqlalchemy import inspect, text
 from sqlalchemy import pool
 
 from alembic import context
+from alembic.script import ScriptDirectory
 
 import os
 import sys
@@ -11,6 +13,8 @@ from dotenv import load_dotenv
 
 # Добавляем корневую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+# Каталог alembic - для общих функций ревизий (migration_helpers)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -66,6 +70,42 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def is_upgrade_to_head() -> bool:
+    """Проверяет, что целевая ревизия - текущая голова цепочки миграций"""
+    try:
+        destination = context.get_revision_argument()
+    except KeyError:
+        # Команды без целевой ревизии (current, history и т.п.)
+        return False
+    if not destination:
+        return False
+    if isinstance(destination, str):
+        destination = (destination,)
+    heads = ScriptDirectory.from_config(config).get_heads()
+    return set(destination) == set(heads)
+
+
+def is_empty_database(connection) -> bool:
+    """Проверяет, что база пустая: нет ни таблицы users, ни отметки alembic_version"""
+    inspector = inspect(connection)
+    if inspector.has_table("users"):
+        return False
+    if inspector.has_table("alembic_version"):
+        return connection.execute(text("SELECT 1 FROM alembic_version LIMIT 1")).first() is None
+    return True
+
+
+def bootstrap_empty_database(connection) -> None:
+    """Создает итоговую схему по моделям и помечает базу как head.
+
+    Для новой базы это заменяет последовательный прогон ревизий 001-007
+    одной транзакцией; существующие базы по-прежнему идут по цепочке.
+    """
+    target_metadata.create_all(connection)
+    context.get_context().stamp(ScriptDirectory.from_config(config), "heads")
+    connection.commit()
+
+
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode.
 
@@ -80,10 +120,18 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Каждая ревизия выполняется в собственной транзакции: при ошибке
+        # откатывается только она, а уже применённые ревизии остаются зафиксированными
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            transaction_per_migration=True,
         )
 
+        if is_upgrade_to_head() and is_empty_database(connection):
+            bootstrap_empty_database(connection)
+            return
+
         with context.begin_transaction():
             context.run_migrations()
 
@@ -0,0 +1,201 @@
+"""
+Общие функции ревизий alembic: кэш рефлексии схемы и пакетный DDL.
+
+Соединение, Inspector, список таблиц и колонки кэшируются на время одного
+upgrade()/downgrade(), чтобы состав каждой таблицы читался одним запросом.
+Каждая ревизия вызывает reset_inspector() в начале upgrade()/downgrade().
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+
+_state: dict = {'bind': None, 'inspector': None, 'tables': None}
+
+# Колонки таблиц: {таблица: {колонка: описание из рефлексии или None}}
+_columns_cache: dict = {}
+
+# Таблицы, существование которых уже подтверждено: ревизии таблицы не удаляют,
+# поэтому положительный ответ кэшируется на весь процесс
+_KNOWN_TABLES: set = set()
+
+# Отложенный DDL, отправляемый одним запросом в flush_statements()
+_pending_statements: list = []
+
+
+def reset_inspector() -> None:
+    """Сбрасывает кэш соединения и рефлексии перед началом миграции"""
+    _state['bind'] = None
+    _state['inspector'] = None
+    _state['tables'] = None
+    _columns_cache.clear()
+    _pending_statements.clear()
+
+
+def get_bind():
+    """Возвращает соединение текущей миграции"""
+    if _state['bind'] is None:
+        _state['bind'] = op.get_bind()
+    return _state['bind']
+
+
+def get_inspector():
+    """Возвращает Inspector, общий для всех проверок текущей миграции"""
+    if _state['inspector'] is None:
+        _state['inspector'] = inspect(get_bind())
+    return _state['inspector']
+
+
+def is_postgresql() -> bool:
+    """Выполняется ли миграция на PostgreSQL"""
+    return get_bind().dialect.name == 'postgresql'
+
+
+def snapshot_schema(table_names=()) -> None:
+    """Читает список таблиц и полные описания колонок table_names одним проходом"""
+    inspector = get_inspector()
+    tables = set(inspector.get_table_names())
+    _state['tables'] = tables
+    present = sorted(set(table_names) & tables)
+    if present:
+        multi_columns = inspector.get_multi_columns(filter_names=present)
+        for (_, table_name), columns in multi_columns.items():
+            _columns_cache[table_name] = {col['name']: col for col in columns}
+
+
+def table_exists(table_name: str) -> bool:
+    """Проверяет существование таблицы (по снимку схемы, если он сделан)"""
+    if _state['tables'] is not None:
+        return table_name in _state['tables']
+    if table_name in _KNOWN_TABLES:
+        return True
+    if get_inspector().has_table(table_name):
+        _KNOWN_TABLES.add(table_name)
+        return True
+    return False
+
+
+def existing_columns(table_name: str) -> set:
+    """Возвращает имена столбцов таблицы одним запросом к каталогу (пустое множество, если таблицы нет)"""
+    columns = _columns_cache.get(table_name)
+    if columns is None:
+        conn = get_bind()
+        if conn.dialect.name == 'sqlite':
+            rows = conn.execute(sa.text(f"PRAGMA table_info({table_name})"))
+            columns = {row[1]: None for row in rows}
+        else:
+            rows = conn.execute(
+                sa.text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = :table_name"
+                ),
+                {"table_name": table_name}
+            )
+            columns = {row[0]: None for row in rows}
+        _columns_cache[table_name] = columns
+    return set(columns)
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    """Проверяет существование колонки в таблице"""
+    return column_name in existing_columns(table_name)
+
+
+def get_column(table_name: str, column_name: str):
+    """Возвращает описание колонки из снимка схемы (snapshot_schema) или None"""
+    return (_columns_cache.get(table_name) or {}).get(column_name)
+
+
+def queue_statement(statement: str) -> None:
+    """Откладывает одно SQL-выражение (без завершающей точки с запятой) до flush_statements()"""
+    _pending_statements.append(statement)
+
+
+def flush_statements() -> None:
+    """Отправляет накопленные выражения: на PostgreSQL одним запросом, на SQLite по одному"""
+    if not _pending_statements:
+        return
+    if is_postgresql():
+        op.execute(";\n".join(_pending_statements))
+    else:
+        for statement in _pending_statements:
+            op.execute(statement)
+    _pending_statements.clear()
+
+
+def add_columns(table_name: str, columns: list, foreign_keys: list = ()) -> None:
+    """Добавляет отсутствующие колонки и внешние ключи таблицы одной операцией.
+
+    На PostgreSQL все ADD COLUMN IF NOT EXISTS и ADD CONSTRAINT объединяются в один
+    ALTER TABLE (существование колонок проверяет сам сервер), который откладывается
+    до flush_statements(). На SQLite используется
+    batch-блок: одна пересборка таблицы вместо пересборки на каждую операцию
+    (и единственный способ добавить внешний ключ).
+    foreign_keys: кортежи (имя, таблица_ссылки, локальные_колонки, колонки_ссылки).
+    """
+    bind = get_bind()
+    if bind.dialect.name == 'postgresql':
+        clauses = [
+            f"ADD COLUMN IF NOT EXISTS {CreateColumn(column).compile(dialect=bind.dialect)}"
+            for column in columns
+        ]
+        clauses.extend(
+            f"ADD CONSTRAINT {name} FOREIGN KEY ({', '.join(local_cols)}) "
+            f"REFERENCES {referent_table} ({', '.join(remote_cols)})"
+            for name, referent_table, local_cols, remote_cols in foreign_keys
+        )
+        if clauses:
+            queue_statement(f"ALTER TABLE {table_name} {', '.join(clauses)}")
+    else:
+        columns = [column for column in columns if not column_exists(table_name, column.name)]
+        if not columns and not foreign_keys:
+            return
+        with op.batch_alter_table(table_name, recreate='auto') as batch_op:
+            for column in columns:
+                batch_op.add_column(column)
+            for name, referent_table, local_cols, remote_cols in foreign_keys:
+                batch_op.create_foreign_key(name, referent_table, local_cols, remote_cols)
+    if table_name in _columns_cache:
+        _columns_cache[table_name].update((column.name, None) for column in columns)
+
+
+def drop_columns(table_name: str, column_names: list) -> None:
+    """Удаляет колонки таблицы одной операцией.
+
+    На PostgreSQL все DROP COLUMN объединяются в один ALTER TABLE (одна блокировка таблицы);
+    внешние ключи и индексы удаляемых колонок сервер удаляет вместе с ними. На SQLite -
+    одна пересборка таблицы в batch-блоке вместо пересборки на каждую колонку.
+    """
+    if not column_names:
+        return
+    if is_postgresql():
+        clauses = ', '.join(f"DROP COLUMN {column_name}" for column_name in column_names)
+        op.execute(f"ALTER TABLE {table_name} {clauses}")
+    else:
+        with op.batch_alter_table(table_name, recreate='auto') as batch_op:
+            for column_name in column_names:
+                batch_op.drop_column(column_name)
+    if table_name in _columns_cache:
+        for column_name in column_names:
+            _columns_cache[table_name].pop(column_name, None)
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns: str) -> None:
+    """Создает индекс; на PostgreSQL - CONCURRENTLY, без блокировки записи в таблицу.
+
+    Прерванный CREATE INDEX CONCURRENTLY оставляет индекс в состоянии INVALID, который
+    IF NOT EXISTS считает существующим. Такой индекс сначала удаляется (тоже CONCURRENTLY),
+    затем строится заново. CONCURRENTLY нельзя выполнять внутри транзакции.
+    """
+    if not is_postgresql():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+        return
+    with op.get_context().autocommit_block():
+        is_valid = get_bind().execute(
+            sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"),
+            {"index_name": index_name}
+        ).scalar()
+        if is_valid is False:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns})")
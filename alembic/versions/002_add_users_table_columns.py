@@ -7,11 +7,16 @@ Create Date: 2024-11-04 10:45:00.000000
 Добавляет все недостающие столбцы в таблицу users:
 - phone, password_hash, phone_verified и другие базовые поля
 """
+import logging
 from typing import Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
-from sqlalchemy import inspect
+
+from migration_helpers import (
+    add_columns, column_exists, flush_statements, get_bind, queue_statement, reset_inspector,
+    table_exists,
+)
 
 
 # revision identifiers, used by Alembic.
@@ -21,35 +26,80 @@ down_revision: Union[str, None] = '001'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+logger = logging.getLogger('alembic.migration')
+
 
-def column_exists(table_name: str, column_name: str) -> bool:
-    """Проверяет существование колонки в таблице"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    if not inspector.has_table(table_name):
-        return False
-    columns = [col['name'] for col in inspector.get_columns(table_name)]
-    return column_name in columns
+# Серверное значение по умолчанию для целочисленных флагов (создается один раз)
+_ZERO_DEFAULT = sa.text('0')
 
 
-def table_exists(table_name: str) -> bool:
-    """Проверяет существование таблицы"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    return inspector.has_table(table_name)
+# Готовый DDL для PostgreSQL: схема фиксирована, поэтому таблица и индексы
+# создаются без компиляции через SQLAlchemy. Одно выражение на элемент: их
+# объединяет flush_statements()
+USERS_TABLE_SQL = ("""
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL NOT NULL,
+    phone VARCHAR(20) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    phone_verified INTEGER DEFAULT '0',
+    name VARCHAR(100),
+    birth_date VARCHAR(10),
+    birth_time VARCHAR(5),
+    birth_place VARCHAR(200),
+    birth_date_detailed DATE,
+    birth_time_detailed TIME WITHOUT TIME ZONE,
+    birth_time_utc TIMESTAMP WITHOUT TIME ZONE,
+    birth_location_name VARCHAR(200),
+    birth_country VARCHAR(100),
+    birth_latitude DECIMAL(9, 6),
+    birth_longitude DECIMAL(9, 6),
+    timezone_name VARCHAR(100),
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    updated_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id)
+)""",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_phone ON users (phone)",
+)
+
+CONTACTS_TABLE_SQL = ("""
+CREATE TABLE IF NOT EXISTS contacts (
+    id SERIAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    relationship_type VARCHAR(50) NOT NULL,
+    custom_title VARCHAR(100),
+    birth_date VARCHAR(10) NOT NULL,
+    birth_time VARCHAR(5) NOT NULL,
+    birth_place VARCHAR(200) NOT NULL,
+    aliases JSON,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+)""",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_id ON contacts (id)",
+)
 
 
 def upgrade() -> None:
     """Добавляет все недостающие столбцы в таблицу users"""
+    reset_inspector()
+    
+    is_postgresql = get_bind().dialect.name == 'postgresql'
     
-    if not table_exists('users'):
+    if not table_exists('users') and is_postgresql:
+        # Если таблица не существует, создаем её полностью
+        for statement in USERS_TABLE_SQL:
+            queue_statement(statement)
+        logger.info("Таблица users создана")
+    elif not table_exists('users'):
         # Если таблица не существует, создаем её полностью
         op.create_table(
             'users',
             sa.Column('id', sa.Integer(), nullable=False),
             sa.Column('phone', sa.String(length=20), nullable=False),
             sa.Column('password_hash', sa.String(length=255), nullable=False),
-            sa.Column('phone_verified', sa.Integer(), nullable=True, server_default='0'),
+            sa.Column('phone_verified', sa.Integer(), nullable=True, server_default=_ZERO_DEFAULT),
             sa.Column('name', sa.String(length=100), nullable=True),
             sa.Column('birth_date', sa.String(length=10), nullable=True),
             sa.Column('birth_time', sa.String(length=5), nullable=True),
@@ -68,12 +118,11 @@ def upgrade() -> None:
         )
         op.create_index('ix_users_id', 'users', ['id'], unique=False)
         op.create_index('ix_users_phone', 'users', ['phone'], unique=True)
-        print("✅ Таблица users создана")
+        logger.info("Таблица users создана")
     else:
         # Проверяем, есть ли данные в таблице
-        conn = op.get_bind()
-        result = conn.execute(sa.text("SELECT COUNT(*) FROM users")).scalar()
-        has_data = result > 0
+        conn = get_bind()
+        has_data = conn.execute(sa.text("SELECT 1 FROM users LIMIT 1")).first() is not None
         
         # Добавляем недостающие столбцы
         columns_to_add = [
@@ -97,6 +146,7 @@ def upgrade() -> None:
             ('updated_at', sa.DateTime(), True, None),
         ]
         
+        missing_columns = []
         for col_info in columns_to_add:
             col_name = col_info[0]
             col_type = col_info[1]
@@ -107,30 +157,37 @@ def upgrade() -> None:
                 # Если таблица содержит данные и столбец NOT NULL, добавляем как nullable временно
                 if has_data and not nullable:
                     # Добавляем как nullable, чтобы не было ошибки
-                    op.add_column('users', sa.Column(col_name, col_type, nullable=True))
-                    print(f"⚠️ Добавлен столбец users.{col_name} как nullable (в таблице есть данные)")
-                    print(f"⚠️ ВНИМАНИЕ: Необходимо заполнить данные для столбца {col_name} и сделать его NOT NULL вручную!")
+                    missing_columns.append(sa.Column(col_name, col_type, nullable=True))
+                    logger.warning(
+                        "Столбец users.%s добавлен как nullable (в таблице есть данные): "
+                        "необходимо заполнить данные и сделать его NOT NULL вручную",
+                        col_name
+                    )
                 elif default_value:
-                    op.add_column('users', sa.Column(col_name, col_type, nullable=nullable, server_default=str(default_value)))
-                    print(f"✅ Добавлен столбец users.{col_name}")
+                    server_default = _ZERO_DEFAULT if default_value == '0' else str(default_value)
+                    missing_columns.append(sa.Column(col_name, col_type, nullable=nullable, server_default=server_default))
+                    logger.debug("Добавляется столбец users.%s", col_name)
                 else:
-                    op.add_column('users', sa.Column(col_name, col_type, nullable=nullable))
-                    print(f"✅ Добавлен столбец users.{col_name}")
+                    missing_columns.append(sa.Column(col_name, col_type, nullable=nullable))
+                    logger.debug("Добавляется столбец users.%s", col_name)
+        
+        add_columns('users', missing_columns)
+        if missing_columns:
+            logger.info(
+                "Добавлено столбцов в users: %d (%s)",
+                len(missing_columns), ', '.join(column.name for column in missing_columns)
+            )
         
-        # Создаем индексы, если их нет
-        try:
-            # Проверяем существование индекса через SQL
-            conn = op.get_bind()
-            inspector = inspect(conn)
-            indexes = [idx['name'] for idx in inspector.get_indexes('users')]
-            if 'ix_users_phone' not in indexes:
-                op.create_index('ix_users_phone', 'users', ['phone'], unique=True)
-                print("✅ Создан индекс ix_users_phone")
-        except Exception as e:
-            print(f"⚠️ Индекс уже существует или ошибка: {e}")
+        # Создаем индексы, если их нет (IF NOT EXISTS поддерживают и PostgreSQL, и SQLite)
+        queue_statement("CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)")
+        queue_statement("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_phone ON users (phone)")
     
     # Также убеждаемся, что таблица contacts существует
-    if not table_exists('contacts'):
+    if not table_exists('contacts') and is_postgresql:
+        for statement in CONTACTS_TABLE_SQL:
+            queue_statement(statement)
+        logger.info("Таблица contacts создана")
+    elif not table_exists('contacts'):
         op.create_table(
             'contacts',
             sa.Column('id', sa.Integer(), nullable=False),
@@ -147,11 +204,15 @@ def upgrade() -> None:
             sa.PrimaryKeyConstraint('id')
         )
         op.create_index('ix_contacts_id', 'contacts', ['id'], unique=False)
-        print("✅ Таблица contacts создана")
+        logger.info("Таблица contacts создана")
+    
+    # Весь накопленный DDL (PostgreSQL) уходит на сервер одним запросом
+    flush_statements()
 
 
 def downgrade() -> None:
     """Откатывает изменения"""
+    reset_inspector()
     # В production не рекомендуется удалять столбцы без резервной копии
     # Здесь мы просто оставляем функцию пустой
     pass
@@ -6,11 +6,13 @@ Create Date: 2024-11-04 18:45:00.000000
 
 Исправляет структуру: делает поля name, birth_date, birth_time, birth_place nullable в таблице users
 """
+import logging
 from typing import Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
-from sqlalchemy import inspect
+
+from migration_helpers import column_exists, get_bind, get_column, reset_inspector, snapshot_schema
 
 
 # revision identifiers, used by Alembic.
@@ -19,57 +21,54 @@ down_revision: Union[str, None] = '002'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
-
-def column_exists(table_name: str, column_name: str) -> bool:
-    """Проверяет существование колонки в таблице"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    if not inspector.has_table(table_name):
-        return False
-    columns = [col['name'] for col in inspector.get_columns(table_name)]
-    return column_name in columns
+logger = logging.getLogger('alembic.migration')
 
 
 def upgrade() -> None:
     """Делает поля name, birth_date, birth_time, birth_place nullable в таблице users"""
+    reset_inspector()
+    dialect = get_bind().dialect.name
     
     # Для PostgreSQL
-    if op.get_bind().dialect.name == 'postgresql':
+    if dialect == 'postgresql':
         # Поля, которые нужно сделать nullable
-        fields_to_fix = [
-            ('name', sa.String(length=100)),
-            ('birth_date', sa.String(length=10)),
-            ('birth_time', sa.String(length=5)),
-            ('birth_place', sa.String(length=200))
+        fields_to_fix = ['name', 'birth_date', 'birth_time', 'birth_place']
+        
+        # Читаем столбцы users один раз и принимаем все решения по этому снимку
+        snapshot_schema(['users'])
+        fixed_fields = [
+            field_name for field_name in fields_to_fix
+            if get_column('users', field_name) is not None
+            and not get_column('users', field_name)['nullable']
         ]
         
-        for field_name, field_type in fields_to_fix:
-            if column_exists('users', field_name):
-                # Получаем информацию о текущем столбце
-                conn = op.get_bind()
-                inspector = inspect(conn)
-                columns = inspector.get_columns('users')
-                field_col = next((col for col in columns if col['name'] == field_name), None)
-                
-                if field_col and not field_col['nullable']:
-                    # Заменяем пустые строки на NULL для строковых полей
-                    if field_name in ['name', 'birth_date', 'birth_time', 'birth_place']:
-                        op.execute(f"UPDATE users SET {field_name} = NULL WHERE {field_name} = ''")
-                    
-                    # Делаем столбец nullable
-                    op.alter_column('users', field_name,
-                                  existing_type=field_type,
-                                  nullable=True)
-                    print(f"✅ Столбец users.{field_name} теперь nullable")
+        if fixed_fields:
+            # Снимаем NOT NULL со всех столбцов одним ALTER TABLE (одна блокировка users)
+            clauses = ', '.join(f"ALTER COLUMN {field} DROP NOT NULL" for field in fixed_fields)
+            
+            # Заменяем пустые строки на NULL одним UPDATE (после снятия NOT NULL),
+            # переписывая только строки, где пустая строка действительно есть
+            assignments = ', '.join(f"{field} = NULLIF({field}, '')" for field in fixed_fields)
+            condition = ' OR '.join(f"{field} = ''" for field in fixed_fields)
+            
+            # Оба выражения уходят на сервер одним запросом
+            op.execute(
+                f"ALTER TABLE users {clauses};\n"
+                f"UPDATE users SET {assignments} WHERE {condition}"
+            )
+            logger.info("Столбцы users стали nullable: %s", ', '.join(fixed_fields))
     else:
         # Для SQLite - просто проверяем, что столбцы существуют
         for field_name, _ in [('name', None), ('birth_date', None), ('birth_time', None), ('birth_place', None)]:
             if column_exists('users', field_name):
-                print(f"✅ Столбец users.{field_name} существует (SQLite не требует явного изменения)")
+                logger.debug("Столбец users.%s существует (SQLite не требует явного изменения)", field_name)
 
 
 def downgrade() -> None:
     """Откатывает изменения - делает поля NOT NULL"""
+    reset_inspector()
+    dialect = get_bind().dialect.name
+    
     # Заполняем NULL значения перед установкой NOT NULL
     fields_to_restore = ['name', 'birth_date', 'birth_time', 'birth_place']
     
@@ -78,7 +77,7 @@ def downgrade() -> None:
             op.execute(f"UPDATE users SET {field_name} = '' WHERE {field_name} IS NULL")
     
     # Делаем столбцы NOT NULL
-    if op.get_bind().dialect.name == 'postgresql':
+    if dialect == 'postgresql':
         op.alter_column('users', 'name',
                       existing_type=sa.String(length=100),
                       nullable=False)
@@ -11,11 +11,15 @@ Create Date: 2025-01-05 14:00:00.000000
 - current_longitude
 - current_timezone_name
 """
+import logging
 from typing import Sequence, Union
 
-from alembic import op
 import sqlalchemy as sa
-from sqlalchemy import inspect
+
+from migration_helpers import (
+    add_columns, column_exists, drop_columns, flush_statements, get_bind, reset_inspector,
+    table_exists,
+)
 
 
 # revision identifiers, used by Alembic.
@@ -24,29 +28,15 @@ down_revision: Union[str, None] = '005'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
-
-def column_exists(table_name: str, column_name: str) -> bool:
-    """Проверяет существование колонки в таблице"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    if not inspector.has_table(table_name):
-        return False
-    columns = [col['name'] for col in inspector.get_columns(table_name)]
-    return column_name in columns
-
-
-def table_exists(table_name: str) -> bool:
-    """Проверяет существование таблицы"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    return inspector.has_table(table_name)
+logger = logging.getLogger('alembic.migration')
 
 
 def upgrade() -> None:
     """Добавляет поля текущего местоположения в таблицу users"""
+    reset_inspector()
     
     if not table_exists('users'):
-        print("⚠️ Таблица users не существует, пропускаем миграцию")
+        logger.warning("Таблица users не существует, пропускаем миграцию")
         return
     
     columns_to_add = [
@@ -57,20 +47,39 @@ def upgrade() -> None:
         ('current_timezone_name', sa.String(100), None),
     ]
     
+    if get_bind().dialect.name == 'postgresql':
+        # Существование столбцов проверяет сам сервер (ADD COLUMN IF NOT EXISTS)
+        add_columns('users', [
+            sa.Column(column_name, column_type, nullable=True)
+            for column_name, column_type, _ in columns_to_add
+        ])
+        flush_statements()
+        logger.info("Поля текущего местоположения добавлены (если отсутствовали)")
+        return
+    
+    missing_columns = []
     for column_name, column_type, default_value in columns_to_add:
         if not column_exists('users', column_name):
-            print(f"Добавление поля {column_name} в таблицу users...")
-            op.add_column('users', sa.Column(column_name, column_type, nullable=True))
-            print(f"✅ {column_name} добавлено")
+            logger.debug("Добавляется поле users.%s", column_name)
+            missing_columns.append(sa.Column(column_name, column_type, nullable=True))
         else:
-            print(f"ℹ️ {column_name} уже существует")
+            logger.debug("Поле users.%s уже существует", column_name)
+    
+    add_columns('users', missing_columns)
+    flush_statements()
+    if missing_columns:
+        logger.info(
+            "Добавлено полей в users: %d (%s)",
+            len(missing_columns), ', '.join(column.name for column in missing_columns)
+        )
 
 
 def downgrade() -> None:
     """Удаляет поля текущего местоположения из таблицы users"""
+    reset_inspector()
     
     if not table_exists('users'):
-        print("⚠️ Таблица users не существует, пропускаем откат")
+        logger.warning("Таблица users не существует, пропускаем откат")
         return
     
     columns_to_remove = [
@@ -81,10 +90,16 @@ def downgrade() -> None:
         'current_location_name',
     ]
     
+    existing_to_remove = []
     for column_name in columns_to_remove:
         if column_exists('users', column_name):
-            print(f"Удаление поля {column_name} из таблицы users...")
-            op.drop_column('users', column_name)
-            print(f"✅ {column_name} удалено")
+            logger.debug("Удаляется поле users.%s", column_name)
+            existing_to_remove.append(column_name)
         else:
-            print(f"ℹ️ {column_name} не существует")
+            logger.debug("Поле users.%s не существует", column_name)
+    
+    drop_columns('users', existing_to_remove)
+    if existing_to_remove:
+        logger.info(
+            "Удалено полей из users: %d (%s)", len(existing_to_remove), ', '.join(existing_to_remove)
+        )
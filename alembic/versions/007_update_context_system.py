@@ -8,12 +8,17 @@ Create Date: 2025-01-XX XX:XX:XX.XXXXXX
 - Добавляет поля в chat_sessions: is_active, parent_session_id, session_type
 - Обновляет context_entries: добавляет session_id, новые поля, vector_id
 """
+import logging
 from typing import Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
-from sqlalchemy import inspect
-from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects import postgresql
+
+from migration_helpers import (
+    add_columns, column_exists, drop_columns, flush_statements, get_bind, get_inspector,
+    reset_inspector, snapshot_schema, table_exists,
+)
 
 
 # revision identifiers, used by Alembic.
@@ -22,209 +27,268 @@ down_revision: Union[str, None] = '006'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+logger = logging.getLogger('alembic.migration')
+
 
-def column_exists(table_name: str, column_name: str) -> bool:
-    """Проверяет существование колонки в таблице"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    if not inspector.has_table(table_name):
-        return False
-    columns = [col['name'] for col in inspector.get_columns(table_name)]
-    return column_name in columns
+# Таблицы, которые изменяет эта миграция
+MIGRATED_TABLES = ('chat_sessions', 'context_entries')
 
+# Размер пакета при заполнении context_entries.session_id на PostgreSQL
+BACKFILL_BATCH_SIZE = 5000
 
-def table_exists(table_name: str) -> bool:
-    """Проверяет существование таблицы"""
-    conn = op.get_bind()
-    inspector = inspect(conn)
-    return inspector.has_table(table_name)
 
+def backfill_latest_session_postgresql() -> None:
+    """Проставляет session_id последней сессии пользователя пакетами по диапазонам id.
 
-def is_postgresql() -> bool:
-    """Проверяет, используется ли PostgreSQL"""
-    conn = op.get_bind()
-    return conn.dialect.name == 'postgresql'
+    Каждый пакет фиксируется отдельно (autocommit_block), поэтому объем WAL и блокировок
+    не растет вместе с таблицей. Запрос идемпотентен: трогает только строки с session_id IS NULL.
+    """
+    min_id, max_id = get_bind().execute(
+        sa.text("SELECT MIN(id), MAX(id) FROM context_entries WHERE session_id IS NULL")
+    ).first()
+    if min_id is None:
+        return
+    
+    batch_update = sa.text("""
+        UPDATE context_entries AS ce
+        SET session_id = s.id
+        FROM (
+            SELECT DISTINCT ON (user_id) id, user_id
+            FROM chat_sessions
+            ORDER BY user_id, created_at DESC
+        ) AS s
+        WHERE s.user_id = ce.user_id
+        AND ce.session_id IS NULL
+        AND ce.id >= :start_id AND ce.id < :end_id
+    """)
+    with op.get_context().autocommit_block():
+        for start_id in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+            op.execute(batch_update.bindparams(start_id=start_id, end_id=start_id + BACKFILL_BATCH_SIZE))
 
 
 def upgrade() -> None:
     """Обновление схемы для системы контекста"""
+    reset_inspector()
+    snapshot_schema(MIGRATED_TABLES)
+    
+    # Диалект определяется один раз на всю миграцию
+    bind = get_bind()
+    is_pg = bind.dialect.name == 'postgresql'
     
     # ============ Обновление chat_sessions ============
     if table_exists('chat_sessions'):
         # Обновляем title на nullable=False (пока через ALTER если нужно)
         # В SQLite ALTER TABLE ограничен, поэтому пропускаем изменение NOT NULL
         
-        # Добавляем is_active
+        # Собираем недостающие колонки, чтобы добавить их одним batch-блоком
+        new_columns = []
+        foreign_keys = []
+        
+        # Добавляем is_active: server_default заполняет существующие сессии значением 1
+        # прямо в ADD COLUMN (на PostgreSQL 11+ без перезаписи таблицы), отдельный UPDATE не нужен
         if not column_exists('chat_sessions', 'is_active'):
-            op.add_column('chat_sessions', sa.Column('is_active', sa.Integer(), server_default='1'))
-            # Устанавливаем все существующие сессии как активные
-            op.execute("UPDATE chat_sessions SET is_active = 1 WHERE is_active IS NULL")
+            new_columns.append(sa.Column('is_active', sa.Integer(), server_default='1'))
         
         # Добавляем parent_session_id
         if not column_exists('chat_sessions', 'parent_session_id'):
-            op.add_column('chat_sessions', sa.Column('parent_session_id', sa.Integer(), nullable=True))
-            op.create_foreign_key(
-                'fk_chat_sessions_parent',
-                'chat_sessions',
-                'chat_sessions',
-                ['parent_session_id'],
-                ['id']
-            )
+            new_columns.append(sa.Column('parent_session_id', sa.Integer(), nullable=True))
+            foreign_keys.append(('fk_chat_sessions_parent', 'chat_sessions', ['parent_session_id'], ['id']))
         
         # Добавляем session_type
         if not column_exists('chat_sessions', 'session_type'):
-            op.add_column('chat_sessions', sa.Column('session_type', sa.String(50), server_default='regular'))
+            new_columns.append(sa.Column('session_type', sa.String(50), server_default='regular'))
+        
+        add_columns('chat_sessions', new_columns, foreign_keys)
+        flush_statements()
+        if new_columns:
+            logger.info(
+                "Добавлено полей в chat_sessions: %d (%s)",
+                len(new_columns), ', '.join(column.name for column in new_columns)
+            )
         
         # Увеличиваем длину title до 500
         if column_exists('chat_sessions', 'title'):
             # В SQLite нельзя изменить тип колонки напрямую
-            if is_postgresql():
+            if is_pg:
                 op.alter_column('chat_sessions', 'title', type_=sa.String(500), existing_nullable=True)
     
     # ============ Обновление context_entries ============
     if table_exists('context_entries'):
+        new_columns = []
+        foreign_keys = []
+        
         # Добавляем session_id (обязательное поле)
-        if not column_exists('context_entries', 'session_id'):
+        add_session_id = not column_exists('context_entries', 'session_id')
+        if add_session_id:
             # Сначала создаем колонку как nullable
-            op.add_column('context_entries', sa.Column('session_id', sa.Integer(), nullable=True))
-            
-            # Если есть записи, пытаемся связать их с сессиями
-            # Для существующих записей создаем связь через user_id (если есть сессии)
-            op.execute("""
-                UPDATE context_entries 
-                SET session_id = (
-                    SELECT id FROM chat_sessions 
-                    WHERE chat_sessions.user_id = context_entries.user_id 
-                    ORDER BY chat_sessions.created_at DESC 
-                    LIMIT 1
-                )
-                WHERE session_id IS NULL
-            """)
-            
-            # Теперь делаем NOT NULL только если все записи имеют session_id
-            # В SQLite это сложно, поэтому оставляем nullable для совместимости
-            if is_postgresql():
-                # Создаем временную сессию для записей без сессии (если такие есть)
-                op.execute("""
-                    INSERT INTO chat_sessions (user_id, title, created_at, updated_at, is_active, session_type)
-                    SELECT DISTINCT user_id, 'Legacy Session', datetime('now'), datetime('now'), 0, 'regular'
-                    FROM context_entries
-                    WHERE session_id IS NULL
-                    ON CONFLICT DO NOTHING
-                """)
-                
-                op.execute("""
-                    UPDATE context_entries 
-                    SET session_id = (
-                        SELECT id FROM chat_sessions 
-                        WHERE chat_sessions.user_id = context_entries.user_id 
-                        AND chat_sessions.title = 'Legacy Session'
-                        LIMIT 1
-                    )
-                    WHERE session_id IS NULL
-                """)
+            new_columns.append(sa.Column('session_id', sa.Integer(), nullable=True))
+            if not is_pg:
+                # В SQLite внешний ключ добавляется только пересборкой таблицы - в том же batch-блоке.
+                # На PostgreSQL он создается после заполнения session_id (см. ниже), чтобы
+                # проверка ссылочной целостности выполнилась один раз, а не на каждую строку
+                foreign_keys.append(('fk_context_entries_session', 'chat_sessions', ['session_id'], ['id']))
         
         # Добавляем новые поля
         if not column_exists('context_entries', 'user_message'):
-            op.add_column('context_entries', sa.Column('user_message', sa.Text(), nullable=True))
+            new_columns.append(sa.Column('user_message', sa.Text(), nullable=True))
         
         if not column_exists('context_entries', 'ai_response'):
-            op.add_column('context_entries', sa.Column('ai_response', sa.Text(), nullable=True))
+            new_columns.append(sa.Column('ai_response', sa.Text(), nullable=True))
         
         if not column_exists('context_entries', 'emotional_state'):
-            op.add_column('context_entries', sa.Column('emotional_state', sa.String(100), nullable=True))
+            new_columns.append(sa.Column('emotional_state', sa.String(100), nullable=True))
         
         if not column_exists('context_entries', 'event_description'):
-            op.add_column('context_entries', sa.Column('event_description', sa.Text(), nullable=True))
+            new_columns.append(sa.Column('event_description', sa.Text(), nullable=True))
         
         if not column_exists('context_entries', 'insight_text'):
-            op.add_column('context_entries', sa.Column('insight_text', sa.Text(), nullable=True))
+            new_columns.append(sa.Column('insight_text', sa.Text(), nullable=True))
         
         # astro_context: JSONB для PostgreSQL, JSON для SQLite
         if not column_exists('context_entries', 'astro_context'):
-            if is_postgresql():
-                op.add_column('context_entries', sa.Column('astro_context', postgresql.JSONB, nullable=True))
+            if is_pg:
+                new_columns.append(sa.Column('astro_context', postgresql.JSONB, nullable=True))
             else:
-                op.add_column('context_entries', sa.Column('astro_context', sa.JSON(), nullable=True))
+                new_columns.append(sa.Column('astro_context', sa.JSON(), nullable=True))
         
         if not column_exists('context_entries', 'priority'):
-            op.add_column('context_entries', sa.Column('priority', sa.Integer(), server_default='1'))
+            new_columns.append(sa.Column('priority', sa.Integer(), server_default='1'))
         
         if not column_exists('context_entries', 'entry_type'):
-            op.add_column('context_entries', sa.Column('entry_type', sa.String(20), server_default='auto'))
+            new_columns.append(sa.Column('entry_type', sa.String(20), server_default='auto'))
         
         if not column_exists('context_entries', 'vector_id'):
-            op.add_column('context_entries', sa.Column('vector_id', sa.String(36), nullable=True))
+            new_columns.append(sa.Column('vector_id', sa.String(36), nullable=True))
+        
+        add_updated_at = not column_exists('context_entries', 'updated_at')
+        if add_updated_at:
+            new_columns.append(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        
+        add_columns('context_entries', new_columns, foreign_keys)
+        flush_statements()
+        if new_columns:
+            logger.info(
+                "Добавлено полей в context_entries: %d (%s)",
+                len(new_columns), ', '.join(column.name for column in new_columns)
+            )
+        
+        # Заполнение идемпотентно (только session_id IS NULL) и на PostgreSQL фиксируется
+        # пакетами, поэтому выполняется и при повторном запуске после прерванной миграции
+        if add_session_id or column_exists('context_entries', 'session_id'):
+            # Если есть записи, пытаемся связать их с сессиями
+            # Для существующих записей создаем связь через user_id (если есть сессии)
+            # Последняя сессия каждого пользователя вычисляется один раз и присоединяется,
+            # а не ищется коррелированным подзапросом для каждой записи
+            if is_pg:
+                backfill_latest_session_postgresql()
+            elif bind.dialect.server_version_info >= (3, 33):
+                # UPDATE ... FROM доступен в SQLite начиная с 3.33
+                op.execute("""
+                    UPDATE context_entries
+                    SET session_id = s.id
+                    FROM (
+                        SELECT id, user_id,
+                               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC) AS rn
+                        FROM chat_sessions
+                    ) AS s
+                    WHERE s.user_id = context_entries.user_id
+                    AND s.rn = 1
+                    AND context_entries.session_id IS NULL
+                """)
+            else:
+                op.execute("""
+                    UPDATE context_entries 
+                    SET session_id = (
+                        SELECT id FROM chat_sessions 
+                        WHERE chat_sessions.user_id = context_entries.user_id 
+                        ORDER BY chat_sessions.created_at DESC 
+                        LIMIT 1
+                    )
+                    WHERE session_id IS NULL
+                """)
+            
+            # Теперь делаем NOT NULL только если все записи имеют session_id
+            # В SQLite это сложно, поэтому оставляем nullable для совместимости
+            has_orphans = bind.execute(
+                sa.text("SELECT 1 FROM context_entries WHERE session_id IS NULL LIMIT 1")
+            ).first() is not None
+            if is_pg and has_orphans:
+                # Создаем временную сессию для записей без сессии и сразу привязываем к ней
+                # записи: INSERT ... RETURNING в CTE передает id новых сессий в UPDATE
+                # без повторного поиска по chat_sessions. У chat_sessions нет уникальных
+                # ограничений кроме первичного ключа, поэтому ON CONFLICT не нужен
+                op.execute("""
+                    WITH new_sessions AS (
+                        INSERT INTO chat_sessions (user_id, title, created_at, updated_at, is_active, session_type)
+                        SELECT DISTINCT user_id, 'Legacy Session', NOW(), NOW(), 0, 'regular'
+                        FROM context_entries
+                        WHERE session_id IS NULL
+                        RETURNING id, user_id
+                    )
+                    UPDATE context_entries
+                    SET session_id = new_sessions.id
+                    FROM new_sessions
+                    WHERE new_sessions.user_id = context_entries.user_id
+                    AND context_entries.session_id IS NULL
+                """)
+                logger.info("Записи без сессии привязаны к созданным Legacy Session")
         
-        if not column_exists('context_entries', 'updated_at'):
-            op.add_column('context_entries', sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if add_updated_at:
             # Устанавливаем updated_at = created_at для существующих записей
             op.execute("UPDATE context_entries SET updated_at = created_at WHERE updated_at IS NULL")
         
-        # Создаем внешний ключ для session_id (если еще нет)
-        # Проверяем существование внешнего ключа
-        try:
-            if is_postgresql():
-                # В PostgreSQL проверяем через information_schema
-                result = op.get_bind().execute(sa.text("""
-                    SELECT COUNT(*) FROM information_schema.table_constraints 
-                    WHERE constraint_name = 'fk_context_entries_session'
-                    AND table_name = 'context_entries'
-                """))
-                if result.scalar() == 0:
-                    op.create_foreign_key(
-                        'fk_context_entries_session',
-                        'context_entries',
-                        'chat_sessions',
-                        ['session_id'],
-                        ['id']
-                    )
-        except Exception as e:
-            print(f"⚠️ Не удалось создать внешний ключ: {e}")
+        # Индекс по session_id: без него каждое удаление/изменение chat_sessions проверяет
+        # внешний ключ полным просмотром context_entries. Частичный индекс не хранит NULL-строки
+        if column_exists('context_entries', 'session_id'):
+            op.execute(
+                "CREATE INDEX IF NOT EXISTS ix_context_entries_session_id "
+                "ON context_entries (session_id) WHERE session_id IS NOT NULL"
+            )
+        
+        # Создаем внешний ключ для session_id (если еще нет) - уже после заполнения данных
+        # (на SQLite он уже создан пересборкой таблицы). Существующие внешние ключи
+        # берутся из рефлексии общего Inspector; ключ, созданный create_all под другим
+        # именем, тоже считается
+        if is_pg:
+            session_fk_exists = any(
+                fk['name'] == 'fk_context_entries_session' or fk['constrained_columns'] == ['session_id']
+                for fk in get_inspector().get_foreign_keys('context_entries')
+            )
+            if not session_fk_exists:
+                op.create_foreign_key(
+                    'fk_context_entries_session',
+                    'context_entries',
+                    'chat_sessions',
+                    ['session_id'],
+                    ['id']
+                )
+                logger.info("Внешний ключ fk_context_entries_session создан")
 
 
 def downgrade() -> None:
     """Откат изменений"""
+    reset_inspector()
+    snapshot_schema(MIGRATED_TABLES)
     
     # Удаляем новые поля из context_entries
     if table_exists('context_entries'):
+        # astro_context - новый JSONB, session_id - связь с сессией (вместе с ее внешним ключом)
         columns_to_drop = [
             'vector_id', 'entry_type', 'priority', 'insight_text',
             'event_description', 'emotional_state', 'ai_response',
-            'user_message', 'updated_at'
+            'user_message', 'updated_at', 'astro_context', 'session_id'
         ]
         
-        for col in columns_to_drop:
-            if column_exists('context_entries', col):
-                op.drop_column('context_entries', col)
-        
-        # Удаляем astro_context (новый JSONB)
-        if column_exists('context_entries', 'astro_context'):
-            # Проверяем, не является ли это старым полем Text
-            # Если это новый JSONB, удаляем его
-            op.drop_column('context_entries', 'astro_context')
-        
-        # Удаляем session_id (осторожно, может быть данные)
         if column_exists('context_entries', 'session_id'):
-            # Удаляем внешний ключ
-            try:
-                op.drop_constraint('fk_context_entries_session', 'context_entries', type_='foreignkey')
-            except:
-                pass
-            op.drop_column('context_entries', 'session_id')
+            op.execute("DROP INDEX IF EXISTS ix_context_entries_session_id")
+        
+        drop_columns('context_entries', [
+            col for col in columns_to_drop if column_exists('context_entries', col)
+        ])
     
-    # Удаляем новые поля из chat_sessions
+    # Удаляем новые поля из chat_sessions (parent_session_id - вместе с fk_chat_sessions_parent)
     if table_exists('chat_sessions'):
-        if column_exists('chat_sessions', 'session_type'):
-            op.drop_column('chat_sessions', 'session_type')
-        
-        if column_exists('chat_sessions', 'parent_session_id'):
-            try:
-                op.drop_constraint('fk_chat_sessions_parent', 'chat_sessions', type_='foreignkey')
-            except:
-                pass
-            op.drop_column('chat_sessions', 'parent_session_id')
-        
-        if column_exists('chat_sessions', 'is_active'):
-            op.drop_column('chat_sessions', 'is_active')
-
+        drop_columns('chat_sessions', [
+            col for col in ('session_type', 'parent_session_id', 'is_active')
+            if column_exists('chat_sessions', col)
+        ])
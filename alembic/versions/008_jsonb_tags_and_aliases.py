@@ -0,0 +1,96 @@
+"""Convert tags and aliases to JSONB with GIN indexes
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-02-01 12:00:00.000000
+
+Для PostgreSQL переводит JSON-поля, по которым идет фильтрация, в JSONB
+и добавляет к ним GIN-индексы:
+- context_entries.tags (фильтр записей контекста по тегам)
+- contacts.aliases (поиск контакта по упоминанию в сообщении)
+
+На SQLite JSONB и GIN недоступны, миграция ничего не меняет.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from migration_helpers import get_bind, get_column, reset_inspector, snapshot_schema, table_exists
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.migration')
+
+# (таблица, колонка, GIN-индекс)
+JSONB_COLUMNS = [
+    ('context_entries', 'tags', 'ix_context_entries_tags_gin'),
+    ('contacts', 'aliases', 'ix_contacts_aliases_gin'),
+]
+
+
+# Таблицы, которые изменяет эта миграция
+MIGRATED_TABLES = sorted({table_name for table_name, _, _ in JSONB_COLUMNS})
+
+
+def upgrade() -> None:
+    """Переводит tags/aliases в JSONB и создает GIN-индексы (только PostgreSQL)"""
+    reset_inspector()
+    is_pg = get_bind().dialect.name == 'postgresql'
+
+    if not is_pg:
+        logger.info("JSONB/GIN поддерживаются только в PostgreSQL, пропускаем миграцию")
+        return
+
+    snapshot_schema(MIGRATED_TABLES)
+
+    for table_name, column_name, index_name in JSONB_COLUMNS:
+        if not table_exists(table_name):
+            logger.warning("Таблица %s не существует, пропускаем %s", table_name, column_name)
+            continue
+
+        column = get_column(table_name, column_name)
+        if column is None:
+            logger.warning("Колонка %s.%s не существует, пропускаем", table_name, column_name)
+            continue
+
+        if not isinstance(column['type'], postgresql.JSONB):
+            op.execute(
+                f"ALTER TABLE {table_name} "
+                f"ALTER COLUMN {column_name} TYPE JSONB USING {column_name}::jsonb"
+            )
+            logger.info("%s.%s переведена в JSONB", table_name, column_name)
+
+        # jsonb_ops (класс операторов по умолчанию) обслуживает и @>, и ?|
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING GIN ({column_name})")
+        logger.info("GIN-индекс %s создан", index_name)
+
+
+def downgrade() -> None:
+    """Удаляет GIN-индексы и возвращает tags/aliases к типу JSON"""
+    reset_inspector()
+
+    if get_bind().dialect.name != 'postgresql':
+        return
+
+    snapshot_schema(MIGRATED_TABLES)
+
+    for table_name, column_name, index_name in JSONB_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+        if not table_exists(table_name):
+            continue
+
+        column = get_column(table_name, column_name)
+        if column is not None and isinstance(column['type'], postgresql.JSONB):
+            op.execute(
+                f"ALTER TABLE {table_name} "
+                f"ALTER COLUMN {column_name} TYPE JSON USING {column_name}::json"
+            )
+            logger.info("%s.%s возвращена к типу JSON", table_name, column_name)
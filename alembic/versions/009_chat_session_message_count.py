@@ -0,0 +1,84 @@
+"""Add message_count counter to chat_sessions
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-02-03 12:00:00.000000
+
+Добавляет в chat_sessions счетчик сообщений message_count, который увеличивается
+вместе со вставкой сообщений, и заполняет его для существующих сессий одним
+UPDATE с GROUP BY по chat_messages.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import (
+    column_exists, drop_columns, get_bind, reset_inspector, snapshot_schema, table_exists,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.migration')
+
+
+def upgrade() -> None:
+    """Добавляет chat_sessions.message_count и заполняет его по chat_messages"""
+    reset_inspector()
+    snapshot_schema(['chat_sessions'])
+    bind = get_bind()
+
+    if not table_exists('chat_sessions'):
+        logger.warning("Таблица chat_sessions не существует, пропускаем миграцию")
+        return
+
+    if column_exists('chat_sessions', 'message_count'):
+        logger.info("chat_sessions.message_count уже существует")
+        return
+
+    # server_default заполняет существующие строки нулем прямо в ADD COLUMN
+    op.add_column(
+        'chat_sessions',
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0')
+    )
+
+    if table_exists('chat_messages'):
+        if bind.dialect.name == 'postgresql' or bind.dialect.server_version_info >= (3, 33):
+            # Количество сообщений всех сессий считается одним GROUP BY
+            # (UPDATE ... FROM доступен в SQLite начиная с 3.33)
+            op.execute("""
+                UPDATE chat_sessions
+                SET message_count = m.cnt
+                FROM (
+                    SELECT session_id, COUNT(*) AS cnt
+                    FROM chat_messages
+                    GROUP BY session_id
+                ) AS m
+                WHERE m.session_id = chat_sessions.id
+            """)
+        else:
+            op.execute("""
+                UPDATE chat_sessions
+                SET message_count = (
+                    SELECT COUNT(*) FROM chat_messages
+                    WHERE chat_messages.session_id = chat_sessions.id
+                )
+            """)
+
+    logger.info("chat_sessions.message_count добавлено и заполнено")
+
+
+def downgrade() -> None:
+    """Удаляет chat_sessions.message_count"""
+    reset_inspector()
+    snapshot_schema(['chat_sessions'])
+
+    if column_exists('chat_sessions', 'message_count'):
+        drop_columns('chat_sessions', ['message_count'])
+        logger.info("chat_sessions.message_count удалено")
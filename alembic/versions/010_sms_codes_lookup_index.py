@@ -0,0 +1,45 @@
+"""Add composite lookup index to sms_codes
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-02-05 12:00:00.000000
+
+Добавляет индекс sms_codes (phone, used, created_at): по нему выполняются
+проверка подтвержденного кода при регистрации и сбросе пароля и поиск
+последнего неиспользованного кода при проверке SMS.
+На PostgreSQL индекс строится CONCURRENTLY, без блокировки записи в sms_codes;
+недостроенный (INVALID) индекс прерванного запуска пересоздается.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+
+from migration_helpers import create_index_concurrently, reset_inspector, table_exists
+
+
+# revision identifiers, used by Alembic.
+revision: str = '010'
+down_revision: Union[str, None] = '009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.migration')
+
+INDEX_NAME = 'ix_sms_codes_phone_used_created_at'
+
+
+def upgrade() -> None:
+    """Создает индекс sms_codes (phone, used, created_at)"""
+    reset_inspector()
+    if not table_exists('sms_codes'):
+        logger.warning("Таблица sms_codes не существует, пропускаем миграцию")
+        return
+
+    create_index_concurrently(INDEX_NAME, 'sms_codes', 'phone, used, created_at')
+    logger.info("Индекс %s создан", INDEX_NAME)
+
+
+def downgrade() -> None:
+    """Удаляет индекс sms_codes (phone, used, created_at)"""
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
@@ -0,0 +1,44 @@
+"""Add user_id index to contacts
+
+Revision ID: 011
+Revises: 010
+Create Date: 2025-02-07 12:00:00.000000
+
+Добавляет индекс contacts (user_id): по нему выбираются контакты пользователя
+для списка контактов и для поиска упоминаний в чате.
+На PostgreSQL индекс строится CONCURRENTLY, без блокировки записи в contacts;
+недостроенный (INVALID) индекс прерванного запуска пересоздается.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+
+from migration_helpers import create_index_concurrently, reset_inspector, table_exists
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011'
+down_revision: Union[str, None] = '010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.migration')
+
+INDEX_NAME = 'ix_contacts_user_id'
+
+
+def upgrade() -> None:
+    """Создает индекс contacts (user_id)"""
+    reset_inspector()
+    if not table_exists('contacts'):
+        logger.warning("Таблица contacts не существует, пропускаем миграцию")
+        return
+
+    create_index_concurrently(INDEX_NAME, 'contacts', 'user_id')
+    logger.info("Индекс %s создан", INDEX_NAME)
+
+
+def downgrade() -> None:
+    """Удаляет индекс contacts (user_id)"""
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
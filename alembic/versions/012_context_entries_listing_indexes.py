@@ -0,0 +1,53 @@
+"""Add listing indexes to context_entries
+
+Revision ID: 012
+Revises: 011
+Create Date: 2025-02-09 12:00:00.000000
+
+Добавляет составные индексы context_entries для выборки записей пользователя
+(и записей его сессии) по убыванию created_at:
+- ix_context_entries_user_id_created_at (user_id, created_at)
+- ix_context_entries_user_id_session_id_created_at (user_id, session_id, created_at)
+Сортировка ORDER BY created_at DESC выполняется обратным проходом по индексу.
+На PostgreSQL индексы строятся CONCURRENTLY, без блокировки записи в context_entries;
+недостроенные (INVALID) индексы прерванного запуска пересоздаются.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+
+from migration_helpers import create_index_concurrently, reset_inspector, table_exists
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012'
+down_revision: Union[str, None] = '011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.migration')
+
+# (индекс, колонки)
+INDEXES = [
+    ('ix_context_entries_user_id_created_at', 'user_id, created_at'),
+    ('ix_context_entries_user_id_session_id_created_at', 'user_id, session_id, created_at'),
+]
+
+
+def upgrade() -> None:
+    """Создает составные индексы context_entries"""
+    reset_inspector()
+    if not table_exists('context_entries'):
+        logger.warning("Таблица context_entries не существует, пропускаем миграцию")
+        return
+
+    for index_name, columns in INDEXES:
+        create_index_concurrently(index_name, 'context_entries', columns)
+        logger.info("Индекс %s создан", index_name)
+
+
+def downgrade() -> None:
+    """Удаляет составные индексы context_entries"""
+    for index_name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
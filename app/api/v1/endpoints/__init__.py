@@ -1,22 +1,53 @@
-"""API v1 Endpoints"""
-from .auth import router as auth_router
-from .users import router as users_router
-from .astrology import router as astrology_router
-from .contacts import router as contacts_router
-from .ai import router as ai_router
-from .context import router as context_router
-from .natal_chart import router as natal_chart_router
-from .general import router as general_router
-
-try:
-    from .geocoding import router as geocoding_router
-except ImportError:
-    geocoding_router = None
-
-try:
-    from .guest import router as guest_router
-except ImportError:
-    guest_router = None
+"""API v1 Endpoints
+
+Роутеры загружаются лениво (PEP 562): модуль эндпоинта со всеми его схемами
+и сервисами импортируется при первом обращении к атрибуту пакета.
+"""
+import importlib
+import importlib.util
+
+# Имя роутера -> модуль эндпоинта
+_ROUTERS = {
+    "auth_router": "auth",
+    "users_router": "users",
+    "astrology_router": "astrology",
+    "contacts_router": "contacts",
+    "ai_router": "ai",
+    "context_router": "context",
+    "natal_chart_router": "natal_chart",
+    "general_router": "general",
+}
+
+# Необязательные роутеры: отсутствующий модуль отсекается через find_spec
+# без попытки импорта, его роутер становится None
+_OPTIONAL_ROUTERS = {
+    "geocoding_router": "geocoding",
+    "guest_router": "guest",
+}
+
+
+def _load_optional_router(module_name: str):
+    """Возвращает роутер необязательного модуля или None, если модуль недоступен"""
+    if importlib.util.find_spec(f".{module_name}", __name__) is None:
+        return None
+    try:
+        return importlib.import_module(f".{module_name}", __name__).router
+    except ImportError:
+        # Модуль есть, но не хватает его зависимостей
+        return None
+
+
+def __getattr__(name: str):
+    if name in _ROUTERS:
+        router = importlib.import_module(f".{_ROUTERS[name]}", __name__).router
+    elif name in _OPTIONAL_ROUTERS:
+        router = _load_optional_router(_OPTIONAL_ROUTERS[name])
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Кэшируем в модуле: повторные обращения не доходят до __getattr__
+    globals()[name] = router
+    return router
+
 
 __all__ = [
     "auth_router",
@@ -1,32 +1,161 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select, insert, update, func, bindparam, String
+from sqlalchemy.dialects import postgresql
+from typing import Dict, List
 from datetime import datetime, timezone
 
 from app.core.database import get_db
-from app.models.database.models import User, ChatSession, ChatMessage, Contact
+from app.models.database.models import User, ChatSession, ChatMessage, Contact, USE_JSONB
 from app.models.schemas.schemas import (
     ChatRequest, ChatResponse, ChatSessionResponse, TemplateInfo
 )
 from app.services.ai_service import ai_service
 from app.services.context_service import context_service
 from app.services.astro_service import astro_service
+from app.services.date_parser import parse_date, parse_time
+from app.services.geocoding_service import geocoding_service
 from app.services.redis_service import redis_service
-from app.workers.context_worker import process_context_save_task
+from app.services.vector_service import vector_service
+from app.workers.context_worker import process_context_save_task, save_context_sync
 
 router = APIRouter(tags=["AI"], prefix="/ai")
 
 
+# Запросы горячего пути собираются один раз при импорте; значения передаются
+# через bindparam, поэтому скомпилированный SQL берется из кеша SQLAlchemy
+_SESSION_BY_ID_STMT = select(ChatSession).where(
+    (ChatSession.id == bindparam("session_id")) &
+    (ChatSession.user_id == bindparam("user_id"))
+)
+
+if USE_JSONB:
+    # Все упоминания проверяются одним запросом по GIN-индексу ix_contacts_aliases_gin:
+    # ?| - в aliases есть хотя бы одна из строк
+    _alias_filter = Contact.aliases.has_any(
+        bindparam("aliases", type_=postgresql.ARRAY(String))
+    )
+else:
+    # SQLite: элементы JSON-массива перебирает json_each
+    _alias_values = func.json_each(Contact.aliases).table_valued('value')
+    _alias_filter = select(_alias_values.c.value).where(
+        _alias_values.c.value.in_(bindparam("aliases", expanding=True))
+    ).exists()
+
+_CONTACTS_BY_ALIASES_STMT = select(Contact).where(
+    (Contact.user_id == bindparam("user_id")) & _alias_filter
+)
+
+# Сессии вместе с количеством сообщений одним запросом (GROUP BY вместо COUNT на каждую сессию)
+_SESSIONS_WITH_COUNTS_STMT = (
+    select(ChatSession, func.count(ChatMessage.id))
+    .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)
+    .where(ChatSession.user_id == bindparam("user_id"))
+    .group_by(ChatSession.id)
+    .order_by(ChatSession.updated_at.desc())
+)
+
+
+# Координаты места рождения не меняются, поэтому результат геокодирования
+# контакта хранится в Redis долго
+BIRTH_PLACE_CACHE_TTL = 30 * 86400  # 30 дней
+
+
+def _birth_place_cache_key(birth_place: str) -> str:
+    """Ключ кеша координат места рождения в Redis"""
+    return f"geo:birth_place:{birth_place.strip().lower()}"
+
+
+def _geocode_birth_place(birth_place: str) -> Dict:
+    """
+    Координаты и часовой пояс места рождения вида "Город, Страна".
+    Успешный результат кешируется в Redis, чтобы упоминание контакта в чате
+    не перебирало базу городов на каждом сообщении.
+    """
+    cache_key = _birth_place_cache_key(birth_place or '')
+    cached = redis_service.cache_get(cache_key)
+    if isinstance(cached, dict):
+        return {'success': True, 'data': cached}
+
+    city, _, country = (birth_place or '').partition(',')
+    geo_result = geocoding_service.geocode_location(city, country.strip() or None)
+    if geo_result.get('success'):
+        city_data = geo_result['data']
+        redis_service.cache_set(
+            cache_key,
+            {
+                'lat': city_data['lat'],
+                'lon': city_data['lon'],
+                'timezone': city_data.get('timezone', 'UTC'),
+            },
+            ttl=BIRTH_PLACE_CACHE_TTL
+        )
+    return geo_result
+
+
+def _calculate_contact_chart(birth_date: str, birth_time: str, birth_place: str) -> Dict:
+    """
+    Натальная карта контакта по строковым дате, времени и месту рождения.
+    Координаты места берутся из кеша Redis, повторные расчеты для того же
+    контакта - из LRU-кеша astro_service.
+    """
+    try:
+        birth_date_obj = parse_date(birth_date)
+        birth_time_obj = parse_time(birth_time)
+    except (TypeError, ValueError):
+        return {'success': False, 'error': 'Неверный формат даты или времени рождения контакта'}
+
+    geo_result = _geocode_birth_place(birth_place)
+    if not geo_result.get('success'):
+        return {'success': False, 'error': geo_result.get('error', 'Место рождения не найдено')}
+
+    city_data = geo_result['data']
+    birth_time_utc = geocoding_service.calculate_utc_time(
+        birth_date_obj,
+        birth_time_obj,
+        city_data.get('timezone', 'UTC')
+    )
+    return astro_service.calculate_natal_chart(
+        birth_date=birth_date_obj,
+        birth_time_utc=birth_time_utc,
+        latitude=float(city_data['lat']),
+        longitude=float(city_data['lon'])
+    )
+
+
+@lru_cache(maxsize=1)
+def _templates_response_body() -> bytes:
+    """
+    Сериализованный список шаблонов ИИ.
+    Шаблоны задаются в коде ai_service и не меняются во время работы процесса,
+    поэтому JSON собирается и проверяется схемой TemplateInfo один раз.
+    """
+    templates = [
+        TemplateInfo(**template).model_dump()
+        for template in ai_service.get_available_templates()
+    ]
+    return json.dumps(templates, ensure_ascii=False).encode("utf-8")
+
+
 @router.get("/templates", response_model=List[TemplateInfo], summary="Доступные шаблоны ИИ")
 async def get_ai_templates():
-    templates = ai_service.get_available_templates()
-    return templates
+    # Готовый JSON отдается напрямую, без повторной валидации и сериализации
+    return Response(content=_templates_response_body(), media_type="application/json")
 
 
-@router.post("/chat", response_model=ChatResponse, summary="Отправить сообщение ИИ-астрологу")
-async def chat_with_ai(chat_request: ChatRequest, user_id: int, db: Session = Depends(get_db)):
-    user = db.scalar(select(User).where(User.id == user_id))
+def _prepare_chat_turn(chat_request: ChatRequest, user_id: int, db: Session) -> Dict:
+    """
+    Синхронная часть хода чата до обращения к ИИ: пользователь, сессия,
+    упомянутые контакты, релевантный контекст и эмбеддинг сообщения.
+    Выполняется в пуле потоков anyio: запросы к БД, модель эмбеддингов и Qdrant
+    не блокируют event loop, а семантический поиск get_relevant_context
+    объединяется в пакет с поиском параллельных запросов.
+    """
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
@@ -35,10 +164,10 @@ async def chat_with_ai(chat_request: ChatRequest, user_id: int, db: Session = De
     
     # Получаем или создаем активную сессию
     if chat_request.session_id and not force_new_session:
-        session = db.scalar(select(ChatSession).where(
-            (ChatSession.id == chat_request.session_id) &
-            (ChatSession.user_id == user_id)
-        ))
+        session = db.scalar(
+            _SESSION_BY_ID_STMT,
+            {"session_id": chat_request.session_id, "user_id": user_id}
+        )
         if not session:
             raise HTTPException(status_code=404, detail="Сессия чата не найдена")
         # Проверяем истекла ли сессия
@@ -53,33 +182,14 @@ async def chat_with_ai(chat_request: ChatRequest, user_id: int, db: Session = De
             template_type=chat_request.template_type,
             force_new=force_new_session
         )
-    else:
-        # Обновляем время сессии
-        session.updated_at = datetime.now(timezone.utc)
-        db.commit()
 
-    mentioned_contacts = []
+    contacts = []
     if chat_request.mentioned_contacts:
-        for alias in chat_request.mentioned_contacts:
-            contact = db.scalar(
-                select(Contact).where(
-                    (Contact.user_id == user_id) &
-                    (Contact.aliases.contains([alias]))
-                )
-            )
-            if contact:
-                contact_chart = astro_service.calculate_natal_chart(
-                    contact.birth_date,
-                    contact.birth_time,
-                    contact.birth_place
-                )
-
-                mentioned_contacts.append({
-                    'name': contact.name,
-                    'relationship_type': contact.relationship_type,
-                    'sun_sign': contact_chart['planets']['sun']['sign'] if contact_chart['success'] else 'не рассчитан',
-                    'moon_sign': contact_chart['planets']['moon']['sign'] if contact_chart['success'] else 'не рассчитан'
-                })
+        aliases = list(dict.fromkeys(chat_request.mentioned_contacts))
+        contacts = db.scalars(
+            _CONTACTS_BY_ALIASES_STMT,
+            {"user_id": user_id, "aliases": aliases}
+        ).all()
 
     # Получаем релевантный контекст для промпта
     context_entries = context_service.get_relevant_context(
@@ -90,93 +200,166 @@ async def chat_with_ai(chat_request: ChatRequest, user_id: int, db: Session = De
         limit=10
     )
 
-    user_data = {
-        'name': user.name,
-        'sun_sign': 'Лев',
-        'moon_sign': 'Скорпион',
-        'ascendant_sign': 'Близнецы'
-    }
+    # Эмбеддинг сообщения для семантического кеша ответов (нужен только при доступном Redis)
+    message_embedding = None
+    if redis_service.redis_client:
+        message_embedding = vector_service.create_embedding(chat_request.message)
 
-    ai_response = await ai_service.generate_response(
-        user_message=chat_request.message,
-        user_data=user_data,
-        template_type=chat_request.template_type,
-        context_entries=context_entries,
-        mentioned_contacts=mentioned_contacts
-    )
+    return {
+        'session_id': session.id,
+        'contacts': contacts,
+        'context_entries': context_entries,
+        'message_embedding': message_embedding,
+        'user_data': {
+            'name': user.name,
+            'sun_sign': 'Лев',
+            'moon_sign': 'Скорпион',
+            'ascendant_sign': 'Близнецы'
+        }
+    }
 
-    user_message = ChatMessage(
-        session_id=session.id,
-        role="user",
-        content=chat_request.message
-    )
-    db.add(user_message)
 
-    assistant_message = ChatMessage(
-        session_id=session.id,
-        role="assistant",
-        content=ai_response
+def _save_chat_turn(
+    db: Session,
+    session_id: int,
+    user_id: int,
+    user_message: str,
+    ai_response: str
+) -> Dict:
+    """
+    Синхронная часть хода чата после ответа ИИ: сообщения, счетчик сессии
+    и проверка триггеров сохранения контекста (в пуле потоков, как и подготовка)
+    """
+    # Оба сообщения вставляются одним многострочным INSERT с RETURNING: id и время
+    # ответа ассистента приходят вместе со вставкой, без SELECT через db.refresh.
+    # Порядок строк RETURNING не гарантирован, строка ассистента выбирается по роли
+    message_rows = db.execute(
+        insert(ChatMessage).returning(ChatMessage.id, ChatMessage.timestamp, ChatMessage.role),
+        [
+            {"session_id": session_id, "role": "user", "content": user_message},
+            {"session_id": session_id, "role": "assistant", "content": ai_response},
+        ]
+    ).all()
+    assistant_message_id, assistant_timestamp = next(
+        (row.id, row.timestamp) for row in message_rows if row.role == "assistant"
     )
-    db.add(assistant_message)
+    # Счетчик сообщений сессии увеличивается атомарным UPDATE в том же коммите,
+    # что и сами сообщения, - без отдельного COUNT по chat_messages.
+    # Время сессии обновляется там же: весь ход чата фиксируется одним коммитом.
+    # Новое значение счетчика приходит из RETURNING, без перечитывания сессии после коммита
+    message_count = db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(
+            message_count=ChatSession.message_count + 2,
+            updated_at=datetime.now(timezone.utc)
+        )
+        .returning(ChatSession.message_count)
+    ).scalar_one()
     db.commit()
-    db.refresh(assistant_message)
-
-    # Подсчитываем количество сообщений в сессии
-    message_count = db.scalar(
-        select(func.count(ChatMessage.id)).where(ChatMessage.session_id == session.id)
-    ) or 0
+    # Закешированная активная сессия содержит устаревший счетчик сообщений
+    redis_service.invalidate_active_session(user_id)
     
     # Проверяем триггеры сохранения контекста
     should_save, trigger_type = context_service.should_save_context(
         db=db,
-        session_id=session.id,
+        session_id=session_id,
+        user_message=user_message,
+        message_count=message_count
+    )
+
+    return {
+        'message_id': assistant_message_id,
+        'timestamp': assistant_timestamp,
+        'session_id': session_id,
+        'should_save': should_save,
+        'trigger_type': trigger_type
+    }
+
+
+@router.post("/chat", response_model=ChatResponse, summary="Отправить сообщение ИИ-астрологу")
+async def chat_with_ai(chat_request: ChatRequest, user_id: int, db: Session = Depends(get_db)):
+    # Вся синхронная работа с БД, моделью эмбеддингов и Qdrant идет в пуле потоков;
+    # на event loop ожидается только ответ ИИ
+    prepared = await run_in_threadpool(_prepare_chat_turn, chat_request, user_id, db)
+
+    # Карты контактов считаются параллельно в пуле потоков: расчет Swiss Ephemeris
+    # синхронный и не должен блокировать event loop
+    contacts = prepared['contacts']
+    contact_charts = await asyncio.gather(*(
+        asyncio.to_thread(
+            _calculate_contact_chart,
+            contact.birth_date,
+            contact.birth_time,
+            contact.birth_place
+        )
+        for contact in contacts
+    ))
+    mentioned_contacts = [
+        {
+            'name': contact.name,
+            'relationship_type': contact.relationship_type,
+            'sun_sign': contact_chart['planets']['sun']['zodiac_sign_ru'] if contact_chart['success'] else 'не рассчитан',
+            'moon_sign': contact_chart['planets']['moon']['zodiac_sign_ru'] if contact_chart['success'] else 'не рассчитан'
+        }
+        for contact, contact_chart in zip(contacts, contact_charts)
+    ]
+
+    ai_response = await ai_service.generate_response(
         user_message=chat_request.message,
-        message_count=message_count + 2  # +2 потому что мы только что добавили 2 сообщения
+        user_data=prepared['user_data'],
+        template_type=chat_request.template_type,
+        context_entries=prepared['context_entries'],
+        mentioned_contacts=mentioned_contacts,
+        user_id=user_id,
+        message_embedding=prepared['message_embedding']
+    )
+
+    saved = await run_in_threadpool(
+        _save_chat_turn, db, prepared['session_id'], user_id, chat_request.message, ai_response
     )
     
     # Сохраняем контекст асинхронно если нужно
-    if should_save:
+    if saved['should_save']:
         # Получаем астрологический контекст (если нужен)
         astro_context = None  # TODO: Получить актуальный астрологический контекст
         
-        # Добавляем задачу в очередь
-        task_id = redis_service.enqueue_task(
-            process_context_save_task,
-            session_id=session.id,
+        # Добавляем задачу в очередь и инвалидируем кеш сессии
+        # (в Redis - пакетом вместе с задачами параллельных запросов)
+        context_task = dict(
+            session_id=saved['session_id'],
             user_id=user_id,
             user_message=chat_request.message,
             ai_response=ai_response,
-            trigger_type=trigger_type,
+            trigger_type=saved['trigger_type'],
             astro_context=astro_context
         )
+        task_id = await redis_service.submit_context_task(
+            saved['session_id'],
+            process_context_save_task,
+            **context_task
+        )
         
-        if task_id:
-            # Инвалидируем кеш сессии
-            redis_service.invalidate_session_context(session.id)
-
-    session.updated_at = datetime.now(timezone.utc)
-    db.commit()
+        # Если задачу не удалось поставить ни в одну очередь, сохраняем синхронно
+        # (в пуле потоков, чтобы не блокировать event loop)
+        if not task_id:
+            await asyncio.to_thread(save_context_sync, **context_task)
 
     return ChatResponse(
-        message_id=assistant_message.id,
-        session_id=session.id,
+        message_id=saved['message_id'],
+        session_id=saved['session_id'],
         assistant_response=ai_response,
-        timestamp=assistant_message.timestamp
+        timestamp=saved['timestamp']
     )
 
 
+# def: синхронные запросы к БД FastAPI выполняет в пуле потоков
 @router.get("/sessions/{user_id}", response_model=List[ChatSessionResponse], summary="Сессии чата пользователя")
-async def get_chat_sessions(user_id: int, db: Session = Depends(get_db)):
-    sessions = db.scalars(
-        select(ChatSession).where(ChatSession.user_id == user_id)
-        .order_by(ChatSession.updated_at.desc())
-    ).all()
+def get_chat_sessions(user_id: int, db: Session = Depends(get_db)):
+    rows = db.execute(_SESSIONS_WITH_COUNTS_STMT, {"user_id": user_id}).all()
 
     result = []
-    for session in sessions:
-        message_count = db.scalar(
-            select(func.count(ChatMessage.id)).where(ChatMessage.session_id == session.id)
-        )
+    for session, message_count in rows:
         session_data = ChatSessionResponse.from_orm(session)
         session_data.message_count = message_count
         result.append(session_data)
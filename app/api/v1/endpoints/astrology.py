@@ -1,17 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date as date_type
 
 from app.core.database import get_db
 from app.models.database.models import User
 from app.services.natal_chart_service import natal_chart_service
 from app.services.astro_service import astro_service
+from app.services.redis_service import redis_service
 
 router = APIRouter(tags=["Astrology"], prefix="/api")
 
+# Эндпоинты объявлены через def, а не async def: синхронные запросы к БД и расчеты
+# эфемерид FastAPI выполняет в пуле потоков, не блокируя event loop
+
 
 @router.post("/calculate-full-chart/{user_id}", summary="Рассчитать натальную карту и сохранить")
-async def calculate_full_chart(user_id: int, db: Session = Depends(get_db)):
+def calculate_full_chart(user_id: int, db: Session = Depends(get_db)):
     """
     Рассчитывает натальную карту для пользователя.
     
@@ -21,7 +25,7 @@ async def calculate_full_chart(user_id: int, db: Session = Depends(get_db)):
     - Координаты места рождения (birth_latitude, birth_longitude)
     - Время рождения в UTC (birth_time_utc)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
@@ -82,13 +86,13 @@ async def calculate_full_chart(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/professional-calendar/{user_id}/{year}/{month}", summary="Календарь транзитов на месяц")
-async def get_professional_calendar(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
+def get_professional_calendar(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
     """
     Получение календаря транзитов на месяц.
     
     Требует наличия рассчитанной натальной карты пользователя.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
@@ -119,7 +123,7 @@ async def get_professional_calendar(user_id: int, year: int, month: int, db: Ses
 
 
 @router.get("/daily-transits/{user_id}/{date}", summary="Детальные транзиты на день")
-async def get_daily_transits(user_id: int, date: str, db: Session = Depends(get_db)):
+def get_daily_transits(user_id: int, date: date_type, db: Session = Depends(get_db)):
     """
     Получение детальных транзитов на конкретную дату.
     
@@ -135,14 +139,12 @@ async def get_daily_transits(user_id: int, date: str, db: Session = Depends(get_
     - current_longitude: Текущая долгота
     - current_timezone_name: Текущая временная зона
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    try:
-        datetime.strptime(date, "%Y-%m-%d")
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте: ГГГГ-ММ-ДД")
+    # Формат даты (ГГГГ-ММ-ДД) проверяет FastAPI: неверная дата отклоняется с кодом 422
+    date_str = date.isoformat()
 
     # Определяем координаты для расчета транзитов
     # Приоритет: текущее местоположение > место рождения
@@ -199,20 +201,26 @@ async def get_daily_transits(user_id: int, date: str, db: Session = Depends(get_
         'aspects': chart_data.get('aspects', [])
     }
 
-    transits = astro_service.calculate_transits(
-        natal_chart, 
-        date,
-        latitude=latitude,
-        longitude=longitude,
-        timezone_name=timezone_name
-    )
+    # Транзиты, уже рассчитанные любым процессом, берутся из Redis
+    transits_cache_key = f"transits:{astro_service.transits_cache_key(natal_chart, date_str, timezone_name)}"
+    transits = redis_service.cache_get(transits_cache_key)
+    if not isinstance(transits, dict):
+        transits = astro_service.calculate_transits(
+            natal_chart, 
+            date_str,
+            latitude=latitude,
+            longitude=longitude,
+            timezone_name=timezone_name
+        )
+        if transits['success']:
+            redis_service.cache_set(transits_cache_key, transits, ttl=86400)
 
     if not transits['success']:
         raise HTTPException(status_code=500, detail=f"Ошибка расчета транзитов: {transits['error']}")
 
     return {
         "user_id": user_id,
-        "date": date,
+        "date": date_str,
         "location": {
             "type": location_type,  # "current" или "birth"
             "name": location_name,
@@ -6,11 +6,12 @@ import logging
 import os
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.core.database import get_db
-from app.models.database.models import User
+from app.models.database.models import User, SMSCode
 from app.models.schemas.schemas import (
     PhoneRequest,
     SMSVerifyRequest,
@@ -32,19 +33,37 @@ router = APIRouter(tags=["Authentication"])
 security = HTTPBearer()
 
 
+# ВРЕМЕННАЯ ЗАГЛУШКА: проверку SMS можно отключить переменной окружения SKIP_SMS_VERIFICATION=true.
+# Окружение не меняется во время работы, флаг читается один раз при импорте
+# (после load_dotenv в auth_service)
+_SKIP_SMS_CHECK = os.getenv("SKIP_SMS_VERIFICATION", "false").lower() == "true"
+
+# Шаблоны проверки пароля компилируются один раз при импорте
+_PASSWORD_LETTER_RE = re.compile(r'[a-zA-Zа-яА-Я]')
+_PASSWORD_DIGIT_RE = re.compile(r'\d')
+
+
 def validate_password(password: str) -> bool:
     """
     Валидация пароля: минимум 8 символов, буквы и цифры
     """
     if len(password) < 8:
         return False
-    if not re.search(r'[a-zA-Zа-яА-Я]', password):
+    if not _PASSWORD_LETTER_RE.search(password):
         return False
-    if not re.search(r'\d', password):
+    if not _PASSWORD_DIGIT_RE.search(password):
         return False
     return True
 
 
+def _sms_confirmed_clause(phone: str):
+    """EXISTS: для телефона есть подтвержденный (использованный) SMS-код"""
+    return select(SMSCode.id).where(
+        SMSCode.phone == phone,
+        SMSCode.used == 1
+    ).exists()
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -54,38 +73,26 @@ def get_current_user(
     """
     token = credentials.credentials
     
-    user = AuthService.get_current_user(db, token)
+    user, payload = AuthService.get_current_user_with_payload(db, token)
     if user is None:
-        # Проверяем, может быть это refresh токен, чтобы дать более понятное сообщение
-        try:
-            from jose import jwt
-            from app.services.auth_service import SECRET_KEY, ALGORITHM
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            token_type = payload.get("type")
-            user_id_from_token = payload.get("sub")
-            
-            if token_type == "refresh":
+        # Токен уже декодирован: по payload даем более понятное сообщение
+        if payload is not None:
+            if payload.get("type") == "refresh":
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Использован refresh токен. Для этого эндпоинта требуется access токен. Используйте токен из поля 'access_token' ответа /auth/login",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
             
-            # Если токен валиден, но пользователь не найден, проверяем в базе
-            if user_id_from_token:
-                user_id_from_token = int(user_id_from_token)
-                user_check = db.query(User).filter(User.id == user_id_from_token).first()
-                if not user_check:
-                    logger.error(f"Пользователь с ID {user_id_from_token} из токена не найден в базе данных")
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail=f"Пользователь с ID {user_id_from_token} не найден в базе данных. Возможно, учетная запись была удалена.",
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.warning(f"Ошибка при проверке токена: {str(e)}")
+            # Токен валиден, но пользователь с таким ID не найден в базе
+            user_id_from_token = payload.get("sub")
+            if payload.get("type") == "access" and user_id_from_token and str(user_id_from_token).isdigit():
+                logger.error("Пользователь с ID %s из токена не найден в базе данных", user_id_from_token)
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail=f"Пользователь с ID {user_id_from_token} не найден в базе данных. Возможно, учетная запись была удалена.",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -100,7 +107,7 @@ def get_current_user(
     response_model=MessageResponse,
     summary="Отправить SMS-код подтверждения"
 )
-async def send_sms_code(
+def send_sms_code(
     request: PhoneRequest,
     db: Session = Depends(get_db)
 ):
@@ -136,7 +143,7 @@ async def send_sms_code(
             detail="Не удалось отправить SMS-код. Попробуйте позже"
         )
     
-    logger.info(f"SMS код отправлен на {normalized_phone}")
+    logger.info("SMS код отправлен на %s", normalized_phone)
     return MessageResponse(message="SMS-код отправлен на указанный номер")
 
 
@@ -145,7 +152,7 @@ async def send_sms_code(
     response_model=MessageResponse,
     summary="Подтвердить SMS-код"
 )
-async def verify_sms_code(
+def verify_sms_code(
     request: SMSVerifyRequest,
     db: Session = Depends(get_db)
 ):
@@ -175,7 +182,7 @@ async def verify_sms_code(
             detail="Неверный код или истек срок действия"
         )
     
-    logger.info(f"SMS код подтвержден для {normalized_phone}")
+    logger.info("SMS код подтвержден для %s", normalized_phone)
     return MessageResponse(message="Код успешно подтвержден")
 
 
@@ -184,7 +191,7 @@ async def verify_sms_code(
     response_model=TokenResponse,
     summary="Регистрация пользователя"
 )
-async def register_user(
+def register_user(
     request: PasswordSetRequest,
     db: Session = Depends(get_db)
 ):
@@ -199,15 +206,7 @@ async def register_user(
             detail="Неверный формат номера телефона"
         )
     
-    # Проверка существования пользователя
-    existing_user = db.query(User).filter(User.phone == normalized_phone).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким номером телефона уже зарегистрирован"
-        )
-    
-    # Валидация пароля
+    # Валидация пароля до обращений к БД и хеширования
     if not validate_password(request.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -221,24 +220,28 @@ async def register_user(
             detail="Пароли не совпадают"
         )
     
+    # Существование пользователя и подтверждение SMS-кода проверяются одним запросом
+    user_registered, sms_confirmed = db.execute(
+        select(
+            select(User.id).where(User.phone == normalized_phone).exists(),
+            _sms_confirmed_clause(normalized_phone)
+        )
+    ).one()
+    if user_registered:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Пользователь с таким номером телефона уже зарегистрирован"
+        )
+    
     # Проверка подтверждения SMS-кода (код должен быть использован)
-    # ВРЕМЕННАЯ ЗАГЛУШКА: Можно отключить проверку SMS через переменную окружения SKIP_SMS_VERIFICATION=true
-    skip_sms_check = os.getenv("SKIP_SMS_VERIFICATION", "false").lower() == "true"
-    
-    if not skip_sms_check:
-        from app.models.database.models import SMSCode
-        sms_code = db.query(SMSCode).filter(
-            SMSCode.phone == normalized_phone,
-            SMSCode.used == 1
-        ).order_by(SMSCode.created_at.desc()).first()
-        
-        if not sms_code:
+    if not _SKIP_SMS_CHECK:
+        if not sms_confirmed:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Сначала подтвердите SMS-код"
             )
     else:
-        logger.warning(f"⚠️ ПРОВЕРКА SMS ОТКЛЮЧЕНА (тестовый режим). Регистрация пользователя {normalized_phone} без проверки SMS-кода")
+        logger.warning("⚠️ ПРОВЕРКА SMS ОТКЛЮЧЕНА (тестовый режим). Регистрация пользователя %s без проверки SMS-кода", normalized_phone)
     
     # Создание пользователя
     password_hash = AuthService.get_password_hash(request.password)
@@ -262,7 +265,7 @@ async def register_user(
     )
     refresh_token = AuthService.create_refresh_token(data={"sub": str(user.id)})  # JWT требует, чтобы sub был строкой
     
-    logger.info(f"Пользователь {normalized_phone} успешно зарегистрирован")
+    logger.info("Пользователь %s успешно зарегистрирован", normalized_phone)
     return TokenResponse(
         access_token=access_token,
         refresh_token=refresh_token,
@@ -275,7 +278,7 @@ async def register_user(
     response_model=TokenResponse,
     summary="Вход в систему"
 )
-async def login(
+def login(
     request: LoginRequest,
     db: Session = Depends(get_db)
 ):
@@ -310,14 +313,15 @@ async def login(
     RateLimiter.reset_limits(normalized_phone)
     
     # Генерация токенов
-    logger.info(f"Создаю токены для пользователя: ID={user.id}, phone={user.phone}, type(user.id)={type(user.id)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Создаю токены для пользователя: ID=%s, phone=%s, type(user.id)=%s", user.id, user.phone, type(user.id))
     access_token = AuthService.create_access_token(
         data={"sub": str(user.id)},  # JWT требует, чтобы sub был строкой
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     refresh_token = AuthService.create_refresh_token(data={"sub": str(user.id)})  # JWT требует, чтобы sub был строкой
     
-    logger.info(f"Пользователь {normalized_phone} успешно вошел в систему. Access token создан: {access_token[:50]}...")
+    logger.info("Пользователь %s успешно вошел в систему. Access token создан: %s...", normalized_phone, access_token[:50])
     return TokenResponse(
         access_token=access_token,
         refresh_token=refresh_token,
@@ -330,7 +334,7 @@ async def login(
     response_model=TokenResponse,
     summary="Обновить токен"
 )
-async def refresh_token(
+def refresh_token(
     request: RefreshTokenRequest,
     db: Session = Depends(get_db)
 ):
@@ -345,8 +349,10 @@ async def refresh_token(
             detail="Неверный или истекший refresh токен"
         )
     
+    # Подпись токена уже проверена: существование пользователя подтверждается
+    # кешем Redis, к БД обращаемся только при промахе
     user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = AuthService.get_user_data(db, int(user_id)) if str(user_id).isdigit() else None
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -355,12 +361,12 @@ async def refresh_token(
     
     # Генерация новых токенов
     access_token = AuthService.create_access_token(
-        data={"sub": str(user.id)},  # JWT требует, чтобы sub был строкой
+        data={"sub": str(user["id"])},  # JWT требует, чтобы sub был строкой
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    refresh_token = AuthService.create_refresh_token(data={"sub": str(user.id)})  # JWT требует, чтобы sub был строкой
+    refresh_token = AuthService.create_refresh_token(data={"sub": str(user["id"])})  # JWT требует, чтобы sub был строкой
     
-    logger.info(f"Токены обновлены для пользователя {user.phone}")
+    logger.info("Токены обновлены для пользователя %s", user["phone"])
     return TokenResponse(
         access_token=access_token,
         refresh_token=refresh_token,
@@ -373,7 +379,7 @@ async def refresh_token(
     response_model=MessageResponse,
     summary="Сброс пароля (запрос SMS-кода)"
 )
-async def reset_password_request(
+def reset_password_request(
     request: PhoneRequest,
     db: Session = Depends(get_db)
 ):
@@ -392,8 +398,12 @@ async def reset_password_request(
         )
     
     # Проверка существования пользователя
-    user = db.query(User).filter(User.phone == normalized_phone).first()
-    if not user:
+    user_id = None
+    if not AuthService.is_phone_unknown(normalized_phone):
+        user_id = db.scalar(select(User.id).where(User.phone == normalized_phone))
+        if user_id is None:
+            AuthService.remember_unknown_phone(normalized_phone)
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь с таким номером телефона не найден"
@@ -415,7 +425,7 @@ async def reset_password_request(
             detail="Не удалось отправить SMS-код. Попробуйте позже"
         )
     
-    logger.info(f"SMS код для сброса пароля отправлен на {normalized_phone}")
+    logger.info("SMS код для сброса пароля отправлен на %s", normalized_phone)
     return MessageResponse(message="SMS-код для сброса пароля отправлен")
 
 
@@ -424,7 +434,7 @@ async def reset_password_request(
     response_model=MessageResponse,
     summary="Подтверждение сброса пароля"
 )
-async def reset_password_confirm(
+def reset_password_confirm(
     request: PasswordSetRequest,
     db: Session = Depends(get_db)
 ):
@@ -439,34 +449,7 @@ async def reset_password_confirm(
             detail="Неверный формат номера телефона"
         )
     
-    # Проверка существования пользователя
-    user = db.query(User).filter(User.phone == normalized_phone).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-    
-    # Проверка подтверждения SMS-кода
-    # ВРЕМЕННАЯ ЗАГЛУШКА: Можно отключить проверку SMS через переменную окружения SKIP_SMS_VERIFICATION=true
-    skip_sms_check = os.getenv("SKIP_SMS_VERIFICATION", "false").lower() == "true"
-    
-    if not skip_sms_check:
-        from app.models.database.models import SMSCode
-        sms_code = db.query(SMSCode).filter(
-            SMSCode.phone == normalized_phone,
-            SMSCode.used == 1
-        ).order_by(SMSCode.created_at.desc()).first()
-        
-        if not sms_code:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Сначала подтвердите SMS-код"
-            )
-    else:
-        logger.warning(f"⚠️ ПРОВЕРКА SMS ОТКЛЮЧЕНА (тестовый режим). Сброс пароля для {normalized_phone} без проверки SMS-кода")
-    
-    # Валидация пароля
+    # Валидация пароля до обращений к БД и хеширования
     if not validate_password(request.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -480,11 +463,32 @@ async def reset_password_confirm(
             detail="Пароли не совпадают"
         )
     
+    # Пользователь и подтверждение SMS-кода загружаются одним запросом
+    row = db.execute(
+        select(User, _sms_confirmed_clause(normalized_phone)).where(User.phone == normalized_phone)
+    ).first()
+    user, sms_confirmed = row if row else (None, False)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
+    
+    # Проверка подтверждения SMS-кода
+    if not _SKIP_SMS_CHECK:
+        if not sms_confirmed:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Сначала подтвердите SMS-код"
+            )
+    else:
+        logger.warning("⚠️ ПРОВЕРКА SMS ОТКЛЮЧЕНА (тестовый режим). Сброс пароля для %s без проверки SMS-кода", normalized_phone)
+    
     # Обновление пароля
     user.password_hash = AuthService.get_password_hash(request.password)
     db.commit()
     
-    logger.info(f"Пароль успешно сброшен для пользователя {normalized_phone}")
+    logger.info("Пароль успешно сброшен для пользователя %s", normalized_phone)
     return MessageResponse(message="Пароль успешно изменен")
 
 
@@ -493,7 +497,7 @@ async def reset_password_confirm(
     response_model=UserAuthResponse,
     summary="Получить информацию о текущем пользователе"
 )
-async def get_current_user_info(
+def get_current_user_info(
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -512,13 +516,13 @@ async def get_current_user_info(
     response_model=MessageResponse,
     summary="Выход из системы"
 )
-async def logout(
+def logout(
     current_user: User = Depends(get_current_user)
 ):
     """
     Выход из системы (в текущей реализации просто подтверждает выход)
     TODO: Реализовать blacklist токенов при необходимости
     """
-    logger.info(f"Пользователь {current_user.phone} вышел из системы")
+    logger.info("Пользователь %s вышел из системы", current_user.phone)
     return MessageResponse(message="Успешный выход из системы")
 
@@ -1,21 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List
 import logging
+import orjson
 
 from app.core.database import get_db
 from app.models.database.models import User, Contact
 from app.models.schemas.schemas import ContactCreate, ContactResponse
+from app.services.redis_service import redis_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Contacts"])
 
+# Время жизни готового JSON списка контактов в Redis
+CONTACTS_CACHE_TTL = 3600  # 1 час
 
-@router.post("/contacts", response_model=ContactResponse, summary="Создать контакт для пользователя")
-async def create_contact(contact_data: ContactCreate, user_id: int, db: Session = Depends(get_db)):
+# Колонки ответа эндпоинтов контактов (поля ContactResponse)
+_CONTACT_RESPONSE_COLUMNS = (
+    Contact.id,
+    Contact.user_id,
+    Contact.name,
+    Contact.relationship_type,
+    Contact.custom_title,
+    Contact.birth_date,
+    Contact.birth_time,
+    Contact.birth_place,
+    Contact.aliases,
+    Contact.created_at,
+)
+
+
+def _contacts_cache_key(user_id: int) -> str:
+    """Ключ кеша списка контактов пользователя в Redis"""
+    return f"contacts:{user_id}"
+
+
+@router.post(
+    "/contacts",
+    response_model=ContactResponse,
+    response_class=ORJSONResponse,
+    summary="Создать контакт для пользователя"
+)
+def create_contact(contact_data: ContactCreate, user_id: int, db: Session = Depends(get_db)):
     try:
         user = db.scalar(select(User).where(User.id == user_id))
         if not user:
@@ -39,11 +69,18 @@ async def create_contact(contact_data: ContactCreate, user_id: int, db: Session
         )
 
         db.add(db_contact)
+        db.flush()
+        # Ответ собирается до коммита: после него атрибуты истекают и потребовали бы
+        # повторного SELECT, а проверка ContactResponse для только что записанных
+        # значений не нужна
+        content = {column.key: getattr(db_contact, column.key) for column in _CONTACT_RESPONSE_COLUMNS}
+        # created_at хранится без часового пояса: отдаем то же значение, что вернет БД
+        content['created_at'] = content['created_at'].replace(tzinfo=None)
         db.commit()
-        db.refresh(db_contact)
+        redis_service.cache_delete(_contacts_cache_key(user_id))
 
-        logger.info(f"Контакт {db_contact.id} успешно создан для пользователя {user_id}")
-        return db_contact
+        logger.info("Контакт %s успешно создан для пользователя %s", content['id'], user_id)
+        return ORJSONResponse(content=content)
     
     except HTTPException:
         raise
@@ -57,8 +94,25 @@ async def create_contact(contact_data: ContactCreate, user_id: int, db: Session
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 
-@router.get("/users/{user_id}/contacts", response_model=List[ContactResponse], summary="Список контактов пользователя")
-async def get_user_contacts(user_id: int, db: Session = Depends(get_db)):
-    contacts = db.scalars(select(Contact).where(Contact.user_id == user_id)).all()
-    return contacts
+@router.get(
+    "/users/{user_id}/contacts",
+    response_model=List[ContactResponse],
+    response_class=ORJSONResponse,
+    summary="Список контактов пользователя"
+)
+def get_user_contacts(user_id: int, db: Session = Depends(get_db)):
+    # Готовый JSON из Redis отдается как есть; сбрасывается при создании контакта
+    cache_key = _contacts_cache_key(user_id)
+    cached_body = redis_service.cache_get_raw(cache_key)
+    if cached_body is not None:
+        return Response(content=cached_body, media_type="application/json")
+
+    # Строки читаются без сборки ORM-объектов и моделей ContactResponse
+    # и сериализуются orjson за один вызов (datetime кодируется им нативно)
+    rows = db.execute(
+        select(*_CONTACT_RESPONSE_COLUMNS).where(Contact.user_id == user_id)
+    ).mappings()
+    body = orjson.dumps([dict(row) for row in rows])
+    redis_service.cache_set(cache_key, body.decode(), ttl=CONTACTS_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
 
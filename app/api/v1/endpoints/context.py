@@ -4,13 +4,14 @@ Endpoints для управления сессиями, контекстными
 """
 import time
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, insert, update, func, and_, distinct, literal, bindparam, lambda_stmt
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.core.database import get_db
-from app.models.database.models import User, ContextEntry, ChatSession, ChatMessage
+from app.models.database.models import User, ContextEntry, ChatSession, USE_JSONB
 from app.models.schemas.schemas import (
     ContextEntryCreate,
     ContextEntryResponse,
@@ -26,6 +27,45 @@ from app.workers.context_worker import process_context_save_task, save_context_s
 
 router = APIRouter(prefix="/api/v1/context", tags=["Context"])
 
+# Проверка существования сессии без загрузки строки ChatSession; запрос собирается
+# один раз, значения передаются через bindparam
+_SESSION_EXISTS_STMT = select(literal(1)).where(
+    (ChatSession.id == bindparam("session_id")) &
+    (ChatSession.user_id == bindparam("user_id"))
+).limit(1)
+
+# Колонки ответа списка контекстных записей (поля ContextEntryResponse)
+_CONTEXT_ENTRY_RESPONSE_COLUMNS = (
+    ContextEntry.id,
+    ContextEntry.user_id,
+    ContextEntry.session_id,
+    ContextEntry.user_message,
+    ContextEntry.ai_response,
+    ContextEntry.emotional_state,
+    ContextEntry.event_description,
+    ContextEntry.insight_text,
+    ContextEntry.astro_context,
+    ContextEntry.successful_strategy,
+    ContextEntry.tags,
+    ContextEntry.priority,
+    ContextEntry.entry_type,
+    ContextEntry.event,
+    ContextEntry.emotion,
+    ContextEntry.insight,
+    ContextEntry.is_important,
+    ContextEntry.vector_id,
+    ContextEntry.created_at,
+    ContextEntry.updated_at,
+)
+
+# Элементы JSON-массива тегов записи (SQLite, json_each) для фильтра по тегам
+_TAG_VALUES = func.json_each(ContextEntry.tags).table_valued('value')
+
+
+def _session_exists(db: Session, session_id: int, user_id: int) -> bool:
+    """Существует ли сессия session_id пользователя user_id"""
+    return db.scalar(_SESSION_EXISTS_STMT, {"session_id": session_id, "user_id": user_id}) is not None
+
 
 # ============ Управление сессиями ============
 
@@ -34,7 +74,7 @@ router = APIRouter(prefix="/api/v1/context", tags=["Context"])
     response_model=ActiveSessionResponse,
     summary="Получить активную сессию пользователя"
 )
-async def get_active_session(
+def get_active_session(
     user_id: int,
     db: Session = Depends(get_db)
 ):
@@ -43,23 +83,27 @@ async def get_active_session(
     
     Если активной сессии нет или она истекла, создается новая
     """
+    # Клиент опрашивает эндпоинт на каждое сообщение: ответ кешируется в Redis
+    # на несколько секунд и сбрасывается при новых сообщениях или новой сессии
+    cached_session = redis_service.get_cached_active_session(user_id)
+    if cached_session is not None:
+        return cached_session
+    
     session = context_service.get_or_create_active_session(
         db=db,
         user_id=user_id
     )
     
-    # Подсчитываем количество сообщений
-    message_count = db.query(func.count(ChatMessage.id)).filter(
-        ChatMessage.session_id == session.id
-    ).scalar() or 0
-    
-    return {
+    session_data = {
         "session_id": session.id,
         "title": session.title,
-        "created_at": session.created_at,
-        "message_count": message_count,
+        "created_at": session.created_at.isoformat(),
+        # Счетчик хранится в самой сессии (миграция 009), отдельный COUNT не нужен
+        "message_count": session.message_count,
         "session_type": session.session_type or "regular"
     }
+    redis_service.cache_active_session(user_id, session_data)
+    return session_data
 
 
 # ============ Асинхронное сохранение контекста ============
@@ -69,7 +113,7 @@ async def get_active_session(
     response_model=ContextSaveResponse,
     summary="Асинхронное сохранение контекста"
 )
-async def save_context_async(
+def save_context_async(
     request: ContextSaveRequest,
     user_id: int,
     db: Session = Depends(get_db)
@@ -80,14 +124,7 @@ async def save_context_async(
     Пользователь получает ответ мгновенно, сохранение происходит в фоне
     """
     # Проверяем существование сессии
-    session = db.query(ChatSession).filter(
-        and_(
-            ChatSession.id == request.session_id,
-            ChatSession.user_id == user_id
-        )
-    ).first()
-    
-    if not session:
+    if not _session_exists(db, request.session_id, user_id):
         raise HTTPException(status_code=404, detail="Сессия не найдена")
     
     # Пытаемся добавить задачу в очередь Redis
@@ -101,7 +138,8 @@ async def save_context_async(
         astro_context=request.astro_context
     )
     
-    # Если очередь недоступна, выполняем синхронно
+    # Если очередь недоступна, выполняем синхронно: sync-обработчик работает
+    # в пуле потоков, event loop на время сохранения не блокируется
     if not task_id:
         # Пробуем синхронное выполнение как fallback
         result = save_context_sync(
@@ -128,7 +166,7 @@ async def save_context_async(
     "/async/task/{task_id}",
     summary="Получить статус задачи сохранения"
 )
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str):
     """
     Получение статуса асинхронной задачи сохранения контекста
     """
@@ -147,7 +185,7 @@ async def get_task_status(task_id: str):
     response_model=ContextRelevantResponse,
     summary="Получить релевантный контекст"
 )
-async def get_relevant_context(
+def get_relevant_context(
     request: ContextRelevantRequest,
     user_id: int,
     db: Session = Depends(get_db)
@@ -163,14 +201,7 @@ async def get_relevant_context(
     start_time = time.time()
     
     # Проверяем существование сессии
-    session = db.query(ChatSession).filter(
-        and_(
-            ChatSession.id == request.session_id,
-            ChatSession.user_id == user_id
-        )
-    ).first()
-    
-    if not session:
+    if not _session_exists(db, request.session_id, user_id):
         raise HTTPException(status_code=404, detail="Сессия не найдена")
     
     # Получаем релевантный контекст
@@ -197,7 +228,7 @@ async def get_relevant_context(
     response_model=ContextSaveResponse,
     summary="Создать ручную контекстную запись"
 )
-async def create_manual_entry(
+def create_manual_entry(
     context_data: ContextEntryCreate,
     user_id: int,
     db: Session = Depends(get_db)
@@ -208,35 +239,35 @@ async def create_manual_entry(
     Запись сразу добавляется в очередь для обработки и векторизации
     """
     # Проверяем существование сессии
-    session = db.query(ChatSession).filter(
-        and_(
-            ChatSession.id == context_data.session_id,
-            ChatSession.user_id == user_id
-        )
-    ).first()
-    
-    if not session:
+    if not _session_exists(db, context_data.session_id, user_id):
         raise HTTPException(status_code=404, detail="Сессия не найдена")
     
-    # Создаем запись синхронно (для ручных записей)
-    context_entry = ContextEntry(
-        user_id=user_id,
-        session_id=context_data.session_id,
-        user_message=context_data.user_message,
-        ai_response=context_data.ai_response,
-        emotional_state=context_data.emotional_state,
-        event_description=context_data.event_description,
-        insight_text=context_data.insight_text,
-        astro_context=context_data.astro_context,
-        successful_strategy=context_data.successful_strategy,
-        tags=context_data.tags or [],
-        priority=context_data.priority,
-        entry_type="manual"
-    )
-    
-    db.add(context_entry)
+    # Создаем запись синхронно (для ручных записей) одним INSERT ... RETURNING,
+    # без загрузки строки в сессию и SELECT после commit
+    context_entry = db.execute(
+        insert(ContextEntry)
+        .values(
+            user_id=user_id,
+            session_id=context_data.session_id,
+            user_message=context_data.user_message,
+            ai_response=context_data.ai_response,
+            emotional_state=context_data.emotional_state,
+            event_description=context_data.event_description,
+            insight_text=context_data.insight_text,
+            astro_context=context_data.astro_context,
+            successful_strategy=context_data.successful_strategy,
+            tags=context_data.tags or [],
+            priority=context_data.priority,
+            entry_type="manual"
+        )
+        .returning(
+            ContextEntry.id,
+            ContextEntry.user_message,
+            ContextEntry.ai_response,
+            ContextEntry.astro_context
+        )
+    ).one()
     db.commit()
-    db.refresh(context_entry)
     
     # Пытаемся добавить в очередь для векторизации
     if context_entry.user_message or context_entry.ai_response:
@@ -250,7 +281,7 @@ async def create_manual_entry(
             astro_context=context_entry.astro_context
         )
         
-        # Если очередь недоступна, выполняем синхронно
+        # Если очередь недоступна, выполняем синхронно (в пуле потоков, как и весь обработчик)
         if not task_id:
             result = save_context_sync(
                 session_id=context_data.session_id,
@@ -280,9 +311,10 @@ async def create_manual_entry(
 @router.get(
     "/entries",
     response_model=List[ContextEntryResponse],
+    response_class=ORJSONResponse,
     summary="Получить список контекстных записей"
 )
-async def get_context_entries(
+def get_context_entries(
     user_id: int,
     session_id: Optional[int] = Query(None, description="Фильтр по сессии"),
     tags: Optional[List[str]] = Query(None, description="Фильтр по тегам"),
@@ -300,29 +332,49 @@ async def get_context_entries(
     - tags
     - date_from / date_to
     """
-    query = db.query(ContextEntry).filter(
-        ContextEntry.user_id == user_id
+    # Строки читаются без сборки ORM-объектов и проверки ContextEntryResponse
+    # и сериализуются orjson за один вызов.
+    # Запрос собирается через lambda_stmt: для каждого набора фильтров его структура
+    # и SQL кешируются, при повторных вызовах подставляются только значения
+    query = lambda_stmt(
+        lambda: select(*_CONTEXT_ENTRY_RESPONSE_COLUMNS).where(ContextEntry.user_id == user_id)
     )
     
     if session_id:
-        query = query.filter(ContextEntry.session_id == session_id)
+        query += lambda s: s.where(ContextEntry.session_id == session_id)
     
     if tags:
-        # Фильтрация по тегам (простая версия)
-        for tag in tags:
-            query = query.filter(ContextEntry.tags.contains([tag]))
+        # Запись подходит, если в ней есть все переданные теги
+        if USE_JSONB:
+            # Одно выражение @> по GIN-индексу ix_context_entries_tags_gin
+            query += lambda s: s.where(ContextEntry.tags.contains(tags))
+        else:
+            # SQLite: элементы JSON-массива перебирает json_each
+            unique_tags = list(set(tags))
+            tags_count = len(unique_tags)
+            query += lambda s: s.where(
+                select(func.count(distinct(_TAG_VALUES.c.value))).where(
+                    _TAG_VALUES.c.value.in_(unique_tags)
+                ).scalar_subquery() == tags_count
+            )
     
     if date_from:
-        query = query.filter(ContextEntry.created_at >= date_from)
+        query += lambda s: s.where(ContextEntry.created_at >= date_from)
     
     if date_to:
-        query = query.filter(ContextEntry.created_at <= date_to)
+        query += lambda s: s.where(ContextEntry.created_at <= date_to)
+    
+    query += lambda s: s.order_by(ContextEntry.created_at.desc()).offset(offset).limit(limit)
+    rows = db.execute(query).mappings()
     
-    entries = query.order_by(
-        ContextEntry.created_at.desc()
-    ).offset(offset).limit(limit).all()
+    entries = []
+    for row in rows:
+        entry = dict(row)
+        # is_important хранится целым числом, в ответе это bool
+        entry['is_important'] = bool(entry['is_important'])
+        entries.append(entry)
     
-    return entries
+    return ORJSONResponse(content=entries)
 
 
 @router.put(
@@ -330,7 +382,7 @@ async def get_context_entries(
     response_model=ContextEntryResponse,
     summary="Обновить контекстную запись"
 )
-async def update_context_entry(
+def update_context_entry(
     entry_id: int,
     context_data: ContextEntryCreate,
     user_id: int,
@@ -338,41 +390,49 @@ async def update_context_entry(
 ):
     """
     Обновление контекстной записи
+    
+    Изменяет переданные поля одним UPDATE ... RETURNING, без предварительной
+    загрузки записи и повторного SELECT после commit
     """
-    entry = db.query(ContextEntry).filter(
-        and_(
+    values = {
+        field: value
+        for field, value in (
+            ("emotional_state", context_data.emotional_state),
+            ("event_description", context_data.event_description),
+            ("insight_text", context_data.insight_text),
+            ("tags", context_data.tags),
+            ("priority", context_data.priority),
+        )
+        if value is not None
+    }
+    values["updated_at"] = datetime.now(timezone.utc)
+    
+    entry = db.scalars(
+        update(ContextEntry)
+        .where(
             ContextEntry.id == entry_id,
             ContextEntry.user_id == user_id
         )
-    ).first()
+        .values(**values)
+        .returning(ContextEntry)
+    ).one_or_none()
     
     if not entry:
         raise HTTPException(status_code=404, detail="Запись не найдена")
     
-    # Обновляем поля
-    if context_data.emotional_state is not None:
-        entry.emotional_state = context_data.emotional_state
-    if context_data.event_description is not None:
-        entry.event_description = context_data.event_description
-    if context_data.insight_text is not None:
-        entry.insight_text = context_data.insight_text
-    if context_data.tags is not None:
-        entry.tags = context_data.tags
-    if context_data.priority is not None:
-        entry.priority = context_data.priority
-    
-    entry.updated_at = datetime.utcnow()
+    # Ответ собирается до commit: после него атрибуты записи истекают
+    # и их чтение снова пошло бы в БД
+    response = ContextEntryResponse.model_validate(entry)
     db.commit()
-    db.refresh(entry)
     
-    return entry
+    return response
 
 
 @router.delete(
     "/entries/{entry_id}",
     summary="Удалить контекстную запись"
 )
-async def delete_context_entry(
+def delete_context_entry(
     entry_id: int,
     user_id: int,
     db: Session = Depends(get_db)
@@ -411,7 +471,7 @@ async def delete_context_entry(
     summary="[Legacy] Создать контекстную запись",
     deprecated=True
 )
-async def create_context_entry_legacy(
+def create_context_entry_legacy(
     context_data: ContextEntryCreate,
     user_id: int,
     db: Session = Depends(get_db)
@@ -421,7 +481,7 @@ async def create_context_entry_legacy(
     
     Используйте /entries/manual вместо этого
     """
-    return await create_manual_entry(context_data, user_id, db)
+    return create_manual_entry(context_data, user_id, db)
 
 
 @router.get(
@@ -430,7 +490,7 @@ async def create_context_entry_legacy(
     summary="[Legacy] Список контекстных записей пользователя",
     deprecated=True
 )
-async def get_user_context_legacy(
+def get_user_context_legacy(
     user_id: int,
     db: Session = Depends(get_db)
 ):
@@ -439,4 +499,15 @@ async def get_user_context_legacy(
     
     Используйте /entries вместо этого
     """
-    return await get_context_entries(user_id=user_id, db=db)
+    # Параметры фильтрации передаются явно: значения по умолчанию в сигнатуре -
+    # объекты Query, которые подставляет только FastAPI
+    return get_context_entries(
+        user_id=user_id,
+        session_id=None,
+        tags=None,
+        date_from=None,
+        date_to=None,
+        limit=50,
+        offset=0,
+        db=db
+    )
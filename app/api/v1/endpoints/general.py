@@ -16,7 +16,7 @@ async def root():
 
 
 @router.get("/health", summary="Проверка состояния сервиса и БД")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     try:
         db.execute(text("SELECT 1"))
         db_status = "healthy"
@@ -31,7 +31,7 @@ async def health_check(db: Session = Depends(get_db)):
 
 
 @router.post("/debug/check-user/{user_id}", summary="Проверить и создать пользователя (для отладки)")
-async def check_and_create_user_debug(user_id: int, db: Session = Depends(get_db)):
+def check_and_create_user_debug(user_id: int, db: Session = Depends(get_db)):
     """Временный эндпоинт для проверки и создания пользователя с нужным ID"""
     # Проверяем пользователя с телефоном +79138817676
     phone = "+79138817676"
@@ -85,7 +85,7 @@ async def check_and_create_user_debug(user_id: int, db: Session = Depends(get_db
 
 
 @router.post("/debug/test-token", summary="Тестировать токен (для отладки)")
-async def test_token_debug(request: dict, db: Session = Depends(get_db)):
+def test_token_debug(request: dict, db: Session = Depends(get_db)):
     token = request.get("token")
     """Временный эндпоинт для тестирования токена"""
     from jose import jwt
@@ -139,7 +139,7 @@ async def test_token_debug(request: dict, db: Session = Depends(get_db)):
 
 
 @router.post("/debug/apply-migration-004", summary="Применить миграцию 004 (для отладки)")
-async def apply_migration_004(db: Session = Depends(get_db)):
+def apply_migration_004(db: Session = Depends(get_db)):
     """Временный эндпоинт для применения миграции 004 - увеличение длины zodiac_sign"""
     try:
         from sqlalchemy import text
@@ -26,7 +26,7 @@ router = APIRouter(tags=["Geocoding"], prefix="/api/geocoding")
     response_model=GeocodingSearchResponse,
     summary="Поиск городов в базе данных"
 )
-async def search_cities(
+def search_cities(
     request: GeocodingSearchRequest
 ):
     """
@@ -51,7 +51,7 @@ async def search_cities(
     response_model=UserResponse,
     summary="Ручной ввод координат места рождения"
 )
-async def set_manual_coordinates(
+def set_manual_coordinates(
     request: ManualCoordinatesRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -100,7 +100,7 @@ async def set_manual_coordinates(
     "/geocode/{location_name}",
     summary="Геокодирование города"
 )
-async def geocode_city(
+def geocode_city(
     location_name: str,
     country: str = None
 ):
@@ -142,7 +142,7 @@ async def geocode_city(
     "/validate-coordinates",
     summary="Валидация координат"
 )
-async def validate_coordinates(
+def validate_coordinates(
     latitude: float,
     longitude: float
 ):
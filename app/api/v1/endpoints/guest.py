@@ -10,6 +10,7 @@ from pydantic import BaseModel
 from app.services.astro_service import astro_service
 from app.services.geocoding_service import geocoding_service
 from app.services.ai_service import ai_service
+from app.services.date_parser import parse_date, parse_time
 
 
 router = APIRouter(tags=["Guest"], prefix="/api/guest")
@@ -45,7 +46,7 @@ class GuestAIRequest(BaseModel):
     response_model=GuestChartResponse,
     summary="Рассчитать натальную карту (гостевой режим)"
 )
-async def calculate_guest_chart(request: GuestChartRequest):
+def calculate_guest_chart(request: GuestChartRequest):
     """
     Рассчитывает натальную карту без регистрации.
     Не сохраняет данные в БД, только возвращает результат расчета.
@@ -53,7 +54,7 @@ async def calculate_guest_chart(request: GuestChartRequest):
     try:
         # Парсим дату и время
         try:
-            birth_date_obj = datetime.strptime(request.birth_date, "%Y-%m-%d").date()
+            birth_date_obj = parse_date(request.birth_date)
         except ValueError:
             try:
                 birth_date_obj = datetime.strptime(request.birth_date, "%d.%m.%Y").date()
@@ -61,7 +62,7 @@ async def calculate_guest_chart(request: GuestChartRequest):
                 raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте YYYY-MM-DD или DD.MM.YYYY")
         
         try:
-            birth_time_obj = datetime.strptime(request.birth_time, "%H:%M").time()
+            birth_time_obj = parse_time(request.birth_time)
         except ValueError:
             raise HTTPException(status_code=400, detail="Неверный формат времени. Используйте HH:MM")
         
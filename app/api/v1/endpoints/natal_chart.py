@@ -1,9 +1,10 @@
 """
 Роутер для работы с натальными картами.
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional
+from pydantic import TypeAdapter
 
 from app.core.database import get_db
 from app.models.database.models import User
@@ -15,18 +16,23 @@ from app.models.schemas.schemas import (
     AspectResponse,
     AngleResponse
 )
-from app.services.natal_chart_service import natal_chart_service
+from app.services.natal_chart_service import natal_chart_service, NATAL_CHART_REDIS_TTL
+from app.services.redis_service import redis_service
 from app.api.v1.endpoints.auth import get_current_user
 
 router = APIRouter(tags=["Natal Charts"], prefix="/api/natal-chart")
 
+# Валидаторы списка аспектов и словаря углов строятся один раз при импорте
+_ASPECTS_ADAPTER = TypeAdapter(List[AspectResponse])
+_ANGLES_ADAPTER = TypeAdapter(Dict[str, AngleResponse])
+
 
 @router.post(
     "/calculate/",
     response_model=NatalChartCalculateResponse,
     summary="Рассчитать натальную карту"
 )
-async def calculate_natal_chart(
+def calculate_natal_chart(
     request: Optional[NatalChartCalculateRequest] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -69,7 +75,7 @@ async def calculate_natal_chart(
     response_model=NatalChartResponse,
     summary="Получить натальную карту пользователя"
 )
-async def get_natal_chart(
+def get_natal_chart(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -81,7 +87,15 @@ async def get_natal_chart(
     - Аспекты между планетами
     - Куспиды всех 12 домов
     - ASC и MC
+    
+    Готовый JSON ответа кешируется в Redis до пересчета карты
+    и при повторных запросах отдается без обращения к БД и Pydantic.
     """
+    cache_key = natal_chart_service.response_cache_key(current_user.id)
+    cached_body = redis_service.cache_get_raw(cache_key)
+    if cached_body:
+        return Response(content=cached_body, media_type="application/json")
+    
     chart_data = natal_chart_service.get_chart_for_user(current_user, db)
     
     if not chart_data:
@@ -91,46 +105,41 @@ async def get_natal_chart(
         )
     
     # Преобразуем данные для ответа
-    # Используем простые словари для planets и houses, так как они уже в нужном формате
-    planets_response = {}
-    for planet_name, planet_data in chart_data['planets'].items():
-        longitude = planet_data['longitude']
-        # Вычисляем градусы внутри знака, если их нет
-        degree_in_sign = planet_data.get('degree_in_sign', round(longitude % 30, 2))
-        planets_response[planet_name] = {
+    # Используем простые словари для planets и houses, так как они уже в нужном формате;
+    # градусы внутри знака вычисляются, только если их нет в данных карты
+    planets_response = {
+        planet_name: {
             'planet_name': planet_name,
-            'longitude': longitude,
+            'longitude': planet_data['longitude'],
             'zodiac_sign': planet_data['zodiac_sign'],
-            'degree_in_sign': degree_in_sign,
+            'degree_in_sign': planet_data['degree_in_sign'] if 'degree_in_sign' in planet_data
+            else round(planet_data['longitude'] % 30, 2),
             'house': planet_data['house'],
             'is_retrograde': planet_data.get('is_retrograde', False)
         }
+        for planet_name, planet_data in chart_data['planets'].items()
+    }
     
-    aspects_response = []
-    for aspect_data in chart_data['aspects']:
-        aspects_response.append(AspectResponse(**aspect_data))
+    aspects_response = _ASPECTS_ADAPTER.validate_python(chart_data['aspects'])
     
-    houses_response = {}
-    for house_num, house_data in chart_data['houses'].items():
-        longitude = house_data['longitude']
-        # Вычисляем градусы внутри знака, если их нет
-        degree_in_sign = house_data.get('degree_in_sign', round(longitude % 30, 2))
-        houses_response[str(house_num)] = {
+    houses_response = {
+        str(house_num): {
             'house_number': house_num,
-            'longitude': longitude,
+            'longitude': house_data['longitude'],
             'zodiac_sign': house_data['zodiac_sign'],
-            'degree_in_sign': degree_in_sign
+            'degree_in_sign': house_data['degree_in_sign'] if 'degree_in_sign' in house_data
+            else round(house_data['longitude'] % 30, 2)
         }
+        for house_num, house_data in chart_data['houses'].items()
+    }
     
-    angles_response = {}
-    for angle_name, angle_data in chart_data['angles'].items():
-        # Убеждаемся, что degree_in_sign присутствует
-        if 'degree_in_sign' not in angle_data:
-            longitude = angle_data.get('longitude', 0)
-            angle_data['degree_in_sign'] = round(longitude % 30, 2)
-        angles_response[angle_name] = AngleResponse(**angle_data)
+    angles_response = _ANGLES_ADAPTER.validate_python({
+        angle_name: angle_data if 'degree_in_sign' in angle_data
+        else {**angle_data, 'degree_in_sign': round(angle_data.get('longitude', 0) % 30, 2)}
+        for angle_name, angle_data in chart_data['angles'].items()
+    })
     
-    return NatalChartResponse(
+    body = NatalChartResponse(
         chart_id=chart_data['chart_id'],
         calculated_at=chart_data['calculated_at'],
         houses_system=chart_data['houses_system'],
@@ -139,7 +148,9 @@ async def get_natal_chart(
         aspects=aspects_response,
         houses=houses_response,
         angles=angles_response
-    )
+    ).model_dump_json()
+    redis_service.cache_set(cache_key, body, ttl=NATAL_CHART_REDIS_TTL)
+    return Response(content=body, media_type="application/json")
 
 
 @router.post(
@@ -147,7 +158,7 @@ async def get_natal_chart(
     response_model=NatalChartCalculateResponse,
     summary="Принудительный пересчет натальной карты"
 )
-async def recalculate_natal_chart(
+def recalculate_natal_chart(
     request: Optional[NatalChartRecalculateRequest] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
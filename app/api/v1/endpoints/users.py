@@ -1,19 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, date, time
 
 from app.core.database import get_db
 from app.models.database.models import User
 from app.models.schemas.schemas import UserCreate, UserResponse, UserProfileUpdate
 from app.api.v1.endpoints.auth import get_current_user
 from app.services.natal_chart_service import natal_chart_service
+from app.services.date_parser import parse_date, parse_time
 
 router = APIRouter(tags=["Users"])
 
 
 @router.put("/users/me", response_model=UserResponse, summary="Обновить профиль текущего пользователя")
-async def update_current_user(
+def update_current_user(
     user_data: UserCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -51,7 +51,7 @@ async def update_current_user(
     if user_data.birth_date is not None:
         # Валидация даты
         try:
-            datetime.strptime(user_data.birth_date, "%Y-%m-%d")
+            parse_date(user_data.birth_date)
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -62,7 +62,7 @@ async def update_current_user(
     if user_data.birth_time is not None:
         # Валидация времени
         try:
-            datetime.strptime(user_data.birth_time, "%H:%M")
+            parse_time(user_data.birth_time)
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -81,7 +81,7 @@ async def update_current_user(
         
         if user_data.birth_date:
             try:
-                birth_date_obj = datetime.strptime(user_data.birth_date, "%Y-%m-%d").date()
+                birth_date_obj = parse_date(user_data.birth_date)
             except ValueError:
                 raise HTTPException(
                     status_code=400,
@@ -90,7 +90,7 @@ async def update_current_user(
         
         if user_data.birth_time:
             try:
-                birth_time_obj = datetime.strptime(user_data.birth_time, "%H:%M").time()
+                birth_time_obj = parse_time(user_data.birth_time)
             except ValueError:
                 raise HTTPException(
                     status_code=400,
@@ -136,7 +136,7 @@ async def update_current_user(
 
 
 @router.patch("/users/me/profile", response_model=UserResponse, summary="Обновить расширенный профиль пользователя")
-async def update_user_profile(
+def update_user_profile(
     user_data: UserProfileUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -155,7 +155,7 @@ async def update_user_profile(
     
     if user_data.birth_date:
         try:
-            birth_date_obj = datetime.strptime(user_data.birth_date, "%Y-%m-%d").date()
+            birth_date_obj = parse_date(user_data.birth_date)
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -164,7 +164,7 @@ async def update_user_profile(
     
     if user_data.birth_time:
         try:
-            birth_time_obj = datetime.strptime(user_data.birth_time, "%H:%M").time()
+            birth_time_obj = parse_time(user_data.birth_time)
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -196,7 +196,7 @@ async def update_user_profile(
 
 
 @router.get("/users/me", response_model=UserResponse, summary="Получить профиль текущего пользователя")
-async def get_current_user_profile(
+def get_current_user_profile(
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -206,7 +206,7 @@ async def get_current_user_profile(
 
 
 @router.get("/users", response_model=List[UserResponse], summary="Список пользователей (только для админов)")
-async def get_users(db: Session = Depends(get_db)):
+def get_users(db: Session = Depends(get_db)):
     """
     Получение списка всех пользователей
     TODO: Добавить проверку прав администратора
@@ -217,7 +217,7 @@ async def get_users(db: Session = Depends(get_db)):
 
 
 @router.get("/users/{user_id}", response_model=UserResponse, summary="Получить пользователя по ID")
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_db)):
     """
     Получение пользователя по ID
     TODO: Добавить проверку прав доступа
@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 import os
 from dotenv import load_dotenv
 
@@ -9,11 +10,28 @@ load_dotenv()
 # Фолбэк на SQLite, если переменная окружения не задана
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 
+# Пул соединений рассчитан на параллельные sync-обработчики, которые FastAPI
+# выполняет в пуле потоков: каждому потоку должно хватать соединения
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_MAX_CONNECTIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
 # Для SQLite нужен специальный параметр
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+elif os.getenv("DB_USE_PGBOUNCER", "").lower() in ("1", "true", "yes"):
+    # Пулом соединений управляет PgBouncer (transaction pooling), приложение его не держит
+    engine = create_engine(DATABASE_URL, poolclass=NullPool)
 else:
-    engine = create_engine(DATABASE_URL)
+    # Пул рассчитан на параллельные запросы чата; pool_pre_ping отбрасывает соединения,
+    # закрытые сервером или балансировщиком, до того как они попадут в запрос
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_pre_ping=True,
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
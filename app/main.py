@@ -1,7 +1,10 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from anyio import to_thread
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
@@ -14,7 +17,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Импорты из наших модулей
-from app.core.database import engine, Base
+from app.core.database import engine, Base, DB_MAX_CONNECTIONS
+from app.services.redis_service import redis_service
+from app.services.vector_service import vector_service
+from app.services.auth_service import AuthService
 from app.api.v1.endpoints import (
     astrology_router,
     contacts_router,
@@ -48,8 +54,23 @@ tags_metadata = [
     {"name": "Guest", "description": "Гостевые расчеты без регистрации."}
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync-обработчики с запросами к БД выполняются в пуле потоков anyio: его размер
+    # равен пулу соединений, чтобы потоки не простаивали в ожидании соединения
+    to_thread.current_default_thread_limiter().total_tokens = DB_MAX_CONNECTIONS
+    # Инициализация bcrypt и JWT выполняется до первого запроса
+    await asyncio.to_thread(AuthService.warm_up)
+    yield
+    # Задачи контекста, еще не отправленные пакетом в очередь, не должны потеряться
+    await redis_service.flush_context_tasks()
+    # Поисковые запросы, ожидающие пакета, выполняются до остановки
+    await vector_service.flush_searches()
+
+
 # FastAPI приложение
 app = FastAPI(
+    lifespan=lifespan,
     title="Astropsychology API",
     description="API для мобильного приложения Астопсихология",
     version="1.0.0",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, DECIMAL, Date, Time
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, DECIMAL, Date, Time, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.core.database import Base
@@ -108,17 +108,20 @@ class HouseCuspid(Base):
 
 class Contact(Base):
     __tablename__ = "contacts"
-    __table_args__ = {'extend_existing': True}  # ← Добавьте эту строку
+    __table_args__ = (
+        (Index('ix_contacts_aliases_gin', 'aliases', postgresql_using='gin'), {'extend_existing': True})
+        if USE_JSONB else {'extend_existing': True}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # индекс: миграция 011
     name = Column(String(100), nullable=False)
     relationship_type = Column(String(50), nullable=False)
     custom_title = Column(String(100), nullable=True)
     birth_date = Column(String(10), nullable=False)
     birth_time = Column(String(5), nullable=False)
     birth_place = Column(String(200), nullable=False)
-    aliases = Column(JSON)
+    aliases = Column(JSONB if USE_JSONB else JSON)  # GIN-индекс в PostgreSQL (миграция 008)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     user = relationship("User")
@@ -137,6 +140,7 @@ class ChatSession(Base):
     is_active = Column(Integer, default=1)  # 1 = активна, 0 = неактивна
     parent_session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=True)
     session_type = Column(String(50), default='regular')  # regular, emergency, decision
+    message_count = Column(Integer, default=0, server_default='0', nullable=False)  # Счетчик сообщений (миграция 009)
 
     user = relationship("User")
     parent_session = relationship("ChatSession", remote_side=[id], backref="child_sessions")
@@ -158,6 +162,17 @@ class ChatMessage(Base):
 
 class ContextEntry(Base):
     __tablename__ = "context_entries"
+    __table_args__ = (
+        # Частичный индекс для проверок внешнего ключа session_id (миграция 007)
+        Index(
+            'ix_context_entries_session_id', 'session_id',
+            postgresql_where=text('session_id IS NOT NULL'),
+            sqlite_where=text('session_id IS NOT NULL'),
+        ),
+        # Списки записей пользователя (и его сессии) по убыванию created_at (миграция 012)
+        Index('ix_context_entries_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_context_entries_user_id_session_id_created_at', 'user_id', 'session_id', 'created_at'),
+    ) + ((Index('ix_context_entries_tags_gin', 'tags', postgresql_using='gin'),) if USE_JSONB else ())
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -169,7 +184,7 @@ class ContextEntry(Base):
     insight_text = Column(Text, nullable=True)  # Переименовано из insight
     astro_context = Column(JSONB if USE_JSONB else JSON, nullable=True)  # JSONB для PostgreSQL, JSON для SQLite
     successful_strategy = Column(Text, nullable=True)
-    tags = Column(JSON)  # TEXT[] в PostgreSQL будет через JSON
+    tags = Column(JSONB if USE_JSONB else JSON)  # JSONB + GIN-индекс в PostgreSQL (миграция 008)
     priority = Column(Integer, default=1)  # 1-5, где 5 - максимальная важность
     entry_type = Column(String(20), default='auto')  # auto, manual, critical
     vector_id = Column(String(36), nullable=True)  # UUID вектора в Qdrant
@@ -189,6 +204,10 @@ class ContextEntry(Base):
 
 class SMSCode(Base):
     __tablename__ = "sms_codes"
+    __table_args__ = (
+        # Проверка подтвержденного кода и поиск последнего кода телефона (миграция 010)
+        Index('ix_sms_codes_phone_used_created_at', 'phone', 'used', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String(20), nullable=False, index=True)
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import os
 import json
 import requests
@@ -5,6 +7,8 @@ import logging
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from app.services.redis_service import redis_service
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -222,8 +226,15 @@ class DeepSeekAIChatService:
                                 user_data: Dict,
                                 template_type: Optional[str] = None,
                                 context_entries: List[Dict] = None,
-                                mentioned_contacts: List[Dict] = None) -> str:
-        """Генерация ответа через DeepSeek API"""
+                                mentioned_contacts: List[Dict] = None,
+                                user_id: Optional[int] = None,
+                                message_embedding: Optional[List[float]] = None) -> str:
+        """
+        Генерация ответа через DeepSeek API
+
+        Если переданы user_id и эмбеддинг сообщения, ответ на семантически близкое
+        сообщение берется из кеша Redis без обращения к API.
+        """
 
         try:
             if not self.api_key:
@@ -233,6 +244,17 @@ class DeepSeekAIChatService:
                 user_data, template_type, context_entries, mentioned_contacts
             )
 
+            # Ответ зависит от всего системного промпта (шаблон, данные пользователя,
+            # контекст, контакты), поэтому кеш разделен по пользователю и отпечатку промпта
+            prompt_fingerprint = None
+            if user_id is not None and message_embedding:
+                prompt_fingerprint = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()
+                cached_response = redis_service.semantic_lookup(
+                    message_embedding, user_id, prompt_fingerprint
+                )
+                if cached_response is not None:
+                    return cached_response
+
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}"
@@ -249,11 +271,19 @@ class DeepSeekAIChatService:
                 "stream": False
             }
 
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
+            # requests блокирует поток до ответа API (до 30 с): запрос уходит в пул потоков,
+            # чтобы event loop продолжал обслуживать другие запросы
+            response = await asyncio.to_thread(
+                requests.post, self.api_url, headers=headers, json=payload, timeout=30
+            )
             response.raise_for_status()
 
             result = response.json()
-            return result["choices"][0]["message"]["content"]
+            content = result["choices"][0]["message"]["content"]
+
+            if prompt_fingerprint:
+                redis_service.semantic_store(message_embedding, content, user_id, prompt_fingerprint)
+            return content
 
         except requests.exceptions.Timeout:
             return "⏰ Извините, время ожидания ответа истекло. Пожалуйста, попробуйте еще раз."
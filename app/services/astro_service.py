@@ -2,7 +2,15 @@
 Профессиональный астрологический сервис для расчета натальных карт.
 Использует pyswisseph (Swiss Ephemeris) для всех расчетов: планет, домов и аспектов.
 """
+import calendar
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from threading import Lock
 from typing import Dict, Optional, List, Tuple
 import pytz
 import swisseph as swe
@@ -33,10 +41,21 @@ except ImportError:
 
 
 class ProfessionalAstroService:
+    # Размер LRU-кеша натальных карт: одинаковые входные данные всегда дают одинаковую карту
+    NATAL_CHART_CACHE_SIZE = 2048
+    # Размер LRU-кеша транзитов: результат определяется натальными позициями, датой и зоной
+    TRANSITS_CACHE_SIZE = 4096
+
     def __init__(self):
         # Загружаем орбисы из конфигурации
         self._orbs = astrology_config.get_orbs()
         
+        # LRU-кеш рассчитанных карт; карты считаются и из пула потоков, поэтому доступ под блокировкой
+        self._natal_chart_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._natal_chart_cache_lock = Lock()
+        self._transits_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._transits_cache_lock = Lock()
+        
         # Аспекты из конфигурации
         self._aspects = astrology_config.ASPECTS
         
@@ -116,10 +135,25 @@ class ProfessionalAstroService:
         if aspect_name not in self._orbs:
             print(f"⚠️ Предупреждение: аспект '{aspect_name}' не найден в конфигурации")
         self._orbs[aspect_name] = float(orb_value)
+        # Аспекты в кешированных картах и транзитах рассчитаны со старыми орбисами
+        self.clear_natal_chart_cache()
+        self.clear_transits_cache()
     
     def reload_config(self):
         """Перезагрузить конфигурацию (для обновления через переменные окружения)"""
         self._orbs = astrology_config.get_orbs()
+        self.clear_natal_chart_cache()
+        self.clear_transits_cache()
+    
+    def clear_natal_chart_cache(self):
+        """Очистить кеш рассчитанных натальных карт"""
+        with self._natal_chart_cache_lock:
+            self._natal_chart_cache.clear()
+    
+    def clear_transits_cache(self):
+        """Очистить кеш рассчитанных транзитов"""
+        with self._transits_cache_lock:
+            self._transits_cache.clear()
 
     def _degrees_to_zodiac_sign(self, longitude: float) -> Tuple[str, str, float]:
         """
@@ -450,6 +484,9 @@ class ProfessionalAstroService:
         """
         Расчет полной натальной карты используя только Swiss Ephemeris.
         
+        Успешные результаты хранятся в LRU-кеше (NATAL_CHART_CACHE_SIZE записей), поэтому
+        повторный расчет по тем же данным возвращает тот же объект: изменять его нельзя.
+        
         Args:
             birth_date: Дата рождения
             birth_time_utc: Время рождения в UTC
@@ -460,6 +497,37 @@ class ProfessionalAstroService:
         Returns:
             Dict с полными данными натальной карты
         """
+        try:
+            cache_key = (birth_date, birth_time_utc, latitude, longitude, houses_system)
+            hash(cache_key)
+        except TypeError:
+            cache_key = None
+        
+        if cache_key is not None:
+            with self._natal_chart_cache_lock:
+                cached = self._natal_chart_cache.get(cache_key)
+                if cached is not None:
+                    self._natal_chart_cache.move_to_end(cache_key)
+                    return cached
+        
+        chart = self._compute_natal_chart(birth_time_utc, latitude, longitude, houses_system)
+        
+        # Ошибки не кешируются: они могут зависеть не только от входных данных
+        if cache_key is not None and chart['success']:
+            with self._natal_chart_cache_lock:
+                self._natal_chart_cache[cache_key] = chart
+                if len(self._natal_chart_cache) > self.NATAL_CHART_CACHE_SIZE:
+                    self._natal_chart_cache.popitem(last=False)
+        return chart
+
+    def _compute_natal_chart(
+        self,
+        birth_time_utc: datetime,
+        latitude: float,
+        longitude: float,
+        houses_system: str
+    ) -> Dict:
+        """Расчет натальной карты через Swiss Ephemeris (без кеша)"""
         try:
             # Преобразуем в юлианскую дату для Swiss Ephemeris
             jd = swe.julday(
@@ -659,6 +727,27 @@ class ProfessionalAstroService:
         # Конвертируем в нужную временную зону
         return dt.astimezone(timezone)
 
+    def transits_cache_key(
+        self,
+        natal_chart: Dict,
+        target_date: str,
+        timezone_name: Optional[str] = None
+    ) -> str:
+        """
+        Ключ кеша транзитов: хеш всех данных, от которых зависит результат
+        (долготы натальных планет, дата, временная зона и текущие орбисы).
+        Координаты места в расчете транзитов не участвуют и в ключ не входят.
+        """
+        natal_longitudes = sorted(
+            (planet_key, planet.get('longitude', 0))
+            for planet_key, planet in natal_chart.get('planets', {}).items()
+        )
+        canonical = json.dumps(
+            [natal_longitudes, target_date, timezone_name, sorted(self._orbs.items())],
+            separators=(',', ':')
+        )
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
     def calculate_transits(
         self, 
         natal_chart: Dict, 
@@ -670,6 +759,9 @@ class ProfessionalAstroService:
         """
         Расчет транзитов на конкретную дату используя Swiss Ephemeris.
         
+        Успешные результаты хранятся в LRU-кеше (TRANSITS_CACHE_SIZE записей) по ключу
+        transits_cache_key, поэтому изменять возвращенный словарь нельзя.
+        
         Args:
             natal_chart: Словарь с данными натальной карты
             target_date: Дата для расчета транзитов (формат: "YYYY-MM-DD")
@@ -677,6 +769,29 @@ class ProfessionalAstroService:
             longitude: Долгота места для расчета (опционально)
             timezone_name: Название временной зоны (опционально)
         """
+        cache_key = self.transits_cache_key(natal_chart, target_date, timezone_name)
+        with self._transits_cache_lock:
+            cached = self._transits_cache.get(cache_key)
+            if cached is not None:
+                self._transits_cache.move_to_end(cache_key)
+                return cached
+        
+        transits = self._compute_transits(natal_chart, target_date, timezone_name)
+        
+        if transits['success']:
+            with self._transits_cache_lock:
+                self._transits_cache[cache_key] = transits
+                if len(self._transits_cache) > self.TRANSITS_CACHE_SIZE:
+                    self._transits_cache.popitem(last=False)
+        return transits
+
+    def _compute_transits(
+        self,
+        natal_chart: Dict,
+        target_date: str,
+        timezone_name: Optional[str] = None
+    ) -> Dict:
+        """Расчет транзитов без кеширования (см. calculate_transits)"""
         try:
             target_dt = datetime.strptime(target_date, "%Y-%m-%d")
             # Устанавливаем полдень для транзитов
@@ -787,30 +902,61 @@ class ProfessionalAstroService:
             return "Нейтральный день. Хорошее время для рутины и планирования."
 
     def generate_calendar_with_transits(self, natal_chart: Dict, year: int, month: int) -> Dict:
-        """Генерация календаря с транзитами на месяц"""
-        days = []
+        """
+        Генерация календаря с транзитами на месяц.
+        
+        Дни, которых нет в кеше транзитов, считаются параллельно в пуле процессов
+        (расчет Swiss Ephemeris упирается в CPU и GIL), результаты пополняют кеш.
+        """
+        dates = [
+            f"{year}-{month:02d}-{day:02d}"
+            for day in range(1, calendar.monthrange(year, month)[1] + 1)
+        ]
 
-        for day in range(1, 32):
+        transits_by_date = {}
+        missing_dates = []
+        with self._transits_cache_lock:
+            for date_str in dates:
+                cached = self._transits_cache.get(self.transits_cache_key(natal_chart, date_str))
+                if cached is not None:
+                    transits_by_date[date_str] = cached
+                else:
+                    missing_dates.append(date_str)
+
+        if missing_dates:
+            natal_planets = {'planets': natal_chart.get('planets', {})}
             try:
-                date_str = f"{year}-{month:02d}-{day:02d}"
-                datetime.strptime(date_str, "%Y-%m-%d")  # Проверка валидности
+                computed = list(_get_calendar_executor().map(
+                    _calculate_day_transits,
+                    [natal_planets] * len(missing_dates),
+                    missing_dates,
+                    [self._orbs] * len(missing_dates)
+                ))
+            except Exception as e:
+                print(f"⚠️ Пул процессов календаря недоступен, расчет в текущем процессе: {e}")
+                computed = [self._compute_transits(natal_chart, date_str) for date_str in missing_dates]
+
+            with self._transits_cache_lock:
+                for date_str, transits in zip(missing_dates, computed):
+                    transits_by_date[date_str] = transits
+                    if transits['success']:
+                        self._transits_cache[self.transits_cache_key(natal_chart, date_str)] = transits
+                while len(self._transits_cache) > self.TRANSITS_CACHE_SIZE:
+                    self._transits_cache.popitem(last=False)
 
-                # Расчет транзитов на день
-                transits = self.calculate_transits(natal_chart, date_str)
-
-                if transits['success']:
-                    # Определение цвета дня
-                    day_color = self._get_day_color(transits['transits'])
-
-                    days.append({
-                        'date': date_str,
-                        'color': day_color,
-                        'description': transits['summary'],
-                        'transits': transits['transits']
-                    })
-
-            except ValueError:
-                continue
+        days = []
+        for date_str in dates:
+            transits = transits_by_date[date_str]
+            if transits['success']:
+                # Определение цвета дня
+                day_color = self._get_day_color(transits['transits'])
+
+                days.append({
+                    'date': date_str,
+                    'color': day_color,
+                    'description': transits['summary'],
+                    'transits': transits['transits']
+                })
 
         return {
             'month': f"{year}-{month:02d}",
@@ -844,3 +990,29 @@ class ProfessionalAstroService:
 
 # Глобальный экземпляр сервиса
 astro_service = ProfessionalAstroService()
+
+
+# Пул процессов для расчета календаря транзитов; создается при первом календаре.
+# Процессы запускаются через spawn: fork многопоточного сервера небезопасен
+_calendar_executor: Optional[ProcessPoolExecutor] = None
+_calendar_executor_lock = Lock()
+
+
+def _get_calendar_executor() -> ProcessPoolExecutor:
+    """Возвращает общий пул процессов календаря (CALENDAR_WORKERS, по умолчанию число CPU)"""
+    global _calendar_executor
+    with _calendar_executor_lock:
+        if _calendar_executor is None:
+            _calendar_executor = ProcessPoolExecutor(
+                max_workers=int(os.getenv("CALENDAR_WORKERS", os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _calendar_executor
+
+
+def _calculate_day_transits(natal_chart: Dict, date_str: str, orbs: Dict[str, float]) -> Dict:
+    """Расчет транзитов на день в процессе пула с орбисами родительского процесса"""
+    if astro_service._orbs != orbs:
+        astro_service._orbs = dict(orbs)
+        astro_service.clear_transits_cache()
+    return astro_service._compute_transits(natal_chart, date_str)
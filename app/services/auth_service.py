@@ -3,13 +3,16 @@
 """
 import os
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Optional, Dict, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, event, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
 from dotenv import load_dotenv
 from app.models.database.models import User
+from app.services.redis_service import redis_service
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -25,6 +28,86 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15  # 15 минут
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 дней
 
+# Время жизни отметки "телефон не зарегистрирован": повторные попытки входа
+# и сброса пароля по неизвестному номеру не доходят до БД
+UNKNOWN_PHONE_CACHE_TTL = 60  # 1 минута
+
+# Колонки пользователя, которые кешируются в Redis для get_current_user.
+# Хеш пароля в кеш не попадает: при обращении он загружается из БД
+_USER_CACHE_COLUMNS = [column for column in User.__table__.columns if column.key != "password_hash"]
+
+
+def _user_cache_key(user_id: int) -> str:
+    """Ключ кеша пользователя в Redis"""
+    return f"auth:user:{user_id}"
+
+
+def _unknown_phone_key(phone: str) -> str:
+    """Ключ отметки о незарегистрированном телефоне в Redis"""
+    return f"noent:phone:{phone}"
+
+
+def _dump_user(user: User) -> Dict:
+    """Сериализация колонок пользователя в JSON-совместимый словарь"""
+    data = {}
+    for column in _USER_CACHE_COLUMNS:
+        value = getattr(user, column.key)
+        if isinstance(value, (date, time)):  # datetime - подкласс date
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        data[column.key] = value
+    return data
+
+
+def _load_user(db: Session, data: Dict) -> User:
+    """
+    Пользователь из кеша, привязанный к сессии без запроса к БД (merge с load=False).
+    Изменения такого объекта сохраняются обычным коммитом сессии.
+    """
+    values = {}
+    for column in _USER_CACHE_COLUMNS:
+        value = data.get(column.key)
+        if value is not None:
+            python_type = column.type.python_type
+            if python_type in (date, time, datetime):
+                value = python_type.fromisoformat(value)
+            elif python_type is Decimal:
+                value = Decimal(value)
+        values[column.key] = value
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_user_cache_stale(mapper, connection, user: User) -> None:
+    """Запоминает измененного пользователя: его кеш сбрасывается после коммита"""
+    session = Session.object_session(user)
+    if session is not None:
+        session.info.setdefault("stale_user_ids", set()).add(user.id)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def _mark_phone_registered(mapper, connection, user: User) -> None:
+    """Запоминает появившийся в БД телефон: отметка о его отсутствии сбрасывается после коммита"""
+    if not inspect(user).attrs.phone.history.has_changes():
+        return
+    session = Session.object_session(user)
+    if session is not None:
+        session.info.setdefault("registered_phones", set()).add(user.phone)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stale_users(session: Session) -> None:
+    """Сброс кеша пользователей, измененных в закоммиченной транзакции"""
+    for user_id in session.info.pop("stale_user_ids", ()):
+        redis_service.cache_delete(_user_cache_key(user_id))
+    for phone in session.info.pop("registered_phones", ()):
+        redis_service.cache_delete(_unknown_phone_key(phone))
+
 
 class AuthService:
     """Сервис для работы с аутентификацией и JWT токенами"""
@@ -76,84 +159,153 @@ class AuthService:
             # Проверяем тип токена
             token_type_in_payload = payload.get("type")
             if token_type_in_payload != token_type:
-                logger.warning(f"Неверный тип токена. Ожидается {token_type}, получен {token_type_in_payload}")
+                logger.warning("Неверный тип токена. Ожидается %s, получен %s", token_type, token_type_in_payload)
                 return None
             
             return payload
         except JWTError as e:
-            logger.warning(f"Ошибка проверки токена: {str(e)}")
+            logger.warning("Ошибка проверки токена: %s", e)
             return None
 
     @staticmethod
-    def authenticate_user(db: Session, phone: str, password: str) -> Optional[User]:
+    def warm_up() -> None:
+        """
+        Прогрев при старте приложения: passlib выбирает backend bcrypt, а jose загружает
+        алгоритм подписи при первом вызове, и эта задержка не должна приходиться на первый запрос
+        """
+        AuthService.verify_password("warmup", AuthService.get_password_hash("warmup"))
+        AuthService.verify_token(AuthService.create_access_token({"sub": "0"}))
+
+    @staticmethod
+    def is_phone_unknown(phone: str) -> bool:
+        """Телефон недавно не нашелся в БД (отметка в Redis)"""
+        return redis_service.cache_get(_unknown_phone_key(phone)) is not None
+
+    @staticmethod
+    def remember_unknown_phone(phone: str) -> None:
+        """Отмечает в Redis, что телефон не зарегистрирован"""
+        redis_service.cache_set(_unknown_phone_key(phone), 1, ttl=UNKNOWN_PHONE_CACHE_TTL)
+
+    @staticmethod
+    def authenticate_user(db: Session, phone: str, password: str) -> Optional[Row]:
         """
-        Аутентификация пользователя по телефону и паролю
+        Аутентификация пользователя по телефону и паролю.
+        Возвращает строку (id, phone, password_hash, phone_verified) без загрузки ORM-объекта
         """
-        user = db.query(User).filter(User.phone == phone).first()
+        if AuthService.is_phone_unknown(phone):
+            logger.warning("Пользователь с телефоном %s не найден (кеш)", phone)
+            return None
+        
+        user = db.execute(
+            select(User.id, User.phone, User.password_hash, User.phone_verified)
+            .where(User.phone == phone)
+        ).first()
         
         if not user:
-            logger.warning(f"Пользователь с телефоном {phone} не найден")
+            logger.warning("Пользователь с телефоном %s не найден", phone)
+            AuthService.remember_unknown_phone(phone)
             return None
         
         if not AuthService.verify_password(password, user.password_hash):
-            logger.warning(f"Неверный пароль для пользователя {phone}")
+            logger.warning("Неверный пароль для пользователя %s", phone)
             return None
         
         if user.phone_verified != 1:
-            logger.warning(f"Телефон пользователя {phone} не подтвержден")
+            logger.warning("Телефон пользователя %s не подтвержден", phone)
             return None
         
-        logger.info(f"Пользователь {phone} успешно аутентифицирован")
+        logger.info("Пользователь %s успешно аутентифицирован", phone)
         return user
 
+    @staticmethod
+    def get_user_data(db: Session, user_id: int) -> Optional[Dict]:
+        """
+        Колонки пользователя (без хеша пароля) из кеша Redis, при промахе - из БД.
+        Используется там, где ORM-объект не нужен; промах заполняет тот же кеш,
+        что и get_current_user, и сбрасывается теми же событиями изменения пользователя
+        """
+        cached_user = redis_service.cache_get(_user_cache_key(user_id))
+        if isinstance(cached_user, dict):
+            return cached_user
+        
+        user = db.get(User, user_id)
+        if user is None:
+            return None
+        user_data = _dump_user(user)
+        redis_service.cache_set(_user_cache_key(user_id), user_data, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        return user_data
+
     @staticmethod
     def get_current_user(db: Session, token: str) -> Optional[User]:
         """
         Получение текущего пользователя по JWT токену
         """
-        logger.info(f"get_current_user вызван с токеном: {token[:50]}...")
-        logger.info(f"SECRET_KEY для проверки: {SECRET_KEY[:20]}...")
+        return AuthService.get_current_user_with_payload(db, token)[0]
+
+    @staticmethod
+    def get_current_user_with_payload(db: Session, token: str) -> Tuple[Optional[User], Optional[Dict]]:
+        """
+        Получение текущего пользователя и декодированного payload JWT токена.
+        Токен декодируется один раз: если пользователь не получен, по payload можно
+        определить причину (refresh токен, удаленный пользователь). payload равен None,
+        если токен не прошел проверку подписи/срока действия или не удалось обратиться к БД
+        """
+        logger.info("get_current_user вызван с токеном: %s...", token[:50])
+        logger.info("SECRET_KEY для проверки: %s...", SECRET_KEY[:20])
         
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             token_type_in_payload = payload.get("type")
             
-            logger.info(f"✅ Токен декодирован: type={token_type_in_payload}, sub={payload.get('sub')}, exp={payload.get('exp')}")
+            logger.info("✅ Токен декодирован: type=%s, sub=%s, exp=%s", token_type_in_payload, payload.get('sub'), payload.get('exp'))
             
             # Проверяем тип токена с более понятным сообщением
             if token_type_in_payload != "access":
                 if token_type_in_payload == "refresh":
                     logger.warning("❌ Попытка использовать refresh токен вместо access токена")
                 else:
-                    logger.warning(f"❌ Неверный тип токена: {token_type_in_payload}")
-                return None
+                    logger.warning("❌ Неверный тип токена: %s", token_type_in_payload)
+                return None, payload
         except JWTError as e:
-            logger.error(f"❌ Ошибка проверки токена: {str(e)}, тип: {type(e).__name__}")
-            return None
+            logger.error("❌ Ошибка проверки токена: %s, тип: %s", e, type(e).__name__)
+            return None, None
         
         user_id = payload.get("sub")
         if user_id is None:
             logger.warning("❌ В токене отсутствует поле 'sub' (user_id)")
-            return None
+            return None, payload
         
         # Конвертируем user_id в int, если это строка
         try:
             user_id = int(user_id)
         except (ValueError, TypeError) as e:
-            logger.warning(f"❌ Неверный формат user_id в токене: {user_id} (тип: {type(user_id)}), ошибка: {e}")
-            return None
+            logger.warning("❌ Неверный формат user_id в токене: %s (тип: %s), ошибка: %s", user_id, type(user_id), e)
+            return None, payload
         
-        logger.info(f"🔍 Ищем пользователя с ID {user_id} (тип: {type(user_id)})")
+        # Пользователь из кеша Redis: без запроса к БД
+        cached_user = redis_service.cache_get(_user_cache_key(user_id))
+        if isinstance(cached_user, dict):
+            return _load_user(db, cached_user), payload
+        
+        logger.info("🔍 Ищем пользователя с ID %s (тип: %s)", user_id, type(user_id))
         try:
             user = db.query(User).filter(User.id == user_id).first()
             if user is None:
                 # Проверяем, есть ли вообще пользователи в базе
                 total_users = db.query(User).count()
-                logger.warning(f"❌ Пользователь с ID {user_id} не найден в базе данных. Всего пользователей в базе: {total_users}")
+                logger.warning("❌ Пользователь с ID %s не найден в базе данных. Всего пользователей в базе: %s", user_id, total_users)
             else:
-                logger.info(f"✅ Пользователь найден: ID={user.id}, phone={user.phone}")
-            return user
+                logger.info("✅ Пользователь найден: ID=%s, phone=%s", user.id, user.phone)
+                # Кеш живет не дольше оставшегося срока действия токена
+                ttl = int(payload.get("exp", 0) - datetime.now(timezone.utc).timestamp())
+                if ttl > 0:
+                    redis_service.cache_set(
+                        _user_cache_key(user_id),
+                        _dump_user(user),
+                        ttl=min(ttl, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+                    )
+            return user, payload
         except Exception as e:
-            logger.error(f"❌ Ошибка при запросе к базе данных: {str(e)}")
-            return None
+            logger.error("❌ Ошибка при запросе к базе данных: %s", e)
+            return None, None
 
@@ -38,6 +38,13 @@ class ContextService:
     def __init__(self):
         self.ai_service = DeepSeekAIChatService()
     
+    @staticmethod
+    def _time_since(moment: datetime) -> timedelta:
+        """Время, прошедшее с moment (значения из БД без временной зоны считаются UTC)"""
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - moment
+    
     # ============ Управление сессиями ============
     
     def get_or_create_active_session(
@@ -72,7 +79,7 @@ class ContextService:
         
         if active_session:
             # Проверяем время бездействия
-            time_since_update = datetime.now(timezone.utc) - active_session.updated_at
+            time_since_update = self._time_since(active_session.updated_at)
             
             if time_since_update < timedelta(hours=self.SESSION_TIMEOUT_HOURS):
                 # Сессия активна, обновляем время
@@ -130,6 +137,7 @@ class ContextService:
         db.add(new_session)
         db.commit()
         db.refresh(new_session)
+        redis_service.invalidate_active_session(user_id)
         
         logger.info(f"✅ Создана новая сессия {new_session.id} для пользователя {user_id}")
         return new_session
@@ -193,11 +201,12 @@ class ContextService:
         Returns:
             True если сессия истекла
         """
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        # db.get берет уже загруженную сессию из identity map без запроса к БД
+        session = db.get(ChatSession, session_id)
         if not session:
             return True
         
-        time_since_update = datetime.now(timezone.utc) - session.updated_at
+        time_since_update = self._time_since(session.updated_at)
         return time_since_update >= timedelta(hours=self.SESSION_TIMEOUT_HOURS)
     
     def check_topic_change(self, message: str) -> bool:
@@ -240,15 +249,17 @@ class ContextService:
         if message_count > 0 and message_count % self.MESSAGE_COUNT_TRIGGER == 0:
             return True, "message_count"
         
+        # Сессия нужна обоим оставшимся триггерам; db.get берет ее из identity map,
+        # если вызывающий код уже загрузил ее в этой сессии БД
+        session = db.get(ChatSession, session_id)
+        
         # 2. Превышение 30 минут бездействия
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
         if session:
-            time_since_update = datetime.now(timezone.utc) - session.updated_at
+            time_since_update = self._time_since(session.updated_at)
             if time_since_update >= timedelta(minutes=self.INACTIVITY_TIMEOUT_MINUTES):
                 return True, "timeout"
         
         # 3. Критические шаблоны
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
         if session and session.template_type in self.CRITICAL_TEMPLATES:
             return True, "critical"
         
@@ -312,7 +323,7 @@ class ContextService:
         
         # 2. Семантически близкие записи через векторный поиск
         if current_message and vector_service.client:
-            vector_results = vector_service.search_similar(
+            vector_results = vector_service.search_similar_batched(
                 query_text=current_message,
                 user_id=user_id,
                 limit=5,
@@ -0,0 +1,27 @@
+"""
+Разбор дат и времени рождения в форматах ГГГГ-ММ-ДД и ЧЧ:ММ
+"""
+from datetime import date, datetime, time
+
+
+def parse_date(value: str) -> date:
+    """
+    Разбор даты формата ГГГГ-ММ-ДД.
+    Строка канонического вида разбирается срезами без datetime.strptime,
+    остальные (например, без ведущих нулей) передаются strptime.
+    Некорректная строка или несуществующая дата вызывают ValueError
+    """
+    if len(value) == 10 and value[4] == '-' and value[7] == '-' \
+            and (value[0:4] + value[5:7] + value[8:10]).isdigit():
+        return date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def parse_time(value: str) -> time:
+    """
+    Разбор времени формата ЧЧ:ММ (канонический вид разбирается без strptime).
+    Некорректная строка или время вне диапазона вызывают ValueError
+    """
+    if len(value) == 5 and value[2] == ':' and (value[0:2] + value[3:5]).isdigit():
+        return time(int(value[0:2]), int(value[3:5]))
+    return datetime.strptime(value, "%H:%M").time()
@@ -9,6 +9,10 @@ from app.models.database.models import User, NatalChart, PlanetPosition, Aspect,
 from app.services.astro_service import astro_service
 from app.services.geocoding_service import geocoding_service
 from app.services.cache_service import natal_chart_cache
+from app.services.redis_service import redis_service
+
+# Время жизни карты в общем кеше Redis (24 часа)
+NATAL_CHART_REDIS_TTL = 86400
 
 
 class NatalChartService:
@@ -16,6 +20,16 @@ class NatalChartService:
         self.astro_service = astro_service
         self.geocoding_service = geocoding_service
 
+    @staticmethod
+    def _chart_cache_key(user_id: int) -> str:
+        """Ключ карты пользователя в кеше Redis"""
+        return f"chart:{user_id}"
+
+    @staticmethod
+    def response_cache_key(user_id: int) -> str:
+        """Ключ готового JSON-ответа GET /api/natal-chart/ в кеше Redis"""
+        return f"natal_chart:{user_id}"
+
     def calculate_and_save_chart(
         self,
         user: User,
@@ -141,6 +155,8 @@ class NatalChartService:
             
             # Инвалидируем кеш для пользователя после пересчета
             natal_chart_cache.invalidate(user.id)
+            redis_service.cache_delete(self._chart_cache_key(user.id))
+            redis_service.cache_delete(self.response_cache_key(user.id))
             
             return {
                 'success': True,
@@ -159,7 +175,8 @@ class NatalChartService:
     def get_chart_for_user(self, user: User, db: Session, use_cache: bool = True) -> Optional[Dict]:
         """
         Получает натальную карту пользователя из базы данных.
-        Использует кеш для ускорения доступа.
+        Использует кеш для ускорения доступа: сначала общий кеш Redis
+        (без запросов к БД), затем in-memory кеш процесса.
         
         Args:
             user: Объект пользователя
@@ -171,7 +188,15 @@ class NatalChartService:
         """
         # Проверяем кеш
         if use_cache:
-            # Сначала получаем время расчета карты для проверки актуальности
+            shared_data = redis_service.cache_get(self._chart_cache_key(user.id))
+            if isinstance(shared_data, dict):
+                # JSON хранит ключи словаря строками, номера домов восстанавливаются
+                shared_data['houses'] = {
+                    int(house_number): house for house_number, house in shared_data['houses'].items()
+                }
+                return shared_data
+            
+            # Затем получаем время расчета карты для проверки актуальности
             chart_meta = db.query(NatalChart).filter(
                 NatalChart.user_profile_id == user.id
             ).with_entities(NatalChart.calculated_at).first()
@@ -253,6 +278,7 @@ class NatalChartService:
         # Сохраняем в кеш
         if use_cache:
             natal_chart_cache.set(user.id, result, natal_chart.calculated_at)
+            redis_service.cache_set(self._chart_cache_key(user.id), result, ttl=NATAL_CHART_REDIS_TTL)
         
         return result
 
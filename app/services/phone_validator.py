@@ -8,15 +8,18 @@ from typing import Tuple, Optional
 class PhoneValidator:
     """Валидатор телефонных номеров"""
     
-    # Паттерны для разных стран
+    # Паттерны для разных стран (компилируются один раз, проверяются через fullmatch)
     COUNTRY_PATTERNS = {
-        "+7": r"^\+7\d{10}$",  # Россия: +7XXXXXXXXXX (10 цифр после +7)
-        "+1": r"^\+1\d{10}$",  # США/Канада
-        "+44": r"^\+44\d{10}$",  # Великобритания
-        "+49": r"^\+49\d{10,11}$",  # Германия
+        "+7": re.compile(r"\+7\d{10}"),  # Россия: +7XXXXXXXXXX (10 цифр после +7)
+        "+1": re.compile(r"\+1\d{10}"),  # США/Канада
+        "+44": re.compile(r"\+44\d{10}"),  # Великобритания
+        "+49": re.compile(r"\+49\d{10,11}"),  # Германия
     }
     
     DEFAULT_COUNTRY = "+7"  # Россия по умолчанию
+    
+    # Все символы, кроме цифр и +
+    _NON_PHONE_CHARS_RE = re.compile(r'[^\d+]')
 
     @staticmethod
     def normalize_phone(phone: str, country_code: str = None) -> Optional[str]:
@@ -25,7 +28,7 @@ class PhoneValidator:
         Удаляет все символы кроме цифр и +, добавляет код страны если нужно
         """
         # Удаляем все символы кроме цифр и +
-        cleaned = re.sub(r'[^\d+]', '', phone)
+        cleaned = PhoneValidator._NON_PHONE_CHARS_RE.sub('', phone)
         
         # Если номер не начинается с +, добавляем код страны
         if not cleaned.startswith('+'):
@@ -43,6 +46,10 @@ class PhoneValidator:
         Валидация номера телефона
         Возвращает (is_valid, normalized_phone)
         """
+        # Быстрый путь: российский номер уже в нормализованном виде +7XXXXXXXXXX
+        if PhoneValidator.COUNTRY_PATTERNS["+7"].fullmatch(phone):
+            return True, phone
+        
         normalized = PhoneValidator.normalize_phone(phone, country_code)
         
         if not normalized:
@@ -53,7 +60,7 @@ class PhoneValidator:
         
         # Проверяем паттерн
         pattern = PhoneValidator.COUNTRY_PATTERNS.get(country_code)
-        if pattern and re.match(pattern, normalized):
+        if pattern and pattern.fullmatch(normalized):
             return True, normalized
         
         # Если паттерна нет, проверяем базовую структуру
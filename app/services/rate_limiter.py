@@ -1,47 +1,102 @@
 """
 Сервис для ограничения частоты запросов (Rate Limiting)
 Защита от брутфорса
+
+Скользящее окно хранится в Redis (Sorted Set на телефон и тип лимита), поэтому
+лимиты общие для всех процессов приложения. Без Redis используется in-memory окно.
 """
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional, Tuple
 from collections import defaultdict
 
+from app.services.redis_service import redis_service
+
 logger = logging.getLogger(__name__)
 
+# Проверка и запись запроса одним атомарным вызовом: очистка устаревших записей окна,
+# подсчет, добавление текущего запроса и продление TTL ключа
+_SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+if redis.call('ZCARD', key) >= limit then
+    return 0
+end
+redis.call('ZADD', key, now, ARGV[4])
+redis.call('PEXPIRE', key, window)
+return 1
+"""
+
+# Типы лимитов (часть ключа в Redis)
+LIMIT_KINDS = ("sms", "login", "verify")
+
 
 class RateLimiter:
-    """Простой in-memory rate limiter"""
+    """Rate limiter со скользящим окном в Redis (in-memory, если Redis недоступен)"""
     
-    # Хранение запросов: {phone: [timestamp1, timestamp2, ...]}
+    # Хранение запросов без Redis: {"тип:phone": [timestamp1, timestamp2, ...]}
     _requests: Dict[str, list] = defaultdict(list)
     
+    # Скрипт скользящего окна (регистрируется при первом обращении; вызывается через EVALSHA)
+    _window_script = None
+    
     # Ограничения
     SMS_REQUESTS_PER_HOUR = 5  # Максимум 5 запросов SMS в час
     LOGIN_ATTEMPTS_PER_HOUR = 5  # Максимум 5 попыток входа в час
     CODE_VERIFY_ATTEMPTS_PER_HOUR = 10  # Максимум 10 попыток проверки кода в час
 
+    @staticmethod
+    def _redis_key(kind: str, phone: str) -> str:
+        """Ключ окна лимита в Redis"""
+        return f"rl:{kind}:{phone}"
+
     @classmethod
-    def _cleanup_old_requests(cls, phone: str, window_minutes: int = 60):
+    def _cleanup_old_requests(cls, key: str, window_minutes: int = 60):
         """Удаление старых запросов"""
         cutoff = datetime.now(timezone.utc) - timedelta(minutes=window_minutes)
-        cls._requests[phone] = [
-            ts for ts in cls._requests[phone] if ts > cutoff
+        cls._requests[key] = [
+            ts for ts in cls._requests[key] if ts > cutoff
         ]
 
+    @classmethod
+    def _check_limit(cls, kind: str, phone: str, limit: int, window_minutes: int = 60) -> bool:
+        """
+        Проверяет лимит и, если он не превышен, учитывает текущий запрос.
+        Возвращает True, если запрос разрешен
+        """
+        if redis_service.redis_client:
+            try:
+                if cls._window_script is None:
+                    cls._window_script = redis_service.redis_client.register_script(_SLIDING_WINDOW_SCRIPT)
+                allowed = cls._window_script(
+                    keys=[cls._redis_key(kind, phone)],
+                    args=[int(time.time() * 1000), window_minutes * 60 * 1000, limit, uuid.uuid4().hex]
+                )
+                return bool(allowed)
+            except Exception as e:
+                logger.error("❌ Ошибка проверки лимита в Redis: %s", e)
+        
+        key = f"{kind}:{phone}"
+        cls._cleanup_old_requests(key, window_minutes)
+        if len(cls._requests[key]) >= limit:
+            return False
+        cls._requests[key].append(datetime.now(timezone.utc))
+        return True
+
     @classmethod
     def check_sms_rate_limit(cls, phone: str) -> Tuple[bool, Optional[str]]:
         """
         Проверка ограничения на отправку SMS
         Возвращает (allowed, error_message)
         """
-        cls._cleanup_old_requests(phone, window_minutes=60)
-        
-        if len(cls._requests[phone]) >= cls.SMS_REQUESTS_PER_HOUR:
-            logger.warning(f"Превышен лимит SMS запросов для {phone}")
+        if not cls._check_limit("sms", phone, cls.SMS_REQUESTS_PER_HOUR):
+            logger.warning("Превышен лимит SMS запросов для %s", phone)
             return False, f"Превышен лимит запросов. Попробуйте через час."
-        
-        cls._requests[phone].append(datetime.now(timezone.utc))
         return True, None
 
     @classmethod
@@ -49,13 +104,9 @@ class RateLimiter:
         """
         Проверка ограничения на попытки входа
         """
-        cls._cleanup_old_requests(phone, window_minutes=60)
-        
-        if len(cls._requests[phone]) >= cls.LOGIN_ATTEMPTS_PER_HOUR:
-            logger.warning(f"Превышен лимит попыток входа для {phone}")
+        if not cls._check_limit("login", phone, cls.LOGIN_ATTEMPTS_PER_HOUR):
+            logger.warning("Превышен лимит попыток входа для %s", phone)
             return False, f"Превышен лимит попыток входа. Попробуйте через час."
-        
-        cls._requests[phone].append(datetime.now(timezone.utc))
         return True, None
 
     @classmethod
@@ -63,19 +114,20 @@ class RateLimiter:
         """
         Проверка ограничения на проверку кодов
         """
-        cls._cleanup_old_requests(phone, window_minutes=60)
-        
-        if len(cls._requests[phone]) >= cls.CODE_VERIFY_ATTEMPTS_PER_HOUR:
-            logger.warning(f"Превышен лимит проверок кода для {phone}")
+        if not cls._check_limit("verify", phone, cls.CODE_VERIFY_ATTEMPTS_PER_HOUR):
+            logger.warning("Превышен лимит проверок кода для %s", phone)
             return False, f"Превышен лимит проверок кода. Попробуйте через час."
-        
-        cls._requests[phone].append(datetime.now(timezone.utc))
         return True, None
 
     @classmethod
     def reset_limits(cls, phone: str):
         """Сброс лимитов для телефона (например, после успешной аутентификации)"""
-        if phone in cls._requests:
-            del cls._requests[phone]
-            logger.info(f"Лимиты сброшены для {phone}")
-
+        if redis_service.redis_client:
+            try:
+                redis_service.redis_client.delete(*(cls._redis_key(kind, phone) for kind in LIMIT_KINDS))
+            except Exception as e:
+                logger.error("❌ Ошибка сброса лимитов в Redis: %s", e)
+        
+        for kind in LIMIT_KINDS:
+            cls._requests.pop(f"{kind}:{phone}", None)
+        logger.info("Лимиты сброшены для %s", phone)
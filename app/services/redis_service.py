@@ -4,6 +4,9 @@
 """
 import os
 import json
+import math
+import uuid
+import asyncio
 import logging
 from typing import Optional, Dict, Any, List
 from redis import Redis
@@ -21,6 +24,19 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Семантический кеш ответов ИИ: сколько последних ответов хранится на область
+# (пользователь + системный промпт) и сколько они живут
+SEMANTIC_CACHE_MAX_ENTRIES = 20
+SEMANTIC_CACHE_TTL = 86400  # 24 часа
+
+# Пакетная постановка задач контекста: сколько ждать следующую задачу
+# и сколько задач максимум уходит в Redis одним pipeline
+CONTEXT_BATCH_WAIT = 0.005  # 5 мс
+CONTEXT_BATCH_MAX_SIZE = 100
+
+# Активная сессия пользователя, которую клиент опрашивает на каждое сообщение
+ACTIVE_SESSION_CACHE_TTL = 30  # 30 секунд
+
 
 class RedisService:
     """Сервис для работы с Redis"""
@@ -67,6 +83,11 @@ class RedisService:
             self.use_sqlite_queue = SQLITE_QUEUE_AVAILABLE
             if self.use_sqlite_queue:
                 logger.info("✅ Используется SQLite-основанная очередь (бесплатная альтернатива Redis)")
+        
+        # Буфер задач контекста и фоновая задача, отправляющая их пакетами
+        # (создаются при первой задаче, внутри работающего event loop)
+        self._context_batch: Optional[asyncio.Queue] = None
+        self._context_flusher: Optional[asyncio.Task] = None
     
     # ============ Кеширование ============
     
@@ -129,6 +150,26 @@ class RedisService:
             logger.error(f"❌ Ошибка получения из кеша: {str(e)}")
             return None
     
+    def cache_get_raw(self, key: str) -> Optional[str]:
+        """
+        Получение строки из кеша без разбора JSON
+        (для готовых тел ответов, которые отдаются клиенту как есть)
+        
+        Args:
+            key: Ключ кеша
+            
+        Returns:
+            Строка или None
+        """
+        if not self.redis_client:
+            return None
+        
+        try:
+            return self.redis_client.get(key)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения из кеша: {str(e)}")
+            return None
+    
     def cache_delete(self, key: str) -> bool:
         """
         Удаление значения из кеша
@@ -190,6 +231,8 @@ class RedisService:
         # Используем Redis очередь если доступна
         if self.context_queue:
             try:
+                # rq записывает хеш задачи со статусом queued и кладет ее id в очередь
+                # одной транзакцией MULTI/EXEC (один сетевой round trip)
                 job = self.context_queue.enqueue(
                     task_func,
                     *args,
@@ -212,14 +255,173 @@ class RedisService:
         logger.warning("Очередь задач не инициализирована (Redis недоступен, SQLite queue недоступен)")
         return None
     
-    def _enqueue_to_sqlite(self, task_func, *args, **kwargs) -> Optional[str]:
-        """Добавление задачи в SQLite очередь"""
+    def enqueue_task_invalidating_context(
+        self,
+        cache_session_id: int,
+        task_func,
+        *args,
+        **kwargs
+    ) -> Optional[str]:
+        """
+        Добавление задачи в очередь с инвалидацией кеша контекста сессии
+        
+        В Redis постановка задачи и удаление кеша отправляются одним pipeline
+        (один сетевой round trip). Кеш сбрасывается, только если задача поставлена.
+        
+        Args:
+            cache_session_id: ID сессии, чей кешированный контекст устаревает
+            task_func: Функция для выполнения
+            *args: Позиционные аргументы
+            **kwargs: Именованные аргументы
+            
+        Returns:
+            ID задачи (job_id) или None при ошибке
+        """
+        if self.context_queue:
+            try:
+                with self.redis_client.pipeline(transaction=False) as pipe:
+                    job = self.context_queue.enqueue(
+                        task_func,
+                        *args,
+                        **kwargs,
+                        job_timeout=300,  # 5 минут на выполнение задачи
+                        pipeline=pipe
+                    )
+                    pipe.delete(self._session_context_key(cache_session_id))
+                    pipe.execute()
+                logger.info(f"✅ Задача добавлена в Redis очередь: {job.id}")
+                return job.id
+            except Exception as e:
+                logger.error(f"❌ Ошибка добавления задачи в Redis очередь: {str(e)}")
+                if not self.use_sqlite_queue:
+                    return None
+        elif not self.use_sqlite_queue:
+            logger.warning("Очередь задач не инициализирована (Redis недоступен, SQLite queue недоступен)")
+            return None
+        
+        # SQLite очередь: кеш (если Redis все же доступен) сбрасывается отдельной командой
+        task_id = self._enqueue_to_sqlite(task_func, *args, **kwargs)
+        if task_id:
+            self.invalidate_session_context(cache_session_id)
+        return task_id
+    
+    async def submit_context_task(self, cache_session_id: int, task_func, **kwargs) -> Optional[str]:
+        """
+        Постановка задачи контекста в очередь пакетами
+        
+        Задачи, пришедшие почти одновременно из разных запросов, собираются в буфер
+        и отправляются в Redis одним pipeline вместе с инвалидацией кеша их сессий.
+        ID задачи возвращается после отправки пакета: если пакет не принят Redis,
+        задача ставится в SQLite очередь под тем же ID, а если и это невозможно,
+        возвращается None.
+        
+        Args:
+            cache_session_id: ID сессии, чей кешированный контекст устаревает
+            task_func: Функция для выполнения
+            **kwargs: Именованные аргументы
+            
+        Returns:
+            ID задачи (job_id) или None при ошибке
+        """
+        if not self.context_queue:
+            return self.enqueue_task_invalidating_context(cache_session_id, task_func, **kwargs)
+        
+        if self._context_flusher is None or self._context_flusher.done():
+            self._context_batch = asyncio.Queue()
+            self._context_flusher = asyncio.create_task(self._flush_context_tasks())
+        
+        future = asyncio.get_running_loop().create_future()
+        job_id = str(uuid.uuid4())
+        self._context_batch.put_nowait((future, job_id, cache_session_id, task_func, kwargs))
+        return await future
+    
+    async def _flush_context_tasks(self) -> None:
+        """Фоновая отправка накопленных задач контекста; None в буфере - сигнал остановки"""
+        stopping = False
+        items = []
+        try:
+            while not stopping:
+                items = [await self._context_batch.get()]
+                # Даем параллельным запросам дописать свои задачи в тот же пакет
+                await asyncio.sleep(CONTEXT_BATCH_WAIT)
+                while len(items) < CONTEXT_BATCH_MAX_SIZE and not self._context_batch.empty():
+                    items.append(self._context_batch.get_nowait())
+                
+                stopping = None in items
+                batch = [item for item in items if item is not None]
+                if batch:
+                    # Сетевой вызов синхронного клиента Redis уходит в пул потоков
+                    job_ids = await asyncio.to_thread(
+                        self._enqueue_context_batch, [item[1:] for item in batch]
+                    )
+                    for (future, *_), job_id in zip(batch, job_ids):
+                        if not future.done():
+                            future.set_result(job_id)
+        finally:
+            # Фоновая задача прервана (отмена, ошибка): ожидающие вызовы получают None
+            # и сохраняют контекст синхронно, а не ждут результата бесконечно
+            while not self._context_batch.empty():
+                items.append(self._context_batch.get_nowait())
+            for item in items:
+                if item is not None and not item[0].done():
+                    item[0].set_result(None)
+    
+    async def flush_context_tasks(self) -> None:
+        """Отправка всех накопленных задач контекста и остановка фоновой задачи"""
+        if self._context_flusher is None or self._context_flusher.done():
+            return
+        self._context_batch.put_nowait(None)
+        await self._context_flusher
+        self._context_flusher = None
+    
+    def _enqueue_context_batch(self, batch: List[tuple]) -> List[Optional[str]]:
+        """
+        Постановка пакета задач и инвалидация кеша их сессий одним pipeline
+        
+        Returns:
+            ID каждой задачи пакета или None для задачи, которую не удалось поставить
+        """
+        from rq import Queue
+        
+        try:
+            job_datas = [
+                Queue.prepare_data(
+                    task_func,
+                    kwargs=kwargs,
+                    timeout=300,  # 5 минут на выполнение задачи
+                    job_id=job_id
+                )
+                for job_id, _, task_func, kwargs in batch
+            ]
+            cache_keys = {self._session_context_key(session_id) for _, session_id, _, _ in batch}
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                self.context_queue.enqueue_many(job_datas, pipeline=pipe)
+                pipe.delete(*cache_keys)
+                pipe.execute()
+            logger.info(f"✅ Задач добавлено в Redis очередь одним пакетом: {len(batch)}")
+            return [job_id for job_id, _, _, _ in batch]
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного добавления задач в Redis очередь: {str(e)}")
+            if not self.use_sqlite_queue:
+                return [None] * len(batch)
+            job_ids = []
+            for job_id, session_id, task_func, kwargs in batch:
+                # Задача сохраняет ID, уже выданный вызывающему коду
+                queued_id = self._enqueue_to_sqlite(task_func, job_id=job_id, **kwargs)
+                if queued_id:
+                    self.invalidate_session_context(session_id)
+                job_ids.append(queued_id)
+            return job_ids
+    
+    def _enqueue_to_sqlite(self, task_func, *args, job_id: Optional[str] = None, **kwargs) -> Optional[str]:
+        """Добавление задачи в SQLite очередь (job_id - заранее выбранный ID задачи)"""
         try:
             job_timeout = kwargs.pop('job_timeout', 300)
             job_id = sqlite_queue_service.enqueue(
                 task_func,
                 queue_name='context_tasks',
                 timeout=job_timeout,
+                job_id=job_id,
                 *args,
                 **kwargs
             )
@@ -242,17 +444,31 @@ class RedisService:
         # Пытаемся получить из Redis
         if self.context_queue and self.redis_client:
             try:
-                from rq.job import Job
+                from rq.job import Job, JobStatus
+                from rq.results import Result
+                # Job.fetch читает хеш задачи целиком (один HGETALL): статус берется
+                # из него без повторного HGET, а поток результатов читается один раз
+                # и только для завершенных задач
                 job = Job.fetch(job_id, connection=self.redis_client)
                 if job:
+                    status = job.get_status(refresh=False)
+                    result = None
+                    exc_info = None
+                    if status in (JobStatus.FINISHED, JobStatus.FAILED):
+                        latest = job.latest_result()
+                        if latest is not None:
+                            if latest.type == Result.Type.SUCCESSFUL:
+                                result = latest.return_value
+                            elif latest.type == Result.Type.FAILED:
+                                exc_info = latest.exc_string
                     return {
                         "id": job.id,
-                        "status": job.get_status(),
+                        "status": status,
                         "created_at": job.created_at.isoformat() if job.created_at else None,
                         "started_at": job.started_at.isoformat() if job.started_at else None,
                         "ended_at": job.ended_at.isoformat() if job.ended_at else None,
-                        "result": str(job.result) if job.result else None,
-                        "exc_info": job.exc_info if job.exc_info else None
+                        "result": str(result) if result else None,
+                        "exc_info": exc_info if exc_info else None
                     }
             except Exception as e:
                 logger.debug(f"Задача не найдена в Redis: {str(e)}")
@@ -285,6 +501,11 @@ class RedisService:
     
     # ============ Специфичные методы для контекста ============
     
+    @staticmethod
+    def _session_context_key(session_id: int) -> str:
+        """Ключ кеша контекста сессии"""
+        return f"session:context:{session_id}"
+    
     def cache_session_context(
         self,
         session_id: int,
@@ -302,7 +523,7 @@ class RedisService:
         Returns:
             True при успехе
         """
-        key = f"session:context:{session_id}"
+        key = self._session_context_key(session_id)
         return self.cache_set(key, context_entries, ttl)
     
     def get_cached_session_context(
@@ -318,7 +539,7 @@ class RedisService:
         Returns:
             Список контекстных записей или None
         """
-        key = f"session:context:{session_id}"
+        key = self._session_context_key(session_id)
         return self.cache_get(key)
     
     def invalidate_session_context(self, session_id: int) -> bool:
@@ -331,9 +552,147 @@ class RedisService:
         Returns:
             True при успехе
         """
-        key = f"session:context:{session_id}"
+        key = self._session_context_key(session_id)
+        return self.cache_delete(key)
+    
+    @staticmethod
+    def _active_session_key(user_id: int) -> str:
+        """Ключ кеша активной сессии пользователя"""
+        return f"active_session:{user_id}"
+    
+    def cache_active_session(self, user_id: int, session_data: Dict[str, Any]) -> bool:
+        """
+        Кеширование данных активной сессии пользователя на ACTIVE_SESSION_CACHE_TTL
+        
+        Args:
+            user_id: ID пользователя
+            session_data: Данные сессии (JSON-совместимый словарь)
+            
+        Returns:
+            True при успехе
+        """
+        key = self._active_session_key(user_id)
+        return self.cache_set(key, session_data, ACTIVE_SESSION_CACHE_TTL)
+    
+    def get_cached_active_session(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение кешированных данных активной сессии пользователя
+        
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            Данные сессии или None
+        """
+        key = self._active_session_key(user_id)
+        return self.cache_get(key)
+    
+    def invalidate_active_session(self, user_id: int) -> bool:
+        """
+        Инвалидация кеша активной сессии (новая сессия или новые сообщения)
+        
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            True при успехе
+        """
+        key = self._active_session_key(user_id)
         return self.cache_delete(key)
 
+    
+    # ============ Семантический кеш ответов ИИ ============
+    
+    @staticmethod
+    def _semantic_cache_key(user_id: int, prompt_fingerprint: str) -> str:
+        """Ключ семантического кеша: ответы разделены по пользователю и системному промпту"""
+        return f"semantic:{user_id}:{prompt_fingerprint}"
+    
+    @staticmethod
+    def _cosine_similarity(a: List[float], b: List[float]) -> float:
+        """Косинусная близость двух векторов"""
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+    
+    def semantic_lookup(
+        self,
+        embedding: List[float],
+        user_id: int,
+        prompt_fingerprint: str,
+        threshold: float = 0.85
+    ) -> Optional[str]:
+        """
+        Поиск сохраненного ответа ИИ на семантически близкое сообщение
+        
+        Args:
+            embedding: Эмбеддинг сообщения пользователя
+            user_id: ID пользователя
+            prompt_fingerprint: Отпечаток системного промпта
+            threshold: Минимальная косинусная близость для попадания
+            
+        Returns:
+            Ответ ИИ или None, если близкого сообщения нет
+        """
+        if not self.redis_client:
+            return None
+        
+        try:
+            entries = self.redis_client.lrange(
+                self._semantic_cache_key(user_id, prompt_fingerprint), 0, -1
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения семантического кеша: {str(e)}")
+            return None
+        
+        best_response = None
+        best_score = threshold
+        for entry_str in entries:
+            entry = json.loads(entry_str)
+            score = self._cosine_similarity(embedding, entry['embedding'])
+            if score >= best_score:
+                best_score = score
+                best_response = entry['response']
+        
+        if best_response is not None:
+            logger.info(f"Семантический кеш: попадание (близость {best_score:.3f})")
+        return best_response
+    
+    def semantic_store(
+        self,
+        embedding: List[float],
+        response: str,
+        user_id: int,
+        prompt_fingerprint: str
+    ) -> bool:
+        """
+        Сохранение ответа ИИ в семантический кеш
+        
+        Args:
+            embedding: Эмбеддинг сообщения пользователя
+            response: Ответ ИИ
+            user_id: ID пользователя
+            prompt_fingerprint: Отпечаток системного промпта
+            
+        Returns:
+            True при успехе
+        """
+        if not self.redis_client:
+            return False
+        
+        key = self._semantic_cache_key(user_id, prompt_fingerprint)
+        entry_str = json.dumps({'embedding': embedding, 'response': response}, ensure_ascii=False)
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, entry_str)
+                pipe.ltrim(key, 0, SEMANTIC_CACHE_MAX_ENTRIES - 1)
+                pipe.expire(key, SEMANTIC_CACHE_TTL)
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения в семантический кеш: {str(e)}")
+            return False
+
 
 # Глобальный экземпляр сервиса
 redis_service = RedisService()
@@ -99,6 +99,7 @@ class SQLiteQueueService:
         queue_name: str = 'default',
         *args,
         timeout: int = 300,
+        job_id: Optional[str] = None,
         **kwargs
     ) -> str:
         """
@@ -109,12 +110,13 @@ class SQLiteQueueService:
             queue_name: Имя очереди
             *args: Позиционные аргументы
             timeout: Таймаут выполнения в секундах
+            job_id: ID задачи, если он выбран заранее (иначе генерируется)
             **kwargs: Именованные аргументы
             
         Returns:
             job_id - уникальный идентификатор задачи
         """
-        job_id = str(uuid.uuid4())
+        job_id = job_id or str(uuid.uuid4())
         
         # Сериализуем аргументы
         args_json = json.dumps(args, ensure_ascii=False, default=str) if args else None
@@ -3,17 +3,29 @@
 Обеспечивает создание эмбеддингов, сохранение и поиск векторов
 """
 import os
+import asyncio
 import logging
 from typing import List, Dict, Optional, Any
+import anyio.from_thread
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, QueryRequest
+)
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Пакетный семантический поиск: сколько ждать запросы параллельных обработчиков
+# и сколько запросов максимум уходит в Qdrant одним query_batch_points
+SEARCH_BATCH_WAIT = 0.01  # 10 мс
+SEARCH_BATCH_MAX_SIZE = 32
+
 
 class VectorService:
     """Сервис для работы с векторной БД Qdrant"""
@@ -53,6 +65,8 @@ class VectorService:
         # Загрузка модели для эмбеддингов
         self.embedding_model = None
         try:
+            if SentenceTransformer is None:
+                raise ImportError("sentence_transformers")
             model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
             logger.info(f"Загрузка модели эмбеддингов: {model_name}... (это может занять время при первом запуске)")
             self.embedding_model = SentenceTransformer(model_name)
@@ -69,6 +83,11 @@ class VectorService:
             self._ensure_collection_exists()
         else:
             logger.warning("⚠️ Коллекция Qdrant не создана (Qdrant недоступен)")
+        
+        # Буфер поисковых запросов и фоновая задача, отправляющая их пакетами
+        # (создаются при первом запросе, внутри работающего event loop)
+        self._search_batch: Optional[asyncio.Queue] = None
+        self._search_flusher: Optional[asyncio.Task] = None
     
     def _ensure_collection_exists(self):
         """Создание коллекции если её нет"""
@@ -198,52 +217,200 @@ class VectorService:
                 logger.error("Не удалось создать эмбеддинг для запроса")
                 return []
             
-            # Строим фильтры
-            filters = []
-            if user_id:
-                filters.append(
-                    FieldCondition(key="user_id", match=MatchValue(value=user_id))
-                )
-            if session_id:
-                filters.append(
-                    FieldCondition(key="session_id", match=MatchValue(value=session_id))
-                )
-            if tags:
-                # Для тегов используем OR условие (любой из тегов)
-                tag_filters = [
-                    FieldCondition(key="tags", match=MatchValue(value=tag))
-                    for tag in tags
-                ]
-                # TODO: Реализовать OR логику для тегов (пока используем первый тег)
-                if tag_filters:
-                    filters.append(tag_filters[0])
-            
-            search_filter = Filter(must=filters) if filters else None
-            
             # Выполняем поиск
-            search_results = self.client.search(
+            search_results = self.client.query_points(
                 collection_name=self.COLLECTION_NAME,
-                query_vector=query_vector,
-                query_filter=search_filter,
+                query=query_vector,
+                query_filter=self._build_filter(user_id, session_id, tags),
                 limit=limit,
-                score_threshold=score_threshold
+                score_threshold=score_threshold,
+                with_payload=True
             )
             
-            # Форматируем результаты
-            results = []
-            for result in search_results:
-                results.append({
-                    "vector_id": result.id,
-                    "score": result.score,
-                    "payload": result.payload
-                })
-            
+            results = self._format_results(search_results.points)
             logger.info(f"✅ Найдено {len(results)} похожих записей")
             return results
         except Exception as e:
             logger.error(f"❌ Ошибка поиска: {str(e)}")
             return []
     
+    @staticmethod
+    def _build_filter(
+        user_id: Optional[int] = None,
+        session_id: Optional[int] = None,
+        tags: Optional[List[str]] = None
+    ) -> Optional[Filter]:
+        """Фильтр Qdrant по пользователю, сессии и тегам"""
+        filters = []
+        if user_id:
+            filters.append(
+                FieldCondition(key="user_id", match=MatchValue(value=user_id))
+            )
+        if session_id:
+            filters.append(
+                FieldCondition(key="session_id", match=MatchValue(value=session_id))
+            )
+        if tags:
+            # Для тегов используем OR условие (любой из тегов)
+            tag_filters = [
+                FieldCondition(key="tags", match=MatchValue(value=tag))
+                for tag in tags
+            ]
+            # TODO: Реализовать OR логику для тегов (пока используем первый тег)
+            if tag_filters:
+                filters.append(tag_filters[0])
+        
+        return Filter(must=filters) if filters else None
+    
+    @staticmethod
+    def _format_results(search_results) -> List[Dict[str, Any]]:
+        """Результаты поиска Qdrant в виде словарей"""
+        return [
+            {
+                "vector_id": result.id,
+                "score": result.score,
+                "payload": result.payload
+            }
+            for result in search_results
+        ]
+    
+    def search_similar_batched(
+        self,
+        query_text: str,
+        user_id: Optional[int] = None,
+        limit: int = 10,
+        score_threshold: float = 0.5,
+        session_id: Optional[int] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Семантический поиск с объединением параллельных запросов
+        
+        Вызывается из sync-обработчиков FastAPI (пул потоков anyio): запросы,
+        пришедшие почти одновременно, собираются на event loop, их эмбеддинги
+        считаются одним вызовом модели, а поиск уходит в Qdrant одним query_batch_points.
+        Вне пула потоков anyio (воркер, код внутри event loop) и с фильтрами session_id/tags,
+        которые пакет не поддерживает, выполняется search_similar.
+        
+        Args:
+            query_text: Текст запроса
+            user_id: Фильтр по ID пользователя
+            limit: Максимальное количество результатов
+            score_threshold: Минимальный порог релевантности (0-1)
+            session_id: Фильтр по ID сессии (пакетный поиск его не поддерживает)
+            tags: Фильтр по тегам (пакетный поиск его не поддерживает)
+            
+        Returns:
+            Список найденных записей с метаданными
+        """
+        if not self.client:
+            logger.warning("Qdrant клиент не инициализирован")
+            return []
+        
+        if session_id is not None or tags:
+            # Пакет фильтрует только по user_id: запрос с другими фильтрами выполняется отдельно
+            logger.warning(
+                "Пакетный поиск фильтрует только по user_id, фильтры session_id/tags "
+                "переданы - выполняется одиночный поиск"
+            )
+            return self.search_similar(
+                query_text=query_text,
+                user_id=user_id,
+                session_id=session_id,
+                tags=tags,
+                limit=limit,
+                score_threshold=score_threshold
+            )
+        
+        try:
+            return anyio.from_thread.run(
+                self._submit_search, query_text, user_id, limit, score_threshold
+            )
+        except RuntimeError:
+            # Не поток anyio: объединять запросы не с чем
+            return self.search_similar(
+                query_text=query_text,
+                user_id=user_id,
+                limit=limit,
+                score_threshold=score_threshold
+            )
+    
+    async def _submit_search(
+        self,
+        query_text: str,
+        user_id: Optional[int],
+        limit: int,
+        score_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Добавление запроса в буфер пакетного поиска и ожидание его результата"""
+        if self._search_flusher is None or self._search_flusher.done():
+            self._search_batch = asyncio.Queue()
+            self._search_flusher = asyncio.create_task(self._flush_searches())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._search_batch.put_nowait((future, query_text, user_id, limit, score_threshold))
+        return await future
+    
+    async def _flush_searches(self) -> None:
+        """Фоновая отправка накопленных поисковых запросов; None в буфере - сигнал остановки"""
+        stopping = False
+        while not stopping:
+            items = [await self._search_batch.get()]
+            # Даем параллельным запросам дописать свои запросы в тот же пакет
+            await asyncio.sleep(SEARCH_BATCH_WAIT)
+            while len(items) < SEARCH_BATCH_MAX_SIZE and not self._search_batch.empty():
+                items.append(self._search_batch.get_nowait())
+            
+            stopping = None in items
+            batch = [item for item in items if item is not None]
+            if batch:
+                # Модель эмбеддингов и синхронный клиент Qdrant работают в пуле потоков
+                results = await asyncio.to_thread(
+                    self._search_batch_sync, [item[1:] for item in batch]
+                )
+                for (future, *_), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+    
+    async def flush_searches(self) -> None:
+        """Выполнение всех накопленных поисковых запросов и остановка фоновой задачи"""
+        if self._search_flusher is None or self._search_flusher.done():
+            return
+        self._search_batch.put_nowait(None)
+        await self._search_flusher
+        self._search_flusher = None
+    
+    def _search_batch_sync(self, queries: List[tuple]) -> List[List[Dict[str, Any]]]:
+        """Эмбеддинги пакета запросов одним вызовом модели и поиск одним query_batch_points"""
+        if not self.embedding_model:
+            logger.error("Не удалось создать эмбеддинги для запросов")
+            return [[] for _ in queries]
+        
+        try:
+            embeddings = self.embedding_model.encode(
+                [query_text for query_text, _, _, _ in queries],
+                convert_to_numpy=True
+            )
+            batch_results = self.client.query_batch_points(
+                collection_name=self.COLLECTION_NAME,
+                requests=[
+                    QueryRequest(
+                        query=embedding.tolist(),
+                        filter=self._build_filter(user_id),
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        with_payload=True
+                    )
+                    for embedding, (_, user_id, limit, score_threshold) in zip(embeddings, queries)
+                ]
+            )
+            results = [self._format_results(response.points) for response in batch_results]
+            logger.info(f"✅ Выполнено поисковых запросов одним пакетом: {len(queries)}")
+            return results
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного поиска: {str(e)}")
+            return [[] for _ in queries]
+    
     def delete_vector(self, vector_id: str) -> bool:
         """
         Удаление вектора из Qdrant
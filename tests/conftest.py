@@ -58,3 +58,70 @@ def all_test_charts():
     """Возвращает все тестовые карты"""
     return TEST_CHARTS
 
+
+@pytest.fixture
+def db_session():
+    """Сессия SQLAlchemy к пустой SQLite базе в памяти со схемой всех моделей"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.core.database import Base
+    import app.models.database.models  # noqa: F401 - регистрация моделей в Base.metadata
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+class MemoryCache:
+    """Кеш-методы redis_service (cache_get/cache_get_raw/cache_set/cache_delete) в памяти процесса"""
+
+    def __init__(self):
+        self.values = {}
+
+    def cache_get(self, key):
+        return self.values.get(key)
+
+    def cache_get_raw(self, key):
+        return self.values.get(key)
+
+    def cache_set(self, key, value, ttl=3600):
+        self.values[key] = value
+        return True
+
+    def cache_delete(self, key):
+        self.values.pop(key, None)
+        return True
+
+
+@pytest.fixture
+def memory_cache():
+    """Пустой кеш в памяти для подмены redis_service"""
+    return MemoryCache()
+
+
+@pytest.fixture
+def count_queries(db_session):
+    """Список SELECT-запросов, выполненных через db_session"""
+    from sqlalchemy import event
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,57 @@
+"""
+Тесты кеша незарегистрированных телефонов в authenticate_user (Redis подменяется кешем в памяти).
+"""
+import pytest
+
+from app.models.database.models import User
+from app.services import auth_service as auth_module
+from app.services.auth_service import AuthService
+
+PHONE = "+79000000001"
+
+
+@pytest.fixture
+def unknown_phone_cache(memory_cache, monkeypatch):
+    monkeypatch.setattr(auth_module, "redis_service", memory_cache)
+    return memory_cache
+
+
+class TestUnknownPhoneCache:
+    """Тесты отметки «телефон не зарегистрирован»"""
+
+    def test_unknown_phone_is_remembered(self, unknown_phone_cache, db_session, count_queries):
+        """Повторный вход по неизвестному номеру не обращается к БД"""
+        assert AuthService.authenticate_user(db_session, PHONE, "secret") is None
+        queries_after_first = len(count_queries)
+        assert queries_after_first == 1
+
+        assert AuthService.authenticate_user(db_session, PHONE, "secret") is None
+
+        assert len(count_queries) == queries_after_first
+        assert AuthService.is_phone_unknown(PHONE)
+
+    def test_registration_clears_mark(self, unknown_phone_cache, db_session):
+        """Регистрация телефона сбрасывает отметку после коммита"""
+        AuthService.authenticate_user(db_session, PHONE, "secret")
+
+        db_session.add(User(
+            phone=PHONE,
+            password_hash=AuthService.get_password_hash("secret"),
+            phone_verified=1
+        ))
+        db_session.commit()
+
+        assert not AuthService.is_phone_unknown(PHONE)
+        assert AuthService.authenticate_user(db_session, PHONE, "secret").phone == PHONE
+
+    def test_phone_change_clears_mark(self, unknown_phone_cache, db_session):
+        """Смена телефона пользователя на отмеченный номер сбрасывает отметку"""
+        user = User(phone="+79000000002", password_hash="hash")
+        db_session.add(user)
+        db_session.commit()
+        AuthService.remember_unknown_phone(PHONE)
+
+        user.phone = PHONE
+        db_session.commit()
+
+        assert not AuthService.is_phone_unknown(PHONE)
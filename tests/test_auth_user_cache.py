@@ -0,0 +1,85 @@
+"""
+Тесты кеша пользователя в Redis для get_current_user (Redis подменяется кешем в памяти).
+"""
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+
+from app.models.database.models import User
+from app.services import auth_service as auth_module
+from app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def cached_auth(db_session, memory_cache, monkeypatch):
+    """Пользователь с заполненным профилем и его access токен"""
+    monkeypatch.setattr(auth_module, "redis_service", memory_cache)
+    user = User(
+        phone="+79000000001",
+        password_hash="hash",
+        phone_verified=1,
+        name="Анна",
+        birth_date_detailed=date(1990, 7, 15),
+        birth_time_detailed=time(14, 30),
+        birth_latitude=Decimal("56.500000"),
+    )
+    db_session.add(user)
+    db_session.commit()
+    token = AuthService.create_access_token({"sub": str(user.id)})
+    return user.id, token
+
+
+class TestUserCache:
+    """Тесты кеширования пользователя"""
+
+    def test_cached_user_skips_database(self, cached_auth, db_session, memory_cache, count_queries):
+        """Повторный запрос с тем же токеном не обращается к БД"""
+        user_id, token = cached_auth
+        db_session.expunge_all()
+
+        first = AuthService.get_current_user(db_session, token)
+        assert first.id == user_id
+        assert memory_cache.cache_get(f"auth:user:{user_id}")["phone"] == "+79000000001"
+        queries_after_first = len(count_queries)
+        assert queries_after_first > 0
+        db_session.expunge_all()
+
+        second = AuthService.get_current_user(db_session, token)
+
+        assert len(count_queries) == queries_after_first
+        assert second.id == user_id
+        assert second.name == "Анна"
+        assert second.birth_date_detailed == date(1990, 7, 15)
+        assert second.birth_time_detailed == time(14, 30)
+        assert second.birth_latitude == Decimal("56.500000")
+
+    def test_cache_has_no_password_hash(self, cached_auth, db_session, memory_cache):
+        """Хеш пароля не попадает в кеш"""
+        user_id, token = cached_auth
+
+        AuthService.get_current_user(db_session, token)
+
+        assert "password_hash" not in memory_cache.cache_get(f"auth:user:{user_id}")
+
+    def test_update_invalidates_cache(self, cached_auth, db_session, memory_cache):
+        """Изменение пользователя сбрасывает кеш после коммита"""
+        user_id, token = cached_auth
+        user = AuthService.get_current_user(db_session, token)
+
+        user.name = "Мария"
+        db_session.commit()
+
+        assert memory_cache.cache_get(f"auth:user:{user_id}") is None
+        db_session.expunge_all()
+        assert AuthService.get_current_user(db_session, token).name == "Мария"
+
+    def test_refresh_token_is_rejected(self, cached_auth, db_session):
+        """Refresh токен не подходит для get_current_user, payload возвращается для диагностики"""
+        user_id, _ = cached_auth
+        refresh_token = AuthService.create_refresh_token({"sub": str(user_id)})
+
+        user, payload = AuthService.get_current_user_with_payload(db_session, refresh_token)
+
+        assert user is None
+        assert payload["type"] == "refresh"
@@ -0,0 +1,152 @@
+"""
+Тесты счетчика сообщений сессии chat_sessions.message_count в chat_with_ai
+и выполнения его синхронной части вне event loop
+(ИИ, контекст и Redis подменяются, база - SQLite в памяти).
+"""
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from app.api.v1.endpoints import ai as ai_module
+from app.models.database.models import ChatMessage, ChatSession, User
+from app.models.schemas.schemas import ChatRequest
+
+
+class FakeAIService:
+    """ИИ с фиксированным ответом; запоминает число SELECT-запросов к моменту ответа"""
+
+    def __init__(self):
+        self.queries = []
+        self.selects_at_response = None
+
+    async def generate_response(self, **kwargs):
+        self.selects_at_response = len(self.queries)
+        return "ответ"
+
+
+class FakeContextService:
+    """Сервис контекста: новая сессия создается один раз, счетчики записываются"""
+
+    def __init__(self):
+        self.message_counts = []
+        self.context_threads = []
+        # SELECT-запросы (count_queries) и их число к проверке триггеров сохранения
+        self.queries = []
+        self.selects_before_save_check = None
+
+    def check_topic_change(self, message):
+        return False
+
+    def check_session_timeout(self, db, session_id):
+        return False
+
+    def get_or_create_active_session(self, db, user_id, template_type=None, force_new=False):
+        session = ChatSession(user_id=user_id, title="Новая сессия")
+        db.add(session)
+        db.commit()
+        return session
+
+    def get_relevant_context(self, **kwargs):
+        self.context_threads.append(threading.current_thread())
+        return []
+
+    def should_save_context(self, db, session_id, user_message, message_count):
+        self.message_counts.append(message_count)
+        self.selects_before_save_check = len(self.queries)
+        return False, None
+
+
+class FakeRedisService:
+    redis_client = None
+
+    def invalidate_active_session(self, user_id):
+        return True
+
+
+@pytest.fixture
+def chat(db_session, monkeypatch):
+    """Пользователь и функция отправки сообщения в chat_with_ai"""
+    context = FakeContextService()
+    monkeypatch.setattr(ai_module, "ai_service", FakeAIService())
+    monkeypatch.setattr(ai_module, "context_service", context)
+    monkeypatch.setattr(ai_module, "redis_service", FakeRedisService())
+
+    user = User(phone="+79000000001", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+
+    def send(message, session_id=None):
+        request = ChatRequest(message=message, session_id=session_id)
+        return asyncio.run(ai_module.chat_with_ai(request, user.id, db_session))
+
+    return user, send, context
+
+
+class TestMessageCount:
+    """Тесты счетчика сообщений"""
+
+    def test_counter_grows_by_two_per_turn(self, chat, db_session):
+        """Каждый ход чата добавляет два сообщения, счетчик равен их числу"""
+        user, send, context = chat
+
+        first = send("привет")
+        second = send("как дела", session_id=first.session_id)
+
+        assert second.session_id == first.session_id
+        session = db_session.get(ChatSession, first.session_id)
+        db_session.refresh(session)
+        stored = db_session.scalar(
+            select(func.count(ChatMessage.id)).where(ChatMessage.session_id == session.id)
+        )
+        assert session.message_count == stored == 4
+        # should_save_context получает число сообщений уже с учетом нового хода
+        assert context.message_counts == [2, 4]
+
+    def test_turn_is_saved_without_select(self, chat, count_queries):
+        """Сообщения и счетчик сохраняются без SELECT: значение счетчика приходит из RETURNING"""
+        _, send, context = chat
+        ai = ai_module.ai_service
+        ai.queries = context.queries = count_queries
+
+        send("привет")
+
+        assert context.message_counts == [2]
+        assert context.selects_before_save_check == ai.selects_at_response
+
+    def test_response_points_to_assistant_message(self, chat, db_session):
+        """message_id ответа - id сообщения ассистента"""
+        _, send, _ = chat
+
+        response = send("привет")
+
+        message = db_session.get(ChatMessage, response.message_id)
+        assert message.role == "assistant"
+        assert message.content == "ответ"
+
+    def test_sessions_list_counts_messages(self, chat, db_session):
+        """Список сессий считает сообщения одним GROUP BY, включая пустые сессии"""
+        user, send, _ = chat
+        response = send("привет")
+        db_session.add(ChatSession(user_id=user.id, title="Пустая"))
+        db_session.commit()
+
+        sessions = ai_module.get_chat_sessions(user.id, db_session)
+
+        counts = {session.id: session.message_count for session in sessions}
+        assert counts[response.session_id] == 2
+        assert sorted(counts.values()) == [0, 2]
+
+
+class TestOffEventLoop:
+    """Тесты выполнения синхронной части хода чата в пуле потоков"""
+
+    def test_context_lookup_runs_in_worker_thread(self, chat):
+        """Поиск контекста (БД, эмбеддинги, Qdrant) выполняется не в потоке event loop"""
+        _, send, context = chat
+
+        send("привет")
+
+        assert len(context.context_threads) == 1
+        assert context.context_threads[0] is not threading.main_thread()
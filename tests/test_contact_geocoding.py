@@ -0,0 +1,69 @@
+"""
+Тесты кеширования координат места рождения контакта (Redis и геокодер подменяются).
+"""
+import pytest
+
+from app.api.v1.endpoints import ai as ai_module
+
+
+class FakeCache:
+    """Кеш redis_service в памяти"""
+
+    def __init__(self):
+        self.values = {}
+
+    def cache_get(self, key):
+        return self.values.get(key)
+
+    def cache_set(self, key, value, ttl=3600):
+        self.values[key] = value
+        return True
+
+
+class FakeGeocoder:
+    def __init__(self, success=True):
+        self.success = success
+        self.calls = []
+
+    def geocode_location(self, location_name, country=None):
+        self.calls.append((location_name, country))
+        if not self.success:
+            return {'success': False, 'error': 'Город не найден'}
+        return {
+            'success': True,
+            'data': {'lat': 56.5, 'lon': 84.97, 'timezone': 'Asia/Tomsk', 'location_name': location_name},
+        }
+
+
+@pytest.fixture
+def fake_geo(monkeypatch):
+    cache = FakeCache()
+    geocoder = FakeGeocoder()
+    monkeypatch.setattr(ai_module, "redis_service", cache)
+    monkeypatch.setattr(ai_module, "geocoding_service", geocoder)
+    return cache, geocoder
+
+
+class TestGeocodeBirthPlace:
+    """Тесты _geocode_birth_place"""
+
+    def test_coordinates_are_geocoded_once(self, fake_geo):
+        """Повторное упоминание контакта берет координаты из кеша"""
+        cache, geocoder = fake_geo
+
+        first = ai_module._geocode_birth_place("Томск, Россия")
+        second = ai_module._geocode_birth_place("томск, россия ")
+
+        assert geocoder.calls == [("Томск", "Россия")]
+        assert second == {'success': True, 'data': {'lat': 56.5, 'lon': 84.97, 'timezone': 'Asia/Tomsk'}}
+        assert first['data']['lat'] == second['data']['lat']
+
+    def test_failed_lookup_is_not_cached(self, fake_geo):
+        """Ненайденное место не кешируется и ищется снова"""
+        cache, geocoder = fake_geo
+        geocoder.success = False
+
+        assert ai_module._geocode_birth_place("Нигде")['success'] is False
+        assert ai_module._geocode_birth_place("Нигде")['success'] is False
+        assert len(geocoder.calls) == 2
+        assert cache.values == {}
@@ -0,0 +1,77 @@
+"""
+Тесты кеша списка контактов в Redis (Redis подменяется кешем в памяти, база - SQLite).
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import contacts as contacts_module
+from app.core.database import get_db
+from app.models.database.models import User
+
+CONTACT = {
+    "name": "Мария",
+    "relationship_type": "Друг",
+    "custom_title": "Подруга",
+    "birth_date": "1992-08-20",
+    "birth_time": "09:15",
+    "birth_place": "Санкт-Петербург, Россия",
+}
+
+
+@pytest.fixture
+def contacts_client(db_session, memory_cache, monkeypatch):
+    """Клиент роутера контактов, пользователь и подмененный кеш"""
+    monkeypatch.setattr(contacts_module, "redis_service", memory_cache)
+    app = FastAPI()
+    app.include_router(contacts_module.router)
+    app.dependency_overrides[get_db] = lambda: db_session
+
+    user = User(phone="+79000000001", password_hash="hash")
+    db_session.add(user)
+    db_session.commit()
+    return TestClient(app), user.id
+
+
+class TestContactsCache:
+    """Тесты кеширования и инвалидации списка контактов"""
+
+    def test_list_is_served_from_cache(self, contacts_client, memory_cache, count_queries):
+        """Повторный запрос списка не обращается к БД и отдает тот же JSON"""
+        client, user_id = contacts_client
+        client.post("/contacts", params={"user_id": user_id}, json=CONTACT)
+
+        first = client.get(f"/users/{user_id}/contacts")
+        queries_after_first = len(count_queries)
+        second = client.get(f"/users/{user_id}/contacts")
+
+        assert len(count_queries) == queries_after_first
+        assert second.content == first.content
+        assert memory_cache.values[f"contacts:{user_id}"] == first.text
+        assert [contact["name"] for contact in second.json()] == ["Мария"]
+
+    def test_create_invalidates_cache(self, contacts_client, memory_cache):
+        """Создание контакта сбрасывает закешированный список"""
+        client, user_id = contacts_client
+        assert client.get(f"/users/{user_id}/contacts").json() == []
+
+        created = client.post("/contacts", params={"user_id": user_id}, json=CONTACT)
+
+        assert created.status_code == 200
+        assert f"contacts:{user_id}" not in memory_cache.values
+        contacts = client.get(f"/users/{user_id}/contacts").json()
+        assert [contact["id"] for contact in contacts] == [created.json()["id"]]
+        assert contacts[0]["aliases"] == ["подруга", "мария", "друг"]
+        assert contacts[0]["created_at"] == created.json()["created_at"]
+
+    def test_cache_is_per_user(self, contacts_client, db_session, memory_cache):
+        """Создание контакта одним пользователем не сбрасывает кеш другого"""
+        client, user_id = contacts_client
+        other = User(phone="+79000000002", password_hash="hash")
+        db_session.add(other)
+        db_session.commit()
+        client.get(f"/users/{other.id}/contacts")
+
+        client.post("/contacts", params={"user_id": user_id}, json=CONTACT)
+
+        assert f"contacts:{other.id}" in memory_cache.values
@@ -0,0 +1,126 @@
+"""
+Тесты эндпоинта GET /api/v1/context/entries на SQLite (фильтры собираются через lambda_stmt).
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints.context import router
+from app.core.database import get_db
+from app.models.database.models import ChatSession, ContextEntry, User
+
+
+@pytest.fixture
+def client(db_session):
+    """Клиент приложения с роутером контекста и тестовой базой"""
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+@pytest.fixture
+def entries(db_session):
+    """Два пользователя, три сессии и записи с разными тегами и датами"""
+    users = [User(phone=f"+7900000000{i}", password_hash="x") for i in (1, 2)]
+    db_session.add_all(users)
+    db_session.flush()
+    sessions = [
+        ChatSession(user_id=users[0].id, title="s1"),
+        ChatSession(user_id=users[0].id, title="s2"),
+        ChatSession(user_id=users[1].id, title="s3"),
+    ]
+    db_session.add_all(sessions)
+    db_session.flush()
+
+    def entry(user, session, text, tags, day, is_important=0):
+        return ContextEntry(
+            user_id=user.id, session_id=session.id, user_message=text, tags=tags,
+            created_at=datetime(2024, 1, day), is_important=is_important
+        )
+
+    db_session.add_all([
+        entry(users[0], sessions[0], "a", ["работа", "стресс"], 1, is_important=1),
+        entry(users[0], sessions[0], "b", ["работа"], 2),
+        entry(users[0], sessions[1], "c", ["семья", "стресс"], 3),
+        entry(users[0], sessions[1], "d", [], 4),
+        entry(users[1], sessions[2], "e", ["работа", "стресс"], 5),
+    ])
+    db_session.commit()
+    return users, sessions
+
+
+def messages(response):
+    assert response.status_code == 200
+    return [entry["user_message"] for entry in response.json()]
+
+
+class TestGetContextEntries:
+    """Тесты фильтров списка контекстных записей"""
+
+    def test_user_entries_newest_first(self, client, entries):
+        """Без фильтров возвращаются только записи пользователя, новые первыми"""
+        users, _ = entries
+
+        assert messages(client.get("/api/v1/context/entries", params={"user_id": users[0].id})) == [
+            "d", "c", "b", "a"
+        ]
+
+    def test_session_filter(self, client, entries):
+        """Фильтр по сессии"""
+        users, sessions = entries
+
+        response = client.get(
+            "/api/v1/context/entries", params={"user_id": users[0].id, "session_id": sessions[0].id}
+        )
+        assert messages(response) == ["b", "a"]
+
+    def test_tags_filter_requires_all_tags(self, client, entries):
+        """Запись подходит, если в ней есть все переданные теги (json_each на SQLite)"""
+        users, _ = entries
+
+        response = client.get(
+            "/api/v1/context/entries", params={"user_id": users[0].id, "tags": ["стресс", "работа"]}
+        )
+        assert messages(response) == ["a"]
+
+        response = client.get(
+            "/api/v1/context/entries", params={"user_id": users[0].id, "tags": ["стресс", "стресс"]}
+        )
+        assert messages(response) == ["c", "a"]
+
+    def test_date_filters(self, client, entries):
+        """Фильтры date_from / date_to включают границы"""
+        users, _ = entries
+
+        response = client.get("/api/v1/context/entries", params={
+            "user_id": users[0].id, "date_from": "2024-01-02T00:00:00", "date_to": "2024-01-03T00:00:00"
+        })
+        assert messages(response) == ["c", "b"]
+
+    def test_lambda_closures_use_current_values(self, client, entries):
+        """Повторный вызов с тем же набором фильтров подставляет новые значения, а не кешированные"""
+        users, sessions = entries
+
+        first = client.get("/api/v1/context/entries", params={
+            "user_id": users[0].id, "session_id": sessions[0].id, "tags": ["работа"]
+        })
+        second = client.get("/api/v1/context/entries", params={
+            "user_id": users[1].id, "session_id": sessions[2].id, "tags": ["стресс"]
+        })
+
+        assert messages(first) == ["b", "a"]
+        assert messages(second) == ["e"]
+
+    def test_limit_offset_and_is_important_bool(self, client, entries):
+        """Пагинация и is_important в ответе как bool"""
+        users, _ = entries
+
+        response = client.get(
+            "/api/v1/context/entries", params={"user_id": users[0].id, "limit": 2, "offset": 2}
+        )
+        assert messages(response) == ["b", "a"]
+        assert [entry["is_important"] for entry in response.json()] == [False, True]
+        assert [entry["tags"] for entry in response.json()] == [["работа"], ["работа", "стресс"]]
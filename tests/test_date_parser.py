@@ -0,0 +1,57 @@
+"""
+Тесты разбора дат и времени рождения (app.services.date_parser).
+"""
+from datetime import date, time
+
+import pytest
+
+from app.services import date_parser
+from app.services.date_parser import parse_date, parse_time
+
+
+class NoStrptime:
+    """Подмена datetime: вызов strptime означает, что быстрый путь не сработал"""
+
+    @staticmethod
+    def strptime(value, fmt):
+        raise AssertionError(f"strptime вызван для {value!r}")
+
+
+class TestParseDate:
+    """Тесты parse_date"""
+
+    def test_canonical_date_skips_strptime(self, monkeypatch):
+        """ГГГГ-ММ-ДД разбирается срезами без strptime"""
+        monkeypatch.setattr(date_parser, "datetime", NoStrptime)
+
+        assert parse_date("1990-07-15") == date(1990, 7, 15)
+
+    def test_non_padded_date_falls_back_to_strptime(self):
+        """Дата без ведущих нулей разбирается через strptime"""
+        assert parse_date("1990-7-5") == date(1990, 7, 5)
+
+    @pytest.mark.parametrize("value", ["2023-02-30", "2023-13-01", "15.07.1990", "1990-07-1x", ""])
+    def test_invalid_date_raises_value_error(self, value):
+        """Несуществующая дата и неверный формат вызывают ValueError"""
+        with pytest.raises(ValueError):
+            parse_date(value)
+
+
+class TestParseTime:
+    """Тесты parse_time"""
+
+    def test_canonical_time_skips_strptime(self, monkeypatch):
+        """ЧЧ:ММ разбирается срезами без strptime"""
+        monkeypatch.setattr(date_parser, "datetime", NoStrptime)
+
+        assert parse_time("07:05") == time(7, 5)
+
+    def test_non_padded_time_falls_back_to_strptime(self):
+        """Время без ведущего нуля разбирается через strptime"""
+        assert parse_time("7:05") == time(7, 5)
+
+    @pytest.mark.parametrize("value", ["24:00", "12:60", "12-30", "ab:cd", ""])
+    def test_invalid_time_raises_value_error(self, value):
+        """Время вне диапазона и неверный формат вызывают ValueError"""
+        with pytest.raises(ValueError):
+            parse_time(value)
@@ -0,0 +1,136 @@
+"""
+Тесты RateLimiter: скользящее окно в Redis и in-memory окно без Redis.
+Redis подменяется клиентом, выполняющим _SLIDING_WINDOW_SCRIPT на Python.
+"""
+import pytest
+
+from app.services import rate_limiter as rate_limiter_module
+from app.services.rate_limiter import RateLimiter
+
+
+class FakeRedis:
+    """Клиент Redis с Sorted Set в памяти; скрипт окна повторяет шаги Lua-скрипта"""
+
+    def __init__(self):
+        self.zsets = {}
+        self.ttls = {}
+        self.registered = []
+        self.fail = False
+
+    def register_script(self, script):
+        self.registered.append(script)
+        return self._sliding_window
+
+    def _sliding_window(self, keys, args):
+        if self.fail:
+            raise ConnectionError("redis down")
+        key = keys[0]
+        now, window, limit, member = int(args[0]), int(args[1]), int(args[2]), args[3]
+        zset = self.zsets.setdefault(key, {})
+        for old_member, score in list(zset.items()):
+            if score <= now - window:
+                del zset[old_member]
+        if len(zset) >= limit:
+            return 0
+        zset[member] = now
+        self.ttls[key] = window
+        return 1
+
+    def delete(self, *keys):
+        for key in keys:
+            self.zsets.pop(key, None)
+
+
+class FakeRedisService:
+    def __init__(self, client):
+        self.redis_client = client
+
+
+@pytest.fixture
+def redis_limiter(monkeypatch):
+    """RateLimiter с подмененным Redis и чистым состоянием"""
+    client = FakeRedis()
+    monkeypatch.setattr(rate_limiter_module, "redis_service", FakeRedisService(client))
+    monkeypatch.setattr(RateLimiter, "_window_script", None)
+    monkeypatch.setattr(RateLimiter, "_requests", rate_limiter_module.defaultdict(list))
+    return client
+
+
+@pytest.fixture
+def memory_limiter(monkeypatch):
+    """RateLimiter без Redis"""
+    monkeypatch.setattr(rate_limiter_module, "redis_service", FakeRedisService(None))
+    monkeypatch.setattr(RateLimiter, "_requests", rate_limiter_module.defaultdict(list))
+
+
+class TestRedisRateLimit:
+    """Тесты окна в Redis"""
+
+    def test_limit_is_enforced_per_kind(self, redis_limiter):
+        """После SMS_REQUESTS_PER_HOUR запросов следующий отклоняется, другие лимиты не затронуты"""
+        phone = "+79000000001"
+
+        results = [RateLimiter.check_sms_rate_limit(phone)[0] for _ in range(RateLimiter.SMS_REQUESTS_PER_HOUR + 1)]
+
+        assert results == [True] * RateLimiter.SMS_REQUESTS_PER_HOUR + [False]
+        assert RateLimiter.check_login_rate_limit(phone) == (True, None)
+        # Отклоненный запрос в окно не записывается
+        assert len(redis_limiter.zsets[f"rl:sms:{phone}"]) == RateLimiter.SMS_REQUESTS_PER_HOUR
+        assert redis_limiter.ttls[f"rl:sms:{phone}"] == 60 * 60 * 1000
+
+    def test_window_slides(self, redis_limiter, monkeypatch):
+        """Запросы старше окна удаляются скриптом, и лимит снова доступен"""
+        now = [1_700_000_000.0]
+        monkeypatch.setattr(rate_limiter_module.time, "time", lambda: now[0])
+        phone = "+79000000001"
+        for _ in range(RateLimiter.SMS_REQUESTS_PER_HOUR):
+            RateLimiter.check_sms_rate_limit(phone)
+        assert RateLimiter.check_sms_rate_limit(phone)[0] is False
+
+        now[0] += 60 * 60 + 1
+
+        assert RateLimiter.check_sms_rate_limit(phone) == (True, None)
+        assert len(redis_limiter.zsets[f"rl:sms:{phone}"]) == 1
+
+    def test_script_is_registered_once(self, redis_limiter):
+        """Скрипт регистрируется при первом обращении и дальше вызывается по EVALSHA"""
+        for _ in range(3):
+            RateLimiter.check_code_verify_rate_limit("+79000000001")
+
+        assert redis_limiter.registered == [rate_limiter_module._SLIDING_WINDOW_SCRIPT]
+
+    def test_reset_clears_all_windows(self, redis_limiter):
+        """reset_limits удаляет окна всех типов лимитов"""
+        phone = "+79000000001"
+        for _ in range(RateLimiter.LOGIN_ATTEMPTS_PER_HOUR):
+            RateLimiter.check_login_rate_limit(phone)
+        RateLimiter.check_sms_rate_limit(phone)
+
+        RateLimiter.reset_limits(phone)
+
+        assert redis_limiter.zsets == {}
+        assert RateLimiter.check_login_rate_limit(phone) == (True, None)
+
+    def test_redis_error_falls_back_to_memory(self, redis_limiter):
+        """Ошибка Redis не пропускает лимит: используется in-memory окно"""
+        redis_limiter.fail = True
+        phone = "+79000000001"
+
+        results = [RateLimiter.check_login_rate_limit(phone)[0] for _ in range(RateLimiter.LOGIN_ATTEMPTS_PER_HOUR + 1)]
+
+        assert results[-1] is False
+        assert len(RateLimiter._requests[f"login:{phone}"]) == RateLimiter.LOGIN_ATTEMPTS_PER_HOUR
+
+
+class TestMemoryRateLimit:
+    """Тесты in-memory окна"""
+
+    def test_limit_without_redis(self, memory_limiter):
+        phone = "+79000000002"
+
+        results = [RateLimiter.check_code_verify_rate_limit(phone)[0]
+                   for _ in range(RateLimiter.CODE_VERIFY_ATTEMPTS_PER_HOUR + 1)]
+
+        assert results == [True] * RateLimiter.CODE_VERIFY_ATTEMPTS_PER_HOUR + [False]
+        RateLimiter.reset_limits(phone)
+        assert RateLimiter.check_code_verify_rate_limit(phone) == (True, None)
@@ -0,0 +1,149 @@
+"""
+Тесты пакетной постановки задач контекста redis_service (Redis и SQLite очередь подменяются).
+"""
+import asyncio
+
+import pytest
+
+from app.services import redis_service as redis_module
+from app.services.redis_service import redis_service
+
+
+def dummy_task(**kwargs):
+    """Задача-заглушка для постановки в очередь"""
+    return kwargs
+
+
+class FakePipeline:
+    """Pipeline Redis, записывающий удаленные ключи"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def delete(self, *keys):
+        self.client.deleted.extend(keys)
+
+    def execute(self):
+        if self.client.fail:
+            raise ConnectionError("redis down")
+
+
+class FakeRedis:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.deleted = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        self.deleted.extend(keys)
+
+
+class FakeQueue:
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue_many(self, job_datas, pipeline=None):
+        self.enqueued.extend(job_datas)
+
+
+class FakeSqliteQueue:
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue(self, func, queue_name='default', *args, timeout=300, job_id=None, **kwargs):
+        self.enqueued.append((job_id, kwargs))
+        return job_id
+
+
+@pytest.fixture
+def fake_redis_service(monkeypatch):
+    """Глобальный redis_service с подмененными клиентом, очередью и SQLite очередью"""
+    client = FakeRedis()
+    queue = FakeQueue()
+    sqlite_queue = FakeSqliteQueue()
+    monkeypatch.setattr(redis_service, "redis_client", client)
+    monkeypatch.setattr(redis_service, "context_queue", queue)
+    monkeypatch.setattr(redis_service, "use_sqlite_queue", True)
+    monkeypatch.setattr(redis_service, "_context_batch", None)
+    monkeypatch.setattr(redis_service, "_context_flusher", None)
+    monkeypatch.setattr(redis_module, "sqlite_queue_service", sqlite_queue)
+    return redis_service, client, queue, sqlite_queue
+
+
+def submit_many(service, session_ids):
+    """Параллельная постановка задач для сессий session_ids"""
+    async def run():
+        job_ids = await asyncio.gather(*[
+            service.submit_context_task(session_id, dummy_task, session_id=session_id)
+            for session_id in session_ids
+        ])
+        await service.flush_context_tasks()
+        return job_ids
+
+    return asyncio.run(run())
+
+
+class TestSubmitContextTask:
+    """Тесты пакетной постановки задач контекста"""
+
+    def test_batch_is_enqueued_in_redis(self, fake_redis_service):
+        """Задачи уходят в Redis одним пакетом, кеш их сессий сбрасывается"""
+        service, client, queue, sqlite_queue = fake_redis_service
+
+        job_ids = submit_many(service, [1, 2, 2])
+
+        assert all(job_ids)
+        assert [job_data.job_id for job_data in queue.enqueued] == job_ids
+        assert sorted(client.deleted) == ["session:context:1", "session:context:2"]
+        assert sqlite_queue.enqueued == []
+
+    def test_redis_failure_falls_back_to_sqlite_with_same_ids(self, fake_redis_service):
+        """При ошибке Redis задачи ставятся в SQLite очередь под выданными ID"""
+        service, client, _, sqlite_queue = fake_redis_service
+        client.fail = True
+
+        job_ids = submit_many(service, [1, 2])
+
+        assert all(job_ids)
+        assert [job_id for job_id, _ in sqlite_queue.enqueued] == job_ids
+        assert [kwargs for _, kwargs in sqlite_queue.enqueued] == [{"session_id": 1}, {"session_id": 2}]
+
+    def test_lost_task_returns_none(self, fake_redis_service, monkeypatch):
+        """Без Redis и SQLite очереди вызывающий код получает None"""
+        service, client, _, _ = fake_redis_service
+        client.fail = True
+        monkeypatch.setattr(service, "use_sqlite_queue", False)
+
+        assert submit_many(service, [1, 2]) == [None, None]
+
+    def test_flusher_failure_releases_waiting_tasks(self, fake_redis_service, monkeypatch):
+        """Упавшая фоновая задача отдает ожидающим None, следующая задача ее перезапускает"""
+        service, _, queue, _ = fake_redis_service
+        enqueue_batch = service._enqueue_context_batch
+
+        def broken_enqueue(batch):
+            raise RuntimeError("flusher crashed")
+
+        async def run():
+            monkeypatch.setattr(service, "_enqueue_context_batch", broken_enqueue)
+            lost = await asyncio.gather(
+                service.submit_context_task(1, dummy_task, session_id=1),
+                service.submit_context_task(2, dummy_task, session_id=2)
+            )
+            monkeypatch.setattr(service, "_enqueue_context_batch", enqueue_batch)
+            queued = await service.submit_context_task(3, dummy_task, session_id=3)
+            await service.flush_context_tasks()
+            return lost, queued
+
+        lost, queued = asyncio.run(run())
+
+        assert lost == [None, None]
+        assert [job_data.job_id for job_data in queue.enqueued] == [queued]
@@ -0,0 +1,191 @@
+"""
+Тесты пакетного семантического поиска vector_service (клиент Qdrant и модель подменяются).
+"""
+import asyncio
+
+import anyio
+import numpy as np
+import pytest
+
+from app.api.v1.endpoints import ai as ai_module
+from app.models.database.models import User
+from app.models.schemas.schemas import ChatRequest
+from app.services.vector_service import VectorService, vector_service
+
+
+class FakeEmbeddingModel:
+    """Модель эмбеддингов: вектор текста - его длина в каждой компоненте"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(texts)
+        if isinstance(texts, list):
+            return np.array([[float(len(text))] * 3 for text in texts])
+        return np.array([float(len(texts))] * 3)
+
+
+class FakePoint:
+    def __init__(self, point_id, score, payload):
+        self.id = point_id
+        self.score = score
+        self.payload = payload
+
+
+class FakeQueryResponse:
+    def __init__(self, points):
+        self.points = points
+
+
+class FakeQdrantClient:
+    """Клиент Qdrant: на каждый запрос возвращает точку с user_id из фильтра запроса"""
+
+    def __init__(self):
+        self.batches = []
+        self.single_queries = []
+
+    @staticmethod
+    def _point_for(query, query_filter):
+        user_id = query_filter.must[0].match.value if query_filter else None
+        return FakePoint(f"v{user_id}", 0.9, {"entry_id": user_id, "dim": query[0]})
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches.append(requests)
+        return [
+            FakeQueryResponse([self._point_for(request.query, request.filter)])
+            for request in requests
+        ]
+
+    def query_points(self, collection_name, query, query_filter=None, limit=10,
+                     score_threshold=None, with_payload=True):
+        self.single_queries.append(query)
+        return FakeQueryResponse([self._point_for(query, query_filter)])
+
+
+@pytest.fixture
+def fake_vector_service(monkeypatch):
+    """Глобальный vector_service с подмененными клиентом и моделью"""
+    client = FakeQdrantClient()
+    model = FakeEmbeddingModel()
+    monkeypatch.setattr(vector_service, "client", client)
+    monkeypatch.setattr(vector_service, "embedding_model", model)
+    monkeypatch.setattr(vector_service, "_search_batch", None)
+    monkeypatch.setattr(vector_service, "_search_flusher", None)
+    return vector_service, client, model
+
+
+class TestSearchBatchSync:
+    """Тесты пакетного запроса к Qdrant"""
+
+    def test_results_are_passed_through(self, fake_vector_service):
+        """Результаты query_batch_points возвращаются в порядке запросов"""
+        service, client, model = fake_vector_service
+
+        results = service._search_batch_sync([
+            ("привет", 1, 5, 0.6),
+            ("как дела", 2, 3, 0.5),
+        ])
+
+        assert results == [
+            [{"vector_id": "v1", "score": 0.9, "payload": {"entry_id": 1, "dim": 6.0}}],
+            [{"vector_id": "v2", "score": 0.9, "payload": {"entry_id": 2, "dim": 8.0}}],
+        ]
+        # Эмбеддинги всего пакета считаются одним вызовом модели
+        assert model.calls == [["привет", "как дела"]]
+        requests = client.batches[0]
+        assert [request.limit for request in requests] == [5, 3]
+        assert [request.score_threshold for request in requests] == [0.6, 0.5]
+        assert all(request.with_payload is True for request in requests)
+
+    def test_client_error_returns_empty_results(self, fake_vector_service):
+        """Ошибка Qdrant дает пустой результат для каждого запроса пакета"""
+        service, client, _ = fake_vector_service
+
+        def fail(**kwargs):
+            raise ConnectionError("qdrant down")
+
+        client.query_batch_points = fail
+
+        assert service._search_batch_sync([("a", 1, 5, 0.6), ("b", 2, 5, 0.6)]) == [[], []]
+
+
+class TestSearchSimilarBatched:
+    """Тесты объединения параллельных запросов"""
+
+    def test_concurrent_searches_share_one_batch(self, fake_vector_service):
+        """Запросы из потоков anyio уходят в Qdrant одним пакетом"""
+        service, client, _ = fake_vector_service
+
+        async def run():
+            results = await asyncio.gather(*[
+                anyio.to_thread.run_sync(service.search_similar_batched, "запрос", user_id)
+                for user_id in range(1, 6)
+            ])
+            await service.flush_searches()
+            return results
+
+        results = asyncio.run(run())
+
+        assert [result[0]["payload"]["entry_id"] for result in results] == [1, 2, 3, 4, 5]
+        assert len(client.batches) == 1
+        assert len(client.batches[0]) == 5
+
+    def test_outside_worker_thread_falls_back_to_single_search(self, fake_vector_service):
+        """Вне потока anyio выполняется обычный query_points"""
+        service, client, _ = fake_vector_service
+
+        results = service.search_similar_batched("запрос", user_id=7)
+
+        assert results == [{"vector_id": "v7", "score": 0.9, "payload": {"entry_id": 7, "dim": 6.0}}]
+        assert client.batches == []
+        assert len(client.single_queries) == 1
+
+    def test_session_and_tag_filters_use_single_search(self, fake_vector_service, caplog):
+        """Фильтры session_id/tags пакет не поддерживает: запрос выполняется отдельно с предупреждением"""
+        service, client, _ = fake_vector_service
+
+        async def run():
+            return await anyio.to_thread.run_sync(
+                lambda: service.search_similar_batched("запрос", user_id=3, session_id=9, tags=["работа"])
+            )
+
+        results = asyncio.run(run())
+
+        assert results[0]["payload"]["entry_id"] == 3
+        assert client.batches == []
+        assert len(client.single_queries) == 1
+        assert "session_id/tags" in caplog.text
+
+    def test_without_client_returns_empty(self, monkeypatch):
+        """Без клиента Qdrant поиск не выполняется"""
+        service = VectorService.__new__(VectorService)
+        service.client = None
+
+        assert service.search_similar_batched("запрос", user_id=1) == []
+
+
+class FakeAIService:
+    async def generate_response(self, **kwargs):
+        return "ответ"
+
+
+class TestChatSearch:
+    """Тесты семантического поиска из chat_with_ai"""
+
+    def test_chat_search_goes_through_batch(self, fake_vector_service, db_session, monkeypatch):
+        """Поиск контекста для чата идет через пакетный query_batch_points, а не одиночный запрос"""
+        service, client, _ = fake_vector_service
+        monkeypatch.setattr(ai_module, "ai_service", FakeAIService())
+        user = User(phone="+79000000001", password_hash="x")
+        db_session.add(user)
+        db_session.commit()
+
+        async def run():
+            response = await ai_module.chat_with_ai(ChatRequest(message="привет"), user.id, db_session)
+            await service.flush_searches()
+            return response
+
+        assert asyncio.run(run()).assistant_response == "ответ"
+        assert len(client.batches) == 1
+        assert client.single_queries == []